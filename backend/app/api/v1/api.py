@@ -2,7 +2,7 @@
 from fastapi import APIRouter
 
 from app.api.v1.endpoints import (
-    profile, bikes, activities, routes, groups, messages, strava
+    profile, bikes, activities, routes, groups, messages, strava, export, stats
 )
 
 api_router = APIRouter()
@@ -15,5 +15,7 @@ api_router.include_router(routes.router, prefix="/routes", tags=["routes"])
 api_router.include_router(groups.router, prefix="/groups", tags=["groups"])
 api_router.include_router(messages.router, prefix="/messages", tags=["messages"])
 api_router.include_router(strava.router, prefix="/strava", tags=["strava"])
+api_router.include_router(export.router, prefix="/export", tags=["export"])
+api_router.include_router(stats.router, prefix="/stats", tags=["stats"])
 
 # Additional routers will be added here as the application grows
@@ -1,32 +1,142 @@
 
-from typing import List, Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import datetime, timezone
+from typing import Any, List, Dict, Literal, Optional, Union
+from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, Path, Query, Response, UploadFile
 from uuid import UUID
+import httpx
 
+from app.core.activity_files import ActivityFileError
 from app.core.auth import get_current_user
-from app.schemas.activity import ActivityCreate, ActivityUpdate, ActivityResponse
+from app.core.config import settings
+from app.core.geometry import polyline_positions
+from app.core.mutations import update_activity_track, update_owned, delete_owned
+from app.core.pagination import paged, paginate
+from app.core.projection import build_select
+from app.core.streams import STREAM_SPECS, downsample_indices
+from app.schemas.pagination import Page
+from app.schemas.activity import (
+    ActivityCreate, ActivityUpdate, ActivityResponse,
+    ActivitySummary, ActivityListItem, ActivityNearItem,
+    ActivityBulkResponse,
+)
+from app.schemas.stream import ActivityStreamsResponse
 from app.db import supabase
+from app.services.activity_tiles import (
+    MVT_MEDIA_TYPE, TileError, get_tile, invalidate_activity_tiles,
+)
+from app.services.activity_bulk import create_activities
+from app.services.activity_uploads import ActivityUploadError, import_activity_file
+from app.services.route_geometry import compute_activity_columns
+from app.services.route_matching import RouteMatchError, match_route, schedule_route_matching
+from app.services.spatial import SpatialQueryError, parse_bbox, spatial_index
+from app.services.strava import StravaError
+from app.services.strava_streams import STREAM_TYPES, get_streams
 
 router = APIRouter()
 
 
-@router.get("", response_model=List[ActivityResponse])
+@router.get("", response_model=Union[List[ActivityListItem], Page[ActivityListItem]], response_model_exclude_unset=True)
 async def get_activities(
+    http_response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "full",
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    envelope: bool = Query(False, description="Return {items, next_cursor} instead of a list"),
     current_user: Dict = Depends(get_current_user)
 ):
-    response = supabase.table("activities") \
-                      .select("*") \
-                      .eq("user_id", current_user["user_id"]) \
-                      .range(skip, skip + limit - 1) \
-                      .order("created_at", desc=True) \
-                      .execute()
+    columns = build_select(
+        ActivityResponse, ActivitySummary, view, fields, required=("id", "created_at")
+    )
+    query = supabase.table("activities") \
+                    .select(columns) \
+                    .eq("user_id", current_user["user_id"])
+    response = await paginate(query, "created_at", limit, cursor=cursor, skip=skip).execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
-    return response.data
+    return paged(http_response, response.data, "created_at", limit, envelope)
+
+
+@router.get("/within", response_model=List[ActivityListItem], response_model_exclude_unset=True)
+async def get_activities_within(
+    bbox: str = Query(..., description="Viewport as min_lng,min_lat,max_lng,max_lat"),
+    limit: int = Query(500, ge=1, le=5000),
+    view: Literal["summary", "full"] = "summary",
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get the activities whose bounding box intersects a viewport.
+    """
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    columns = build_select(
+        ActivityResponse, ActivitySummary, view, fields, required=("id", "created_at")
+    )
+    try:
+        return await spatial_index.within("activities", current_user["user_id"], box, columns, limit)
+    except SpatialQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/near", response_model=List[ActivityNearItem], response_model_exclude_unset=True)
+async def get_activities_near(
+    lng: float = Query(..., ge=-180, le=180),
+    lat: float = Query(..., ge=-90, le=90),
+    radius_m: float = Query(1000, gt=0, le=100_000, description="Search radius around the point"),
+    limit: int = Query(50, ge=1, le=500),
+    view: Literal["summary", "full"] = "summary",
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get the activities starting within ``radius_m`` of a point, nearest first.
+    """
+    columns = build_select(
+        ActivityResponse, ActivitySummary, view, fields, required=("id", "created_at")
+    )
+    if columns != "*":
+        columns += ",start_lng,start_lat"
+    try:
+        return await spatial_index.near(
+            "activities", current_user["user_id"], lng, lat, radius_m, columns, limit
+        )
+    except SpatialQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_activity_tile(
+    z: int = Path(..., ge=0, le=settings.TILE_MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get a Mapbox vector tile of the user's activity tracks.
+
+    Tracks are simplified to the tile's resolution, so a map loads a fixed
+    number of small tiles however many activities the user has.
+    """
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail="Tile address out of range")
+
+    try:
+        data = await get_tile(current_user["user_id"], z, x, y)
+    except TileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return Response(
+        content=data,
+        media_type=MVT_MEDIA_TYPE,
+        headers={"Cache-Control": "private, max-age=60"},
+    )
 
 
 @router.get("/{activity_id}", response_model=ActivityResponse)
@@ -34,11 +144,11 @@ async def get_activity(
     activity_id: UUID,
     current_user: Dict = Depends(get_current_user)
 ):
-    response = supabase.table("activities") \
-                      .select("*") \
-                      .eq("id", str(activity_id)) \
-                      .eq("user_id", current_user["user_id"]) \
-                      .execute()
+    response = await supabase.table("activities") \
+                            .select("*") \
+                            .eq("id", str(activity_id)) \
+                            .eq("user_id", current_user["user_id"]) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -49,6 +159,45 @@ async def get_activity(
     return response.data[0]
 
 
+@router.get("/{activity_id}/streams", response_model=ActivityStreamsResponse)
+async def get_activity_streams(
+    activity_id: UUID,
+    types: Optional[str] = Query(None, description="Comma-separated stream types, default all"),
+    max_points: Optional[int] = Query(None, ge=2, description="Downsample to at most this many points"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get an activity's per-second streams, optionally evenly downsampled.
+    """
+    requested = [t.strip() for t in types.split(",") if t.strip()] if types else list(STREAM_TYPES)
+    unknown = [t for t in requested if t not in STREAM_SPECS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown stream types: {', '.join(unknown)}")
+
+    try:
+        streams = await get_streams(str(activity_id), current_user["user_id"], requested)
+    except StravaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch streams from Strava: {str(e)}")
+
+    if streams is None:
+        raise HTTPException(status_code=404, detail="Activity not found")
+
+    original_size = max((len(data) for data in streams.values()), default=0)
+    indices = downsample_indices(original_size, max_points or original_size)
+
+    return {
+        "activity_id": activity_id,
+        "original_size": original_size,
+        "point_count": len(indices),
+        "streams": {
+            stream_type: data[indices[indices < len(data)]].tolist()
+            for stream_type, data in streams.items()
+        },
+    }
+
+
 @router.post("", response_model=ActivityResponse)
 async def create_activity(
     activity: ActivityCreate,
@@ -56,48 +205,122 @@ async def create_activity(
 ):
     activity_data = activity.dict()
     activity_data["user_id"] = current_user["user_id"]
+    activity_data.update(
+        await compute_activity_columns(activity.map_polyline, activity.distance_km is not None)
+    )
+    if activity.route_id is None:
+        try:
+            route_id = await match_route(
+                current_user["user_id"], polyline_positions(activity.map_polyline)
+            )
+        except RouteMatchError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if route_id is not None:
+            activity_data["route_id"] = route_id
+    activity_data["route_matched_at"] = datetime.now(timezone.utc)
     
-    response = supabase.table("activities") \
-                      .insert(activity_data) \
-                      .execute()
+    response = await supabase.table("activities") \
+                            .insert(activity_data) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
+    await invalidate_activity_tiles(current_user["user_id"], [activity.map_polyline])
     return response.data[0]
 
 
+@router.post("/upload", response_model=ActivityResponse)
+async def upload_activity(
+    file: UploadFile = File(..., description="GPX, TCX or FIT file, optionally gzipped"),
+    name: Optional[str] = Form(None),
+    activity_type: Optional[str] = Form(None, alias="type"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Create an activity from a device file.
+
+    Summary fields, the map polyline and the streams are all computed from
+    the file's track points. The upload is spooled to disk and parsed
+    incrementally off the event loop.
+    """
+    try:
+        if file.size is not None and file.size > settings.ACTIVITY_UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="File is too large")
+        return await import_activity_file(
+            current_user["user_id"], file.file, name, activity_type
+        )
+    except ActivityFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ActivityUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
+
+
+@router.post("/bulk", response_model=ActivityBulkResponse)
+async def create_activities_bulk(
+    items: List[Any] = Body(..., description="Activities to create, each shaped like a single create"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Create many activities in one request.
+
+    Items are validated one by one, so a bad item doesn't reject the
+    others; items already stored (by Strava or external id) are reported
+    as duplicates. Results come back in request order.
+    """
+    if len(items) > settings.ACTIVITY_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.ACTIVITY_BULK_MAX_ITEMS} activities per request"
+        )
+    results = await create_activities(current_user["user_id"], items)
+    counts = {status: 0 for status in ("created", "duplicate", "invalid", "failed")}
+    for result in results:
+        counts[result["status"]] += 1
+    return {
+        "created": counts["created"],
+        "duplicates": counts["duplicate"],
+        "invalid": counts["invalid"],
+        "failed": counts["failed"],
+        "results": results,
+    }
+
+
 @router.put("/{activity_id}", response_model=ActivityResponse)
 async def update_activity(
     activity_id: UUID,
     activity: ActivityUpdate,
     current_user: Dict = Depends(get_current_user)
 ):
-    # First check if activity exists and belongs to user
-    check_response = supabase.table("activities") \
-                           .select("id") \
-                           .eq("id", str(activity_id)) \
-                           .eq("user_id", current_user["user_id"]) \
-                           .execute()
-    
-    if hasattr(check_response, 'error') and check_response.error is not None:
-        raise HTTPException(status_code=400, detail=str(check_response.error))
-    
-    if not check_response.data:
-        raise HTTPException(status_code=404, detail="Activity not found or you don't have permission")
-    
     update_data = {k: v for k, v in activity.dict().items() if v is not None}
+    rematch = "map_polyline" in update_data and "route_id" not in update_data
+    if "map_polyline" in update_data:
+        # The stored distance may come from the full track; never replace it with the polyline's
+        update_data.update(await compute_activity_columns(update_data["map_polyline"], True))
+    if rematch:
+        # Let the matcher look at the new track if the activity has no route
+        update_data["route_matched_at"] = None
     
-    response = supabase.table("activities") \
-                      .update(update_data) \
-                      .eq("id", str(activity_id)) \
-                      .eq("user_id", current_user["user_id"]) \
-                      .execute()
-    
-    if hasattr(response, 'error') and response.error is not None:
-        raise HTTPException(status_code=400, detail=str(response.error))
-    
-    return response.data[0]
+    # Tiles drawn with the old track or type have to go too
+    retile = "map_polyline" in update_data or "type" in update_data
+    if retile:
+        updated, previous_polyline = await update_activity_track(
+            str(activity_id), current_user["user_id"], update_data
+        )
+    else:
+        updated = await update_owned(
+            "activities", str(activity_id), "user_id", current_user["user_id"], update_data,
+            detail="Activity not found or you don't have permission"
+        )
+    if rematch:
+        await schedule_route_matching(current_user["user_id"])
+    if retile:
+        await invalidate_activity_tiles(
+            current_user["user_id"], [previous_polyline, updated.get("map_polyline")]
+        )
+    return updated
 
 
 @router.delete("/{activity_id}")
@@ -105,26 +328,10 @@ async def delete_activity(
     activity_id: UUID,
     current_user: Dict = Depends(get_current_user)
 ):
-    # First check if activity exists and belongs to user
-    check_response = supabase.table("activities") \
-                           .select("id") \
-                           .eq("id", str(activity_id)) \
-                           .eq("user_id", current_user["user_id"]) \
-                           .execute()
-    
-    if hasattr(check_response, 'error') and check_response.error is not None:
-        raise HTTPException(status_code=400, detail=str(check_response.error))
-    
-    if not check_response.data:
-        raise HTTPException(status_code=404, detail="Activity not found or you don't have permission")
-    
-    response = supabase.table("activities") \
-                      .delete() \
-                      .eq("id", str(activity_id)) \
-                      .eq("user_id", current_user["user_id"]) \
-                      .execute()
-    
-    if hasattr(response, 'error') and response.error is not None:
-        raise HTTPException(status_code=400, detail=str(response.error))
+    deleted = await delete_owned(
+        "activities", str(activity_id), "user_id", current_user["user_id"],
+        detail="Activity not found or you don't have permission"
+    )
+    await invalidate_activity_tiles(current_user["user_id"], [deleted.get("map_polyline")])
     
     return {"message": "Activity deleted successfully"}
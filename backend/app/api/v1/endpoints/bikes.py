@@ -1,6 +1,7 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.core.auth import get_current_user
+from app.core.mutations import update_owned, delete_owned
 from app.schemas.bike import BikeCreate, BikeUpdate, BikeResponse
 from app.db import supabase
 from typing import Dict, List
@@ -14,7 +15,7 @@ async def get_bikes(current_user: Dict = Depends(get_current_user)):
     """
     try:
         # Get all bikes for the user from Supabase
-        response = supabase.table("bikes").select("*").eq("user_id", current_user["user_id"]).execute()
+        response = await supabase.table("bikes").select("*").eq("user_id", current_user["user_id"]).execute()
         return response.data
     except Exception as e:
         raise HTTPException(
@@ -34,7 +35,7 @@ async def create_bike(bike: BikeCreate, current_user: Dict = Depends(get_current
         bike_data["user_id"] = current_user["user_id"]
         
         # Insert the new bike into Supabase
-        response = supabase.table("bikes").insert(bike_data).execute()
+        response = await supabase.table("bikes").insert(bike_data).execute()
         data = response.data
         
         if not data or len(data) == 0:
@@ -61,30 +62,14 @@ async def update_bike(
     Update a specific bike for the current user.
     """
     try:
-        # First, check if the bike exists and belongs to the user
-        check_response = supabase.table("bikes").select("id").eq("id", bike_id).eq("user_id", current_user["user_id"]).execute()
-        
-        if not check_response.data or len(check_response.data) == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Bike not found or you don't have permission to update it",
-            )
-        
         # Convert the Pydantic model to a dictionary, excluding unset fields
         update_data = bike_update.dict(exclude_unset=True)
         
-        # Update the bike in Supabase
-        response = supabase.table("bikes").update(update_data).eq("id", bike_id).eq("user_id", current_user["user_id"]).execute()
-        data = response.data
-        
-        if not data or len(data) == 0:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to update bike",
-            )
-        
-        # Return the updated bike
-        return data[0]
+        # Update the bike only if it belongs to the user, in a single request
+        return await update_owned(
+            "bikes", bike_id, "user_id", current_user["user_id"], update_data,
+            detail="Bike not found or you don't have permission to update it",
+        )
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -99,17 +84,11 @@ async def delete_bike(bike_id: str, current_user: Dict = Depends(get_current_use
     Delete a specific bike for the current user.
     """
     try:
-        # First, check if the bike exists and belongs to the user
-        check_response = supabase.table("bikes").select("id").eq("id", bike_id).eq("user_id", current_user["user_id"]).execute()
-        
-        if not check_response.data or len(check_response.data) == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Bike not found or you don't have permission to delete it",
-            )
-        
-        # Delete the bike from Supabase
-        supabase.table("bikes").delete().eq("id", bike_id).eq("user_id", current_user["user_id"]).execute()
+        # Delete the bike only if it belongs to the user, in a single request
+        await delete_owned(
+            "bikes", bike_id, "user_id", current_user["user_id"],
+            detail="Bike not found or you don't have permission to delete it",
+        )
         
         # Return no content
         return None
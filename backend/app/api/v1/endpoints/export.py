@@ -0,0 +1,104 @@
+import os
+import re
+from datetime import datetime, timezone
+from functools import partial
+from typing import Dict, Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.core.auth import get_current_user
+from app.services.exports import (
+    ExportBusyError, ExportError, export_limiter, export_spool, file_range, leased, ndjson_export,
+    zip_export,
+)
+
+router = APIRouter()
+
+MEDIA_TYPES = {"zip": "application/zip", "ndjson": "application/x-ndjson"}
+EXPORT_RETRY_AFTER_SECONDS = 30
+
+_RANGE = re.compile(r"^bytes=(\d+)-(\d*)$")
+
+
+@router.get("")
+async def export_data(
+    export_format: Literal["zip", "ndjson"] = Query("zip", alias="format"),
+    as_of: Optional[datetime] = Query(
+        None, description="Export rows created up to this time (default now); needed to resume"
+    ),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Stream all of the user's bikes, routes and activities.
+
+    ``ndjson`` is one ``{"type", "data"}`` record per line; ``zip`` holds an
+    NDJSON file per record type and a GPX file per activity. Rows are read
+    a page at a time and written out as they arrive.
+
+    The response carries the ``as_of`` it was cut at. Requesting the same
+    ``as_of`` again reproduces it byte for byte, so an interrupted download
+    can be resumed with a ``Range: bytes=N-`` request. The first range
+    request generates the export once into a spool file on the server, and
+    ranges are served from that file.
+    """
+    user_id = current_user["user_id"]
+    pinned = as_of is not None
+    as_of = (as_of or datetime.now(timezone.utc)).replace(microsecond=0)
+    if as_of.tzinfo is None:
+        as_of = as_of.replace(tzinfo=timezone.utc)
+
+    producer = zip_export if export_format == "zip" else ndjson_export
+    stream = partial(producer, user_id, as_of)
+    stamp = as_of.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    etag = f'"{export_format}-{stamp}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "X-Export-As-Of": as_of.isoformat(),
+        "Content-Disposition": f'attachment; filename="export-{stamp}.{export_format}"',
+    }
+
+    # Only an export pinned to an explicit as_of is reproducible, so only that can be resumed
+    match = None
+    if pinned and range_header and if_range in (None, etag):
+        match = _RANGE.match(range_header.strip())
+
+    try:
+        lease = export_limiter.acquire(user_id)
+    except ExportBusyError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e),
+            headers={"Retry-After": str(EXPORT_RETRY_AFTER_SECONDS)}
+        )
+
+    if match is None:
+        return StreamingResponse(
+            leased(stream(), lease), media_type=MEDIA_TYPES[export_format], headers=headers,
+            background=BackgroundTask(lease.release)
+        )
+
+    try:
+        spooled = await export_spool.open(user_id, f"{stamp}.{export_format}", stream)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        # Serving from the spool file doesn't read the database
+        lease.release()
+
+    total = os.fstat(spooled.fileno()).st_size
+    start = int(match.group(1))
+    end = min(int(match.group(2)) if match.group(2) else total - 1, total - 1)
+    if start > end:
+        spooled.close()
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+
+    headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        file_range(spooled, start, end), status_code=206,
+        media_type=MEDIA_TYPES[export_format], headers=headers
+    )
@@ -1,9 +1,11 @@
 
-from typing import List, Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Dict, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from uuid import UUID
 
 from app.core.auth import get_current_user
+from app.core.pagination import paged, paginate
+from app.schemas.pagination import Page
 from app.schemas.group import (
     GroupCreate, GroupUpdate, GroupResponse,
     GroupMemberCreate, GroupMemberUpdate, GroupMemberResponse
@@ -14,17 +16,20 @@ router = APIRouter()
 
 
 # Group endpoints
-@router.get("", response_model=List[GroupResponse])
+@router.get("", response_model=Union[List[GroupResponse], Page[GroupResponse]])
 async def get_groups(
+    http_response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    envelope: bool = Query(False, description="Return {items, next_cursor} instead of a list"),
     current_user: Dict = Depends(get_current_user)
 ):
     # Get groups where the user is a member
-    member_response = supabase.table("group_members") \
-                            .select("group_id") \
-                            .eq("member_id", current_user["user_id"]) \
-                            .execute()
+    member_response = await supabase.table("group_members") \
+                                  .select("group_id") \
+                                  .eq("member_id", current_user["user_id"]) \
+                                  .execute()
     
     if hasattr(member_response, 'error') and member_response.error is not None:
         raise HTTPException(status_code=400, detail=str(member_response.error))
@@ -33,20 +38,18 @@ async def get_groups(
     group_ids = [item["group_id"] for item in member_response.data]
     
     if not group_ids:
-        return []
+        return paged(http_response, [], "created_at", limit, envelope)
     
     # Get group details
-    response = supabase.table("groups") \
-                      .select("*") \
-                      .in_("id", group_ids) \
-                      .range(skip, skip + limit - 1) \
-                      .order("created_at", desc=True) \
-                      .execute()
+    query = supabase.table("groups") \
+                    .select("*") \
+                    .in_("id", group_ids)
+    response = await paginate(query, "created_at", limit, cursor=cursor, skip=skip).execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
-    return response.data
+    return paged(http_response, response.data, "created_at", limit, envelope)
 
 
 @router.get("/{group_id}", response_model=GroupResponse)
@@ -55,11 +58,11 @@ async def get_group(
     current_user: Dict = Depends(get_current_user)
 ):
     # First check if user is a member of the group
-    member_check = supabase.table("group_members") \
-                         .select("*") \
-                         .eq("group_id", str(group_id)) \
-                         .eq("member_id", current_user["user_id"]) \
-                         .execute()
+    member_check = await supabase.table("group_members") \
+                               .select("*") \
+                               .eq("group_id", str(group_id)) \
+                               .eq("member_id", current_user["user_id"]) \
+                               .execute()
     
     if hasattr(member_check, 'error') and member_check.error is not None:
         raise HTTPException(status_code=400, detail=str(member_check.error))
@@ -68,10 +71,10 @@ async def get_group(
         raise HTTPException(status_code=403, detail="You're not a member of this group")
     
     # Get group details
-    response = supabase.table("groups") \
-                      .select("*") \
-                      .eq("id", str(group_id)) \
-                      .execute()
+    response = await supabase.table("groups") \
+                            .select("*") \
+                            .eq("id", str(group_id)) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -91,9 +94,9 @@ async def create_group(
     group_data["creator_id"] = current_user["user_id"]
     
     # Create the group
-    response = supabase.table("groups") \
-                      .insert(group_data) \
-                      .execute()
+    response = await supabase.table("groups") \
+                            .insert(group_data) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -107,13 +110,13 @@ async def create_group(
         "role": "admin"
     }
     
-    member_response = supabase.table("group_members") \
-                            .insert(member_data) \
-                            .execute()
+    member_response = await supabase.table("group_members") \
+                                  .insert(member_data) \
+                                  .execute()
     
     if hasattr(member_response, 'error') and member_response.error is not None:
         # If adding member fails, delete the group
-        supabase.table("groups").delete().eq("id", new_group["id"]).execute()
+        await supabase.table("groups").delete().eq("id", new_group["id"]).execute()
         raise HTTPException(status_code=400, detail=str(member_response.error))
     
     return new_group
@@ -126,12 +129,12 @@ async def update_group(
     current_user: Dict = Depends(get_current_user)
 ):
     # Check if user is an admin of the group
-    admin_check = supabase.table("group_members") \
-                        .select("*") \
-                        .eq("group_id", str(group_id)) \
-                        .eq("member_id", current_user["user_id"]) \
-                        .eq("role", "admin") \
-                        .execute()
+    admin_check = await supabase.table("group_members") \
+                              .select("*") \
+                              .eq("group_id", str(group_id)) \
+                              .eq("member_id", current_user["user_id"]) \
+                              .eq("role", "admin") \
+                              .execute()
     
     if hasattr(admin_check, 'error') and admin_check.error is not None:
         raise HTTPException(status_code=400, detail=str(admin_check.error))
@@ -141,10 +144,10 @@ async def update_group(
     
     update_data = {k: v for k, v in group.dict().items() if v is not None}
     
-    response = supabase.table("groups") \
-                      .update(update_data) \
-                      .eq("id", str(group_id)) \
-                      .execute()
+    response = await supabase.table("groups") \
+                            .update(update_data) \
+                            .eq("id", str(group_id)) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -158,11 +161,11 @@ async def delete_group(
     current_user: Dict = Depends(get_current_user)
 ):
     # Check if user is the creator of the group
-    group_check = supabase.table("groups") \
-                        .select("*") \
-                        .eq("id", str(group_id)) \
-                        .eq("creator_id", current_user["user_id"]) \
-                        .execute()
+    group_check = await supabase.table("groups") \
+                              .select("*") \
+                              .eq("id", str(group_id)) \
+                              .eq("creator_id", current_user["user_id"]) \
+                              .execute()
     
     if hasattr(group_check, 'error') and group_check.error is not None:
         raise HTTPException(status_code=400, detail=str(group_check.error))
@@ -171,19 +174,19 @@ async def delete_group(
         raise HTTPException(status_code=403, detail="Only the group creator can delete the group")
     
     # Delete all group members first
-    members_delete = supabase.table("group_members") \
-                           .delete() \
-                           .eq("group_id", str(group_id)) \
-                           .execute()
+    members_delete = await supabase.table("group_members") \
+                                 .delete() \
+                                 .eq("group_id", str(group_id)) \
+                                 .execute()
     
     if hasattr(members_delete, 'error') and members_delete.error is not None:
         raise HTTPException(status_code=400, detail=str(members_delete.error))
     
     # Now delete the group
-    response = supabase.table("groups") \
-                      .delete() \
-                      .eq("id", str(group_id)) \
-                      .execute()
+    response = await supabase.table("groups") \
+                            .delete() \
+                            .eq("id", str(group_id)) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -198,11 +201,11 @@ async def get_group_members(
     current_user: Dict = Depends(get_current_user)
 ):
     # Check if user is a member of the group
-    member_check = supabase.table("group_members") \
-                         .select("*") \
-                         .eq("group_id", str(group_id)) \
-                         .eq("member_id", current_user["user_id"]) \
-                         .execute()
+    member_check = await supabase.table("group_members") \
+                               .select("*") \
+                               .eq("group_id", str(group_id)) \
+                               .eq("member_id", current_user["user_id"]) \
+                               .execute()
     
     if hasattr(member_check, 'error') and member_check.error is not None:
         raise HTTPException(status_code=400, detail=str(member_check.error))
@@ -211,10 +214,10 @@ async def get_group_members(
         raise HTTPException(status_code=403, detail="You're not a member of this group")
     
     # Get all members
-    response = supabase.table("group_members") \
-                      .select("*") \
-                      .eq("group_id", str(group_id)) \
-                      .execute()
+    response = await supabase.table("group_members") \
+                            .select("*") \
+                            .eq("group_id", str(group_id)) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -228,12 +231,12 @@ async def add_group_member(
     current_user: Dict = Depends(get_current_user)
 ):
     # Check if user is an admin of the group
-    admin_check = supabase.table("group_members") \
-                        .select("*") \
-                        .eq("group_id", str(group_member.group_id)) \
-                        .eq("member_id", current_user["user_id"]) \
-                        .eq("role", "admin") \
-                        .execute()
+    admin_check = await supabase.table("group_members") \
+                              .select("*") \
+                              .eq("group_id", str(group_member.group_id)) \
+                              .eq("member_id", current_user["user_id"]) \
+                              .eq("role", "admin") \
+                              .execute()
     
     if hasattr(admin_check, 'error') and admin_check.error is not None:
         raise HTTPException(status_code=400, detail=str(admin_check.error))
@@ -242,9 +245,9 @@ async def add_group_member(
         raise HTTPException(status_code=403, detail="Only group admins can add members")
     
     # Add the new member
-    response = supabase.table("group_members") \
-                      .insert(group_member.dict()) \
-                      .execute()
+    response = await supabase.table("group_members") \
+                            .insert(group_member.dict()) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -260,12 +263,12 @@ async def update_group_member(
     current_user: Dict = Depends(get_current_user)
 ):
     # Check if user is an admin of the group
-    admin_check = supabase.table("group_members") \
-                        .select("*") \
-                        .eq("group_id", str(group_id)) \
-                        .eq("member_id", current_user["user_id"]) \
-                        .eq("role", "admin") \
-                        .execute()
+    admin_check = await supabase.table("group_members") \
+                              .select("*") \
+                              .eq("group_id", str(group_id)) \
+                              .eq("member_id", current_user["user_id"]) \
+                              .eq("role", "admin") \
+                              .execute()
     
     if hasattr(admin_check, 'error') and admin_check.error is not None:
         raise HTTPException(status_code=400, detail=str(admin_check.error))
@@ -274,11 +277,11 @@ async def update_group_member(
         raise HTTPException(status_code=403, detail="Only group admins can update member roles")
     
     # Update the member role
-    response = supabase.table("group_members") \
-                      .update(member_update.dict()) \
-                      .eq("group_id", str(group_id)) \
-                      .eq("member_id", str(member_id)) \
-                      .execute()
+    response = await supabase.table("group_members") \
+                            .update(member_update.dict()) \
+                            .eq("group_id", str(group_id)) \
+                            .eq("member_id", str(member_id)) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -296,12 +299,12 @@ async def remove_group_member(
     current_user: Dict = Depends(get_current_user)
 ):
     # Check if user is an admin of the group or the member themselves
-    admin_check = supabase.table("group_members") \
-                        .select("*") \
-                        .eq("group_id", str(group_id)) \
-                        .eq("member_id", current_user["user_id"]) \
-                        .eq("role", "admin") \
-                        .execute()
+    admin_check = await supabase.table("group_members") \
+                              .select("*") \
+                              .eq("group_id", str(group_id)) \
+                              .eq("member_id", current_user["user_id"]) \
+                              .eq("role", "admin") \
+                              .execute()
     
     is_admin = bool(admin_check.data)
     is_self = str(member_id) == current_user["user_id"]
@@ -313,11 +316,11 @@ async def remove_group_member(
         )
     
     # Remove the member
-    response = supabase.table("group_members") \
-                      .delete() \
-                      .eq("group_id", str(group_id)) \
-                      .eq("member_id", str(member_id)) \
-                      .execute()
+    response = await supabase.table("group_members") \
+                            .delete() \
+                            .eq("group_id", str(group_id)) \
+                            .eq("member_id", str(member_id)) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -1,31 +1,69 @@
 
-from typing import List, Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Union
+from fastapi import (
+    APIRouter, Depends, HTTPException, Query, Response,
+    WebSocket, WebSocketDisconnect, status
+)
+from fastapi.responses import StreamingResponse
 from uuid import UUID
 
-from app.core.auth import get_current_user
+from app.core.auth import get_current_user, get_user_from_token
+from app.core.cache import membership_cache
+from app.core.config import settings
+from app.core.mutations import update_owned, delete_owned
+from app.core.pagination import decode_cursor, paged, paginate
+from app.core.pubsub import message_hub, conversation_topic
+from app.schemas.pagination import Page
 from app.schemas.message import (
     MessageCreate, MessageUpdate, MessageResponse,
     ConversationCreate, ConversationResponse,
-    ParticipantCreate, ParticipantResponse
+    ParticipantCreate, ParticipantResponse, InboxEntry
 )
 from app.db import supabase
 
 router = APIRouter()
 
 
+async def _require_participant(conversation_id: str, user_id: str) -> None:
+    """
+    Raise a 403 unless the user participates in the conversation.
+    Positive lookups are cached, so the hot path usually skips the database.
+    """
+    if await membership_cache.is_member(user_id, conversation_id):
+        return
+    
+    participant_check = await supabase.table("participants") \
+                                      .select("id") \
+                                      .eq("conversation_id", conversation_id) \
+                                      .eq("user_id", user_id) \
+                                      .execute()
+    
+    if hasattr(participant_check, 'error') and participant_check.error is not None:
+        raise HTTPException(status_code=400, detail=str(participant_check.error))
+    
+    if not participant_check.data:
+        raise HTTPException(status_code=403, detail="You're not a participant in this conversation")
+    
+    await membership_cache.remember(user_id, conversation_id)
+
+
 # Conversation endpoints
-@router.get("/conversations", response_model=List[ConversationResponse])
+@router.get("/conversations", response_model=Union[List[ConversationResponse], Page[ConversationResponse]])
 async def get_conversations(
+    http_response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    envelope: bool = Query(False, description="Return {items, next_cursor} instead of a list"),
     current_user: Dict = Depends(get_current_user)
 ):
     # Get conversations where the user is a participant
-    participant_response = supabase.table("participants") \
-                                .select("conversation_id") \
-                                .eq("user_id", current_user["user_id"]) \
-                                .execute()
+    participant_response = await supabase.table("participants") \
+                                      .select("conversation_id") \
+                                      .eq("user_id", current_user["user_id"]) \
+                                      .execute()
     
     if hasattr(participant_response, 'error') and participant_response.error is not None:
         raise HTTPException(status_code=400, detail=str(participant_response.error))
@@ -33,20 +71,42 @@ async def get_conversations(
     conversation_ids = [item["conversation_id"] for item in participant_response.data]
     
     if not conversation_ids:
-        return []
+        return paged(http_response, [], "created_at", limit, envelope)
     
     # Get conversation details
-    response = supabase.table("conversations") \
-                      .select("*") \
-                      .in_("id", conversation_ids) \
-                      .range(skip, skip + limit - 1) \
-                      .order("created_at", desc=True) \
-                      .execute()
+    query = supabase.table("conversations") \
+                    .select("*") \
+                    .in_("id", conversation_ids)
+    response = await paginate(query, "created_at", limit, cursor=cursor, skip=skip).execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
-    return response.data
+    return paged(http_response, response.data, "created_at", limit, envelope)
+
+
+@router.get("/inbox", response_model=Union[List[InboxEntry], Page[InboxEntry]])
+async def get_inbox(
+    http_response: Response,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    envelope: bool = Query(False, description="Return {items, next_cursor} instead of a list"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    List the user's conversations by latest activity, each with its last
+    message, unread count and participant summary, in a single query.
+    """
+    params = {"p_user_id": current_user["user_id"], "p_limit": limit}
+    if cursor is not None:
+        params["p_cursor_at"], params["p_cursor_id"] = decode_cursor(cursor)
+    
+    response = await supabase.rpc("get_conversation_inbox", params).execute()
+    
+    if hasattr(response, 'error') and response.error is not None:
+        raise HTTPException(status_code=400, detail=str(response.error))
+    
+    return paged(http_response, response.data, "last_activity_at", limit, envelope)
 
 
 @router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
@@ -54,24 +114,13 @@ async def get_conversation(
     conversation_id: UUID,
     current_user: Dict = Depends(get_current_user)
 ):
-    # Check if user is a participant
-    participant_check = supabase.table("participants") \
-                            .select("*") \
-                            .eq("conversation_id", str(conversation_id)) \
-                            .eq("user_id", current_user["user_id"]) \
-                            .execute()
-    
-    if hasattr(participant_check, 'error') and participant_check.error is not None:
-        raise HTTPException(status_code=400, detail=str(participant_check.error))
-    
-    if not participant_check.data:
-        raise HTTPException(status_code=403, detail="You're not a participant in this conversation")
+    await _require_participant(str(conversation_id), current_user["user_id"])
     
     # Get conversation
-    response = supabase.table("conversations") \
-                      .select("*") \
-                      .eq("id", str(conversation_id)) \
-                      .execute()
+    response = await supabase.table("conversations") \
+                            .select("*") \
+                            .eq("id", str(conversation_id)) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -88,9 +137,9 @@ async def create_conversation(
     current_user: Dict = Depends(get_current_user)
 ):
     # Create conversation
-    response = supabase.table("conversations") \
-                      .insert(conversation.dict()) \
-                      .execute()
+    response = await supabase.table("conversations") \
+                            .insert(conversation.dict()) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -103,51 +152,43 @@ async def create_conversation(
         "user_id": current_user["user_id"]
     }
     
-    participant_response = supabase.table("participants") \
-                                .insert(participant_data) \
-                                .execute()
+    participant_response = await supabase.table("participants") \
+                                      .insert(participant_data) \
+                                      .execute()
     
     if hasattr(participant_response, 'error') and participant_response.error is not None:
         # Rollback conversation creation
-        supabase.table("conversations").delete().eq("id", new_conversation["id"]).execute()
+        await supabase.table("conversations").delete().eq("id", new_conversation["id"]).execute()
         raise HTTPException(status_code=400, detail=str(participant_response.error))
     
+    await membership_cache.remember(current_user["user_id"], str(new_conversation["id"]))
+    
     return new_conversation
 
 
 # Message endpoints
-@router.get("/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
+@router.get("/conversations/{conversation_id}/messages", response_model=Union[List[MessageResponse], Page[MessageResponse]])
 async def get_messages(
     conversation_id: UUID,
+    http_response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
+    envelope: bool = Query(False, description="Return {items, next_cursor} instead of a list"),
     current_user: Dict = Depends(get_current_user)
 ):
-    # Check if user is a participant
-    participant_check = supabase.table("participants") \
-                            .select("*") \
-                            .eq("conversation_id", str(conversation_id)) \
-                            .eq("user_id", current_user["user_id"]) \
-                            .execute()
-    
-    if hasattr(participant_check, 'error') and participant_check.error is not None:
-        raise HTTPException(status_code=400, detail=str(participant_check.error))
-    
-    if not participant_check.data:
-        raise HTTPException(status_code=403, detail="You're not a participant in this conversation")
+    await _require_participant(str(conversation_id), current_user["user_id"])
     
     # Get messages
-    response = supabase.table("messages") \
-                      .select("*") \
-                      .eq("conversation_id", str(conversation_id)) \
-                      .range(skip, skip + limit - 1) \
-                      .order("sent_at", desc=True) \
-                      .execute()
+    query = supabase.table("messages") \
+                    .select("*") \
+                    .eq("conversation_id", str(conversation_id))
+    response = await paginate(query, "sent_at", limit, cursor=cursor, skip=skip).execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
-    return response.data
+    return paged(http_response, response.data, "sent_at", limit, envelope)
 
 
 @router.post("/conversations/{conversation_id}/messages", response_model=MessageResponse)
@@ -156,31 +197,27 @@ async def create_message(
     message: MessageCreate,
     current_user: Dict = Depends(get_current_user)
 ):
-    # Check if user is a participant
-    participant_check = supabase.table("participants") \
-                            .select("*") \
-                            .eq("conversation_id", str(conversation_id)) \
-                            .eq("user_id", current_user["user_id"]) \
-                            .execute()
-    
-    if hasattr(participant_check, 'error') and participant_check.error is not None:
-        raise HTTPException(status_code=400, detail=str(participant_check.error))
-    
-    if not participant_check.data:
-        raise HTTPException(status_code=403, detail="You're not a participant in this conversation")
+    await _require_participant(str(conversation_id), current_user["user_id"])
     
     # Create message
     message_data = message.dict()
     message_data["sender_id"] = current_user["user_id"]
+    message_data["conversation_id"] = str(conversation_id)
     
-    response = supabase.table("messages") \
-                      .insert(message_data) \
-                      .execute()
+    response = await supabase.table("messages") \
+                            .insert(message_data) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
-    return response.data[0]
+    new_message = response.data[0]
+    await message_hub.publish(
+        conversation_topic(str(conversation_id)),
+        {"type": "message.created", "message": new_message}
+    )
+    
+    return new_message
 
 
 @router.put("/messages/{message_id}", response_model=MessageResponse)
@@ -189,31 +226,18 @@ async def update_message(
     message: MessageUpdate,
     current_user: Dict = Depends(get_current_user)
 ):
-    # Check if message exists and belongs to user
-    check_response = supabase.table("messages") \
-                           .select("*") \
-                           .eq("id", str(message_id)) \
-                           .eq("sender_id", current_user["user_id"]) \
-                           .execute()
-    
-    if hasattr(check_response, 'error') and check_response.error is not None:
-        raise HTTPException(status_code=400, detail=str(check_response.error))
-    
-    if not check_response.data:
-        raise HTTPException(status_code=404, detail="Message not found or you don't have permission")
-    
     update_data = {k: v for k, v in message.dict().items() if v is not None}
     
-    response = supabase.table("messages") \
-                      .update(update_data) \
-                      .eq("id", str(message_id)) \
-                      .eq("sender_id", current_user["user_id"]) \
-                      .execute()
-    
-    if hasattr(response, 'error') and response.error is not None:
-        raise HTTPException(status_code=400, detail=str(response.error))
+    updated_message = await update_owned(
+        "messages", str(message_id), "sender_id", current_user["user_id"], update_data,
+        detail="Message not found or you don't have permission"
+    )
+    await message_hub.publish(
+        conversation_topic(str(updated_message["conversation_id"])),
+        {"type": "message.updated", "message": updated_message}
+    )
     
-    return response.data[0]
+    return updated_message
 
 
 @router.delete("/messages/{message_id}")
@@ -221,28 +245,142 @@ async def delete_message(
     message_id: UUID,
     current_user: Dict = Depends(get_current_user)
 ):
-    # Check if message exists and belongs to user
-    check_response = supabase.table("messages") \
-                           .select("*") \
-                           .eq("id", str(message_id)) \
-                           .eq("sender_id", current_user["user_id"]) \
-                           .execute()
-    
-    if hasattr(check_response, 'error') and check_response.error is not None:
-        raise HTTPException(status_code=400, detail=str(check_response.error))
+    deleted_message = await delete_owned(
+        "messages", str(message_id), "sender_id", current_user["user_id"],
+        detail="Message not found or you don't have permission"
+    )
+    await message_hub.publish(
+        conversation_topic(str(deleted_message["conversation_id"])),
+        {"type": "message.deleted", "message": {"id": str(message_id)}}
+    )
     
-    if not check_response.data:
-        raise HTTPException(status_code=404, detail="Message not found or you don't have permission")
-    
-    response = supabase.table("messages") \
-                      .delete() \
-                      .eq("id", str(message_id)) \
-                      .execute()
+    return {"message": "Message deleted successfully"}
+
+
+@router.post("/conversations/{conversation_id}/read", response_model=ParticipantResponse)
+async def mark_conversation_read(
+    conversation_id: UUID,
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Move the user's read marker to now, clearing the conversation's unread count.
+    """
+    response = await supabase.table("participants") \
+                            .update({"last_read_at": datetime.now(timezone.utc)}) \
+                            .eq("conversation_id", str(conversation_id)) \
+                            .eq("user_id", current_user["user_id"]) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
-    return {"message": "Message deleted successfully"}
+    if not response.data:
+        raise HTTPException(status_code=403, detail="You're not a participant in this conversation")
+    
+    return response.data[0]
+
+
+# Realtime endpoints
+async def _drain_websocket(websocket: WebSocket) -> None:
+    # Client messages are ignored; this only exists to notice the disconnect
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+async def _forward_to_websocket(websocket: WebSocket, subscription) -> None:
+    while True:
+        payload = await subscription.get()
+        if subscription.closed:
+            # Removed from the conversation
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        if subscription.overflowed:
+            # Too slow to keep up; the client should reload history and reconnect
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return
+        await websocket.send_text(payload)
+
+
+@router.websocket("/conversations/{conversation_id}/ws")
+async def conversation_websocket(
+    websocket: WebSocket,
+    conversation_id: UUID,
+    token: str = Query(...)
+):
+    """
+    Push new, edited and deleted messages for a conversation over a WebSocket.
+    The access token is passed as a query parameter.
+    """
+    try:
+        user = await get_user_from_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    # Subscribed before the membership check, so a removal can't slip in between
+    async with message_hub.subscribe(
+        conversation_topic(str(conversation_id)), member=user["user_id"]
+    ) as subscription:
+        try:
+            await _require_participant(str(conversation_id), user["user_id"])
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        
+        await websocket.accept()
+        tasks = {
+            asyncio.create_task(_drain_websocket(websocket)),
+            asyncio.create_task(_forward_to_websocket(websocket, subscription)),
+        }
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+@router.get("/conversations/{conversation_id}/stream")
+async def stream_conversation(
+    conversation_id: UUID,
+    token: str = Query(...)
+):
+    """
+    Server-Sent Events fallback for clients that can't open a WebSocket.
+    """
+    user = await get_user_from_token(token)
+    await _require_participant(str(conversation_id), user["user_id"])
+    
+    async def event_stream():
+        async with message_hub.subscribe(
+            conversation_topic(str(conversation_id)), member=user["user_id"]
+        ) as subscription:
+            try:
+                # The user may have been removed since the check above
+                await _require_participant(str(conversation_id), user["user_id"])
+            except HTTPException:
+                subscription.close()
+            yield ": connected\n\n"
+            while True:
+                payload = await subscription.get(timeout=settings.REALTIME_HEARTBEAT_SECONDS)
+                if subscription.closed:
+                    yield "event: removed\ndata: {}\n\n"
+                    return
+                if subscription.overflowed:
+                    yield "event: overflow\ndata: {}\n\n"
+                    return
+                if payload is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # Participants endpoints
@@ -251,25 +389,14 @@ async def get_participants(
     conversation_id: UUID,
     current_user: Dict = Depends(get_current_user)
 ):
-    # Check if user is a participant
-    participant_check = supabase.table("participants") \
+    await _require_participant(str(conversation_id), current_user["user_id"])
+    
+    # Get all participants
+    response = await supabase.table("participants") \
                             .select("*") \
                             .eq("conversation_id", str(conversation_id)) \
-                            .eq("user_id", current_user["user_id"]) \
                             .execute()
     
-    if hasattr(participant_check, 'error') and participant_check.error is not None:
-        raise HTTPException(status_code=400, detail=str(participant_check.error))
-    
-    if not participant_check.data:
-        raise HTTPException(status_code=403, detail="You're not a participant in this conversation")
-    
-    # Get all participants
-    response = supabase.table("participants") \
-                      .select("*") \
-                      .eq("conversation_id", str(conversation_id)) \
-                      .execute()
-    
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
@@ -282,27 +409,21 @@ async def add_participant(
     participant: ParticipantCreate,
     current_user: Dict = Depends(get_current_user)
 ):
-    # Check if user is a participant
-    participant_check = supabase.table("participants") \
-                            .select("*") \
-                            .eq("conversation_id", str(conversation_id)) \
-                            .eq("user_id", current_user["user_id"]) \
-                            .execute()
-    
-    if hasattr(participant_check, 'error') and participant_check.error is not None:
-        raise HTTPException(status_code=400, detail=str(participant_check.error))
-    
-    if not participant_check.data:
-        raise HTTPException(status_code=403, detail="You're not a participant in this conversation")
+    await _require_participant(str(conversation_id), current_user["user_id"])
     
     # Add new participant
-    response = supabase.table("participants") \
-                      .insert(participant.dict()) \
-                      .execute()
+    participant_data = participant.dict()
+    participant_data["conversation_id"] = str(conversation_id)
+    
+    response = await supabase.table("participants") \
+                            .insert(participant_data) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
+    await membership_cache.invalidate(str(participant.user_id), str(conversation_id))
+    
     return response.data[0]
 
 
@@ -313,10 +434,10 @@ async def remove_participant(
     current_user: Dict = Depends(get_current_user)
 ):
     # Check if the conversation is a group chat (can't remove from direct messages)
-    conversation_check = supabase.table("conversations") \
-                              .select("*") \
-                              .eq("id", str(conversation_id)) \
-                              .execute()
+    conversation_check = await supabase.table("conversations") \
+                                    .select("*") \
+                                    .eq("id", str(conversation_id)) \
+                                    .execute()
     
     if hasattr(conversation_check, 'error') and conversation_check.error is not None:
         raise HTTPException(status_code=400, detail=str(conversation_check.error))
@@ -333,15 +454,19 @@ async def remove_participant(
         raise HTTPException(status_code=403, detail="You can only remove yourself from a conversation")
     
     # Remove participant
-    response = supabase.table("participants") \
-                      .delete() \
-                      .eq("conversation_id", str(conversation_id)) \
-                      .eq("user_id", str(user_id)) \
-                      .execute()
+    response = await supabase.table("participants") \
+                            .delete() \
+                            .eq("conversation_id", str(conversation_id)) \
+                            .eq("user_id", str(user_id)) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
+    await membership_cache.invalidate(str(user_id), str(conversation_id))
+    # Open WebSockets and event streams of the removed user stop receiving messages
+    await message_hub.revoke(conversation_topic(str(conversation_id)), str(user_id))
+    
     if not response.data:
         raise HTTPException(status_code=404, detail="Participant not found")
     
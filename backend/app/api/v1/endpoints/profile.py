@@ -14,7 +14,7 @@ async def get_profile(current_user: Dict = Depends(get_current_user)):
     """
     try:
         # Get the profile data from Supabase
-        response = supabase.table("profiles").select("*").eq("id", current_user["user_id"]).execute()
+        response = await supabase.table("profiles").select("*").eq("id", current_user["user_id"]).execute()
         data = response.data
         
         if not data or len(data) == 0:
@@ -44,7 +44,7 @@ async def update_profile(
         update_data = profile_update.dict(exclude_unset=True)
         
         # Update the profile in Supabase
-        response = supabase.table("profiles").update(update_data).eq("id", current_user["user_id"]).execute()
+        response = await supabase.table("profiles").update(update_data).eq("id", current_user["user_id"]).execute()
         data = response.data
         
         if not data or len(data) == 0:
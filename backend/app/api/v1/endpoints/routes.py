@@ -1,44 +1,151 @@
 
-from typing import List, Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Dict, Literal, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from uuid import UUID
 
 from app.core.auth import get_current_user
-from app.schemas.route import RouteCreate, RouteUpdate, RouteResponse
+from app.core.mutations import update_owned, delete_owned
+from app.core.pagination import paged, paginate
+from app.core.projection import build_select
+from app.schemas.pagination import Page
+from app.schemas.route import (
+    RouteCreate, RouteUpdate, RouteResponse, RouteSummary, RouteListItem, RouteNearItem
+)
 from app.db import supabase
+from app.services.route_geometry import (
+    compute_route_columns, detail_for_zoom, fill_missing_coordinates, route_select,
+)
+from app.services.spatial import SpatialQueryError, parse_bbox, spatial_index
 
 router = APIRouter()
 
+RouteDetail = Literal["low", "medium", "high", "full"]
+ROUTE_COLUMNS = list(RouteResponse.model_fields)
 
-@router.get("", response_model=List[RouteResponse])
+
+def _detail_level(detail: Optional[str], zoom: Optional[float]) -> str:
+    if detail is not None:
+        return detail
+    if zoom is not None:
+        return detail_for_zoom(zoom)
+    return "full"
+
+
+@router.get("", response_model=Union[List[RouteListItem], Page[RouteListItem]], response_model_exclude_unset=True)
 async def get_routes(
+    http_response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "full",
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    detail: Optional[RouteDetail] = Query(None, description="Level of detail of coordinates"),
+    zoom: Optional[float] = Query(None, ge=0, le=24, description="Map zoom to pick the level of detail for"),
+    envelope: bool = Query(False, description="Return {items, next_cursor} instead of a list"),
     current_user: Dict = Depends(get_current_user)
 ):
-    response = supabase.table("routes_data") \
-                      .select("*") \
-                      .eq("user_id", current_user["user_id"]) \
-                      .range(skip, skip + limit - 1) \
-                      .order("created_at", desc=True) \
-                      .execute()
+    columns = build_select(
+        RouteResponse, RouteSummary, view, fields, required=("id", "created_at")
+    )
+    columns = ROUTE_COLUMNS if columns == "*" else columns.split(",")
+    level = _detail_level(detail, zoom)
+    query = supabase.table("routes_data") \
+                    .select(route_select(columns, level)) \
+                    .eq("user_id", current_user["user_id"])
+    response = await paginate(query, "created_at", limit, cursor=cursor, skip=skip).execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
     
-    return response.data
+    if level != "full":
+        await fill_missing_coordinates(response.data)
+    
+    return paged(http_response, response.data, "created_at", limit, envelope)
+
+
+@router.get("/within", response_model=List[RouteListItem], response_model_exclude_unset=True)
+async def get_routes_within(
+    bbox: str = Query(..., description="Viewport as min_lng,min_lat,max_lng,max_lat"),
+    limit: int = Query(500, ge=1, le=5000),
+    view: Literal["summary", "full"] = "full",
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    detail: Optional[RouteDetail] = Query(None, description="Level of detail of coordinates"),
+    zoom: Optional[float] = Query(None, ge=0, le=24, description="Map zoom to pick the level of detail for"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get the routes whose bounding box intersects a viewport.
+    """
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    columns = build_select(
+        RouteResponse, RouteSummary, view, fields, required=("id", "created_at")
+    )
+    columns = ROUTE_COLUMNS if columns == "*" else columns.split(",")
+    level = _detail_level(detail, zoom)
+    try:
+        rows = await spatial_index.within(
+            "routes_data", current_user["user_id"], box, route_select(columns, level), limit
+        )
+    except SpatialQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if level != "full":
+        await fill_missing_coordinates(rows)
+
+    return rows
+
+
+@router.get("/near", response_model=List[RouteNearItem], response_model_exclude_unset=True)
+async def get_routes_near(
+    lng: float = Query(..., ge=-180, le=180),
+    lat: float = Query(..., ge=-90, le=90),
+    radius_m: float = Query(1000, gt=0, le=100_000, description="Search radius around the point"),
+    limit: int = Query(50, ge=1, le=500),
+    view: Literal["summary", "full"] = "summary",
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    detail: Optional[RouteDetail] = Query(None, description="Level of detail of coordinates"),
+    zoom: Optional[float] = Query(None, ge=0, le=24, description="Map zoom to pick the level of detail for"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get the routes starting within ``radius_m`` of a point, nearest first.
+    """
+    columns = build_select(
+        RouteResponse, RouteSummary, view, fields, required=("id", "created_at")
+    )
+    columns = ROUTE_COLUMNS if columns == "*" else columns.split(",")
+    level = _detail_level(detail, zoom)
+    try:
+        rows = await spatial_index.near(
+            "routes_data", current_user["user_id"], lng, lat, radius_m,
+            route_select(columns + ["start_lng", "start_lat"], level), limit
+        )
+    except SpatialQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if level != "full":
+        await fill_missing_coordinates(rows)
+
+    return rows
 
 
 @router.get("/{route_id}", response_model=RouteResponse)
 async def get_route(
     route_id: UUID,
+    detail: Optional[RouteDetail] = Query(None, description="Level of detail of coordinates"),
+    zoom: Optional[float] = Query(None, ge=0, le=24, description="Map zoom to pick the level of detail for"),
     current_user: Dict = Depends(get_current_user)
 ):
-    response = supabase.table("routes_data") \
-                      .select("*") \
-                      .eq("id", str(route_id)) \
-                      .eq("user_id", current_user["user_id"]) \
-                      .execute()
+    level = _detail_level(detail, zoom)
+    response = await supabase.table("routes_data") \
+                            .select(route_select(ROUTE_COLUMNS, level)) \
+                            .eq("id", str(route_id)) \
+                            .eq("user_id", current_user["user_id"]) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -46,6 +153,9 @@ async def get_route(
     if not response.data:
         raise HTTPException(status_code=404, detail="Route not found")
     
+    if level != "full":
+        await fill_missing_coordinates(response.data)
+    
     return response.data[0]
 
 
@@ -56,10 +166,12 @@ async def create_route(
 ):
     route_data = route.dict()
     route_data["user_id"] = current_user["user_id"]
+    route_data.update(await compute_route_columns(route.coordinates))
     
-    response = supabase.table("routes_data") \
-                      .insert(route_data) \
-                      .execute()
+    response = await supabase.table("routes_data") \
+                            .insert(route_data) \
+                            .select(",".join(ROUTE_COLUMNS)) \
+                            .execute()
     
     if hasattr(response, 'error') and response.error is not None:
         raise HTTPException(status_code=400, detail=str(response.error))
@@ -73,31 +185,15 @@ async def update_route(
     route: RouteUpdate,
     current_user: Dict = Depends(get_current_user)
 ):
-    # First check if route exists and belongs to user
-    check_response = supabase.table("routes_data") \
-                           .select("id") \
-                           .eq("id", str(route_id)) \
-                           .eq("user_id", current_user["user_id"]) \
-                           .execute()
-    
-    if hasattr(check_response, 'error') and check_response.error is not None:
-        raise HTTPException(status_code=400, detail=str(check_response.error))
-    
-    if not check_response.data:
-        raise HTTPException(status_code=404, detail="Route not found or you don't have permission")
-    
     update_data = {k: v for k, v in route.dict().items() if v is not None}
-    
-    response = supabase.table("routes_data") \
-                      .update(update_data) \
-                      .eq("id", str(route_id)) \
-                      .eq("user_id", current_user["user_id"]) \
-                      .execute()
-    
-    if hasattr(response, 'error') and response.error is not None:
-        raise HTTPException(status_code=400, detail=str(response.error))
-    
-    return response.data[0]
+    if "coordinates" in update_data:
+        update_data.update(await compute_route_columns(update_data["coordinates"]))
+    
+    return await update_owned(
+        "routes_data", str(route_id), "user_id", current_user["user_id"], update_data,
+        detail="Route not found or you don't have permission",
+        columns=",".join(ROUTE_COLUMNS)
+    )
 
 
 @router.delete("/{route_id}")
@@ -105,26 +201,9 @@ async def delete_route(
     route_id: UUID,
     current_user: Dict = Depends(get_current_user)
 ):
-    # First check if route exists and belongs to user
-    check_response = supabase.table("routes_data") \
-                           .select("id") \
-                           .eq("id", str(route_id)) \
-                           .eq("user_id", current_user["user_id"]) \
-                           .execute()
-    
-    if hasattr(check_response, 'error') and check_response.error is not None:
-        raise HTTPException(status_code=400, detail=str(check_response.error))
-    
-    if not check_response.data:
-        raise HTTPException(status_code=404, detail="Route not found or you don't have permission")
-    
-    response = supabase.table("routes_data") \
-                      .delete() \
-                      .eq("id", str(route_id)) \
-                      .eq("user_id", current_user["user_id"]) \
-                      .execute()
-    
-    if hasattr(response, 'error') and response.error is not None:
-        raise HTTPException(status_code=400, detail=str(response.error))
+    await delete_owned(
+        "routes_data", str(route_id), "user_id", current_user["user_id"],
+        detail="Route not found or you don't have permission"
+    )
     
     return {"message": "Route deleted successfully"}
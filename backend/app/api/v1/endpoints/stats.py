@@ -0,0 +1,74 @@
+from datetime import date
+from typing import Dict, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.core.auth import get_current_user
+from app.schemas.job import JobResponse
+from app.schemas.stats import ActivityStatsBucket
+from app.services.activity_stats import STATS_REBUILD_JOB_KIND, StatsError, get_stats
+from app.services.jobs import JobError, job_queue
+
+router = APIRouter()
+
+
+@router.get("", response_model=List[ActivityStatsBucket])
+async def get_training_stats(
+    period: Literal["week", "month", "year"] = "week",
+    activity_type: Optional[str] = Query(None, alias="type", description="Only this sport type"),
+    since: Optional[date] = Query(None, description="Earliest period start to include"),
+    until: Optional[date] = Query(None, description="Latest period start to include"),
+    limit: int = Query(500, ge=1, le=5000),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Distance, climbing, time and activity count per week, month or year.
+
+    One bucket is returned per period and sport type, most recent first;
+    weeks start on Monday and all periods are in UTC. Sum buckets with the
+    same ``period_start`` for totals across types.
+    """
+    try:
+        return await get_stats(
+            current_user["user_id"], period, activity_type, since, until, limit
+        )
+    except StatsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/rebuild", status_code=202)
+async def rebuild_training_stats(
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Queue a recomputation of the user's stats from their activities.
+    Poll ``GET /rebuild/{job_id}``.
+    """
+    try:
+        job, created = await job_queue.enqueue(STATS_REBUILD_JOB_KIND, current_user["user_id"])
+    except JobError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue stats rebuild: {str(e)}")
+
+    return {
+        "message": "Stats rebuild queued" if created else "Stats rebuild already in progress",
+        "job_id": job["id"],
+        "status": job["status"],
+    }
+
+
+@router.get("/rebuild/{job_id}", response_model=JobResponse)
+async def get_stats_rebuild_status(
+    job_id: str,
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get the status of a stats rebuild job.
+    """
+    try:
+        job = await job_queue.get(job_id, current_user["user_id"])
+    except JobError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if job is None or job["kind"] != STATS_REBUILD_JOB_KIND:
+        raise HTTPException(status_code=404, detail="Rebuild job not found")
+
+    return job
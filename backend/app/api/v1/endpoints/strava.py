@@ -1,27 +1,28 @@
 
 from typing import Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import RedirectResponse
 import urllib.parse
 import secrets
 import time
-from datetime import datetime, timedelta
-import requests
+from datetime import datetime
+import httpx
 
 from app.core.auth import get_current_user
 from app.schemas.user_connection import UserConnectionCreate, UserConnectionUpdate
 from app.db import supabase
 from app.core.config import settings
+from app.schemas.job import JobResponse
+from app.schemas.strava_webhook import StravaWebhookEvent
+from app.services.jobs import JobError, job_queue
+from app.services.strava import SYNC_JOB_KIND, StravaError, get_connection, strava_client, token_manager
+from app.services.strava_backfill import BACKFILL_JOB_KIND
+from app.services.strava_streams import STREAMS_JOB_KIND
+from app.services.strava_webhooks import webhook_consumer
 
 router = APIRouter()
 
-# Constants for Strava API
-STRAVA_CLIENT_ID = "YOUR_STRAVA_CLIENT_ID"  # Replace with actual client ID or environment variable
-STRAVA_CLIENT_SECRET = "YOUR_STRAVA_CLIENT_SECRET"  # Replace with actual client secret or environment variable
 STRAVA_AUTH_URL = "https://www.strava.com/oauth/authorize"
-STRAVA_TOKEN_URL = "https://www.strava.com/oauth/token"
-STRAVA_API_BASE = "https://www.strava.com/api/v3"
-STRAVA_REDIRECT_URI = "http://localhost:8000/api/v1/strava/callback"  # Update based on your actual URL
 
 
 @router.get("/auth")
@@ -37,8 +38,8 @@ async def authorize_strava(request: Request):
     
     # Build authorization URL
     params = {
-        "client_id": STRAVA_CLIENT_ID,
-        "redirect_uri": STRAVA_REDIRECT_URI,
+        "client_id": settings.STRAVA_CLIENT_ID,
+        "redirect_uri": settings.STRAVA_REDIRECT_URI,
         "response_type": "code",
         "approval_prompt": "auto",
         "scope": "read,activity:read_all,profile:read_all",
@@ -73,16 +74,15 @@ async def strava_callback(
     
     # Exchange the code for an access token
     token_data = {
-        "client_id": STRAVA_CLIENT_ID,
-        "client_secret": STRAVA_CLIENT_SECRET,
+        "client_id": settings.STRAVA_CLIENT_ID,
+        "client_secret": settings.STRAVA_CLIENT_SECRET,
         "code": code,
         "grant_type": "authorization_code"
     }
     
     try:
         # Make a POST request to Strava to get the tokens
-        token_response = requests.post(STRAVA_TOKEN_URL, data=token_data)
-        token_response.raise_for_status()
+        token_response = await strava_client.request("POST", settings.STRAVA_TOKEN_URL, data=token_data)
         token_info = token_response.json()
         
         # Extract token data
@@ -100,7 +100,7 @@ async def strava_callback(
         frontend_url = "http://localhost:3000/profile?strava_connected=true"
         return RedirectResponse(url=frontend_url)
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Failed to get Strava token: {str(e)}")
 
 
@@ -125,11 +125,11 @@ async def connect_strava(
             raise HTTPException(status_code=400, detail="Missing required token information")
         
         # Check if a connection already exists
-        existing_connection = supabase.table("user_connections") \
-                                    .select("*") \
-                                    .eq("user_id", current_user["user_id"]) \
-                                    .eq("provider", "strava") \
-                                    .execute()
+        existing_connection = await supabase.table("user_connections") \
+                                          .select("*") \
+                                          .eq("user_id", current_user["user_id"]) \
+                                          .eq("provider", "strava") \
+                                          .execute()
         
         connection_data = {
             "provider": "strava",
@@ -145,172 +145,160 @@ async def connect_strava(
         if existing_connection.data:
             # Update existing connection
             connection_id = existing_connection.data[0]["id"]
-            response = supabase.table("user_connections") \
-                            .update(connection_data) \
-                            .eq("id", connection_id) \
-                            .execute()
+            response = await supabase.table("user_connections") \
+                                  .update(connection_data) \
+                                  .eq("id", connection_id) \
+                                  .execute()
         else:
             # Create new connection
-            response = supabase.table("user_connections") \
-                            .insert(connection_data) \
-                            .execute()
+            response = await supabase.table("user_connections") \
+                                  .insert(connection_data) \
+                                  .execute()
         
         if hasattr(response, 'error') and response.error is not None:
             raise HTTPException(status_code=400, detail=str(response.error))
         
+        token_manager.invalidate(current_user["user_id"])
+        
         return {"message": "Strava connection saved successfully"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save Strava connection: {str(e)}")
 
 
-@router.post("/sync")
+@router.post("/sync", status_code=202)
 async def sync_strava_activities(
     current_user: Dict = Depends(get_current_user)
 ):
     """
-    Sync activities from Strava for the authenticated user.
+    Queue a sync of activities from Strava for the authenticated user.
+
+    Returns immediately with a job to poll at ``GET /sync/{job_id}``. If a
+    sync is already queued or running for the user, that job is returned.
     """
     try:
-        # Get the user's Strava connection
-        connection_response = supabase.table("user_connections") \
-                                  .select("*") \
-                                  .eq("user_id", current_user["user_id"]) \
-                                  .eq("provider", "strava") \
-                                  .execute()
-        
-        if hasattr(connection_response, 'error') and connection_response.error is not None:
-            raise HTTPException(status_code=400, detail=str(connection_response.error))
-        
-        if not connection_response.data:
-            raise HTTPException(status_code=404, detail="No Strava connection found for user")
-        
-        connection = connection_response.data[0]
-        
-        # Check if token is expired and refresh if needed
-        now = datetime.now()
-        token_expires_at = datetime.fromisoformat(connection["expires_at"].replace("Z", "+00:00"))
-        
-        access_token = connection["access_token"]
-        
-        if token_expires_at <= now:
-            # Refresh the token
-            refresh_data = {
-                "client_id": STRAVA_CLIENT_ID,
-                "client_secret": STRAVA_CLIENT_SECRET,
-                "grant_type": "refresh_token",
-                "refresh_token": connection["refresh_token"]
-            }
-            
-            refresh_response = requests.post(STRAVA_TOKEN_URL, data=refresh_data)
-            refresh_response.raise_for_status()
-            
-            token_info = refresh_response.json()
-            access_token = token_info["access_token"]
-            refresh_token = token_info["refresh_token"]
-            expires_at = datetime.fromtimestamp(token_info["expires_at"])
-            
-            # Update the stored token
-            update_response = supabase.table("user_connections") \
-                                .update({
-                                    "access_token": access_token,
-                                    "refresh_token": refresh_token,
-                                    "expires_at": expires_at.isoformat()
-                                }) \
-                                .eq("id", connection["id"]) \
-                                .execute()
-        
-        # Get activities from Strava
-        # This is a placeholder - in a real implementation, you would:
-        # 1. Find the most recent activity already imported
-        # 2. Use 'after' parameter to only get new activities
-        # 3. Handle pagination for large numbers of activities
-        activities_url = f"{STRAVA_API_BASE}/athlete/activities"
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
-        
-        # For this demo, just get the last 30 days of activities
-        after = int((datetime.now() - timedelta(days=30)).timestamp())
-        params = {
-            "after": after,
-            "per_page": 100  # Maximum allowed by Strava
-        }
-        
-        # Placeholder for the actual API call
-        # activities_response = requests.get(activities_url, headers=headers, params=params)
-        # activities_response.raise_for_status()
-        # strava_activities = activities_response.json()
-        
-        # Placeholder data for demonstration
-        strava_activities = [
-            {
-                "id": 1234567890,
-                "name": "Morning Ride",
-                "type": "Ride",
-                "start_date": "2023-01-01T09:00:00Z",
-                "distance": 20000,  # meters
-                "moving_time": 3600,  # seconds
-                "elapsed_time": 4000,  # seconds
-                "total_elevation_gain": 500,  # meters
-                "average_speed": 5.5,  # meters/second
-                "max_speed": 10.2,  # meters/second
-                "average_cadence": 85,
-                "average_watts": 200,
-                "kilojoules": 720,
-                "average_heartrate": 145,
-                "max_heartrate": 175
-            }
-        ]
-        
-        # Process and store each activity
-        activities_imported = 0
-        for strava_activity in strava_activities:
-            # Check if activity already exists
-            existing_check = supabase.table("activities") \
-                                .select("id") \
-                                .eq("strava_activity_id", strava_activity["id"]) \
-                                .execute()
-            
-            if existing_check.data:
-                continue  # Skip if already imported
-            
-            # Convert to our format
-            activity_data = {
-                "name": strava_activity["name"],
-                "type": strava_activity["type"],
-                "strava_activity_id": strava_activity["id"],
-                "start_date": strava_activity["start_date"],
-                "distance_km": strava_activity["distance"] / 1000,  # convert to km
-                "elevation_gain_m": strava_activity["total_elevation_gain"],
-                "moving_time_seconds": strava_activity["moving_time"],
-                "elapsed_time_seconds": strava_activity["elapsed_time"],
-                "average_speed_kph": strava_activity["average_speed"] * 3.6,  # convert m/s to km/h
-                "max_speed_kph": strava_activity["max_speed"] * 3.6,  # convert m/s to km/h
-                "user_id": current_user["user_id"]
-            }
-            
-            # Add optional fields if present
-            if "average_cadence" in strava_activity:
-                activity_data["average_cadence_rpm"] = strava_activity["average_cadence"]
-            
-            if "average_watts" in strava_activity:
-                activity_data["average_watts"] = strava_activity["average_watts"]
-            
-            if "average_heartrate" in strava_activity:
-                activity_data["average_heartrate_bpm"] = strava_activity["average_heartrate"]
-            
-            if "max_heartrate" in strava_activity:
-                activity_data["max_heartrate_bpm"] = strava_activity["max_heartrate"]
-            
-            # Insert into database (this is a placeholder - actual implementation would include error handling)
-            # supabase.table("activities").insert(activity_data).execute()
-            activities_imported += 1
-        
-        return {
-            "message": f"Strava sync completed",
-            "activities_imported": activities_imported
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to sync Strava activities: {str(e)}")
+        await get_connection(current_user["user_id"])
+    except StravaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        job, created = await job_queue.enqueue(SYNC_JOB_KIND, current_user["user_id"])
+    except JobError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue Strava sync: {str(e)}")
+
+    return {
+        "message": "Strava sync queued" if created else "Strava sync already in progress",
+        "job_id": job["id"],
+        "status": job["status"],
+    }
+
+
+@router.post("/backfill", status_code=202)
+async def backfill_strava_activities(
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Queue an import of the user's full Strava history.
+
+    The import resumes from its last checkpoint, so calling this again after
+    a failure continues where it stopped. Poll ``GET /backfill/{job_id}``.
+    """
+    try:
+        await get_connection(current_user["user_id"])
+    except StravaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        job, created = await job_queue.enqueue(BACKFILL_JOB_KIND, current_user["user_id"])
+    except JobError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue Strava backfill: {str(e)}")
+
+    return {
+        "message": "Strava backfill queued" if created else "Strava backfill already in progress",
+        "job_id": job["id"],
+        "status": job["status"],
+    }
+
+
+@router.post("/streams", status_code=202)
+async def import_strava_streams(
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Queue an import of per-second streams for Strava activities that have none.
+    Poll ``GET /streams/{job_id}``.
+    """
+    try:
+        await get_connection(current_user["user_id"])
+    except StravaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        job, created = await job_queue.enqueue(STREAMS_JOB_KIND, current_user["user_id"])
+    except JobError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue stream import: {str(e)}")
+
+    return {
+        "message": "Stream import queued" if created else "Stream import already in progress",
+        "job_id": job["id"],
+        "status": job["status"],
+    }
+
+
+@router.get("/sync/{job_id}", response_model=JobResponse)
+@router.get("/backfill/{job_id}", response_model=JobResponse)
+@router.get("/streams/{job_id}", response_model=JobResponse)
+async def get_strava_sync_status(
+    job_id: str,
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get the status and progress of a Strava sync, backfill or stream import job.
+    """
+    try:
+        job = await job_queue.get(job_id, current_user["user_id"])
+    except JobError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+
+    return job
+
+
+@router.get("/webhook")
+async def validate_strava_webhook(
+    hub_mode: str = Query(..., alias="hub.mode"),
+    hub_challenge: str = Query(..., alias="hub.challenge"),
+    hub_verify_token: str = Query(..., alias="hub.verify_token"),
+):
+    """
+    Answer Strava's handshake when the push subscription is created.
+    """
+    if (
+        hub_mode != "subscribe"
+        or not settings.STRAVA_WEBHOOK_VERIFY_TOKEN
+        or not secrets.compare_digest(hub_verify_token, settings.STRAVA_WEBHOOK_VERIFY_TOKEN)
+    ):
+        raise HTTPException(status_code=403, detail="Invalid webhook verification request")
+
+    return {"hub.challenge": hub_challenge}
+
+
+@router.post("/webhook")
+async def receive_strava_webhook(event: StravaWebhookEvent):
+    """
+    Receive a push event from Strava.
+
+    The event is queued and acknowledged immediately; Strava expects a
+    response within two seconds. Every event is rejected until
+    ``STRAVA_WEBHOOK_SUBSCRIPTION_ID`` is configured.
+    """
+    if (
+        settings.STRAVA_WEBHOOK_SUBSCRIPTION_ID is None
+        or event.subscription_id != settings.STRAVA_WEBHOOK_SUBSCRIPTION_ID
+    ):
+        raise HTTPException(status_code=403, detail="Unknown webhook subscription")
+
+    webhook_consumer.submit(event)
+    return {"message": "Event received"}
@@ -0,0 +1,483 @@
+
+import gzip
+import struct
+import zlib
+import xml.etree.ElementTree as ElementTree
+from array import array
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Per-point channels read from a file; missing samples are NaN
+CHANNELS = (
+    "time",       # s since the epoch
+    "lat",        # degrees
+    "lng",        # degrees
+    "altitude",   # m
+    "distance",   # m, cumulative as recorded by the device
+    "speed",      # m/s as recorded by the device
+    "heartrate",  # bpm
+    "cadence",    # rpm
+    "watts",      # W
+    "temp",       # degrees C
+)
+
+# File sport names (GPX ``type``, TCX ``Sport``, FIT ``sport``) to activity types
+SPORT_TYPES = {
+    "biking": "Ride", "cycling": "Ride", "ride": "Ride", "road_biking": "Ride",
+    "mountain_biking": "Ride", "running": "Run", "run": "Run", "trail_running": "Run",
+    "walking": "Walk", "walk": "Walk", "hiking": "Hike", "hike": "Hike",
+    "swimming": "Swim", "swim": "Swim", "rowing": "Rowing",
+}
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_SNIFF_BYTES = 1024
+
+
+class ActivityFileError(ValueError):
+    """
+    Raised when an uploaded file can't be read as an activity.
+    """
+
+
+class ParsedActivity(NamedTuple):
+    points: Dict[str, np.ndarray]
+    name: Optional[str]
+    type: Optional[str]
+    # The recording's own identifier, where the format has one (FIT file_id)
+    file_id: Optional[str] = None
+
+
+def _missing(count: int) -> np.ndarray:
+    # A read-only all-NaN view that takes no memory
+    return np.broadcast_to(np.float64(np.nan), (count,))
+
+
+class _Points:
+    """
+    Growable float64 columns, kept as ``array`` buffers (8 bytes a sample)
+    rather than lists of Python floats. A column is only created once its
+    channel shows up.
+    """
+
+    def __init__(self):
+        self.columns: Dict[str, array] = {}
+        self.count = 0
+
+    def append(self, values: Dict[str, float]) -> None:
+        if not values.keys() <= self.columns.keys():
+            for channel in values.keys() - self.columns.keys():
+                self.columns[channel] = array("d", [np.nan]) * self.count
+        for channel, column in self.columns.items():
+            column.append(values.get(channel, np.nan))
+        self.count += 1
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            channel: np.frombuffer(self.columns[channel], dtype=np.float64)
+            if channel in self.columns else _missing(self.count)
+            for channel in CHANNELS
+        }
+
+
+def sport_type(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    return SPORT_TYPES.get(value.strip().lower().replace(" ", "_"))
+
+
+def _timestamp(text: Optional[str]) -> float:
+    if not text:
+        return np.nan
+    try:
+        parsed = datetime.fromisoformat(text.strip())
+    except ValueError:
+        return np.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _number(text: Optional[str]) -> float:
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+# Local tag names inside a GPX ``trkpt`` / TCX ``Trackpoint``, by channel
+_XML_FIELDS = {
+    "ele": "altitude", "AltitudeMeters": "altitude",
+    "DistanceMeters": "distance",
+    "Speed": "speed", "speed": "speed",
+    "hr": "heartrate",
+    "cad": "cadence", "Cadence": "cadence", "RunCadence": "cadence",
+    "power": "watts", "Watts": "watts",
+    "atemp": "temp", "temp": "temp",
+    "LatitudeDegrees": "lat", "LongitudeDegrees": "lng",
+}
+
+
+def _xml_point(element: ElementTree.Element) -> Dict[str, float]:
+    values: Dict[str, float] = {}
+    if "lat" in element.attrib:
+        values["lat"] = _number(element.get("lat"))
+        values["lng"] = _number(element.get("lon"))
+    for child in element.iter():
+        tag = _local(child.tag)
+        if tag in ("time", "Time"):
+            values["time"] = _timestamp(child.text)
+        elif tag == "Value" and "heartrate" not in values:
+            # TCX nests the heart rate as HeartRateBpm/Value
+            values["heartrate"] = _number(child.text)
+        elif tag in _XML_FIELDS and _XML_FIELDS[tag] not in values:
+            values[_XML_FIELDS[tag]] = _number(child.text)
+    return values
+
+
+def parse_xml(stream: BinaryIO) -> ParsedActivity:
+    """
+    Read a GPX or TCX file incrementally.
+
+    Elements are dropped as soon as their track point has been read, so
+    memory stays proportional to the point columns rather than the document.
+    Expat doesn't fetch external entities and caps entity expansion.
+    """
+    points = _Points()
+    names: Dict[str, str] = {}
+    sport: Optional[str] = None
+    stack: List[ElementTree.Element] = []
+    try:
+        for event, element in ElementTree.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                stack.append(element)
+                if _local(element.tag) == "Activity" and sport is None:
+                    sport = element.get("Sport")
+                continue
+
+            stack.pop()
+            tag = _local(element.tag)
+            if tag in ("trkpt", "Trackpoint"):
+                points.append(_xml_point(element))
+            elif tag == "name" and stack and _local(stack[-1].tag) in ("trk", "metadata"):
+                names.setdefault(_local(stack[-1].tag), (element.text or "").strip())
+            elif tag == "type" and sport is None and stack and _local(stack[-1].tag) == "trk":
+                sport = element.text
+            else:
+                continue
+            element.clear()
+            if stack:
+                stack[-1].remove(element)
+    except ElementTree.ParseError as e:
+        raise ActivityFileError(f"Invalid GPX/TCX file: {e}")
+
+    if not points.count:
+        raise ActivityFileError("No track points found in file")
+    # The track's own name is more specific than the file's
+    name = names.get("trk") or names.get("metadata") or None
+    return ParsedActivity(points.arrays(), name, sport_type(sport))
+
+
+# FIT timestamps count seconds from 1989-12-31T00:00:00Z
+_FIT_EPOCH = 631_065_600
+
+_FIT_FILE_ID = 0
+_FIT_SESSION = 18
+_FIT_RECORD = 20
+_FIT_TIMESTAMP = 253
+_FIT_SESSION_SPORT = 5
+_FIT_FILE_ID_SERIAL = 3
+_FIT_FILE_ID_CREATED = 4
+_FIT_CHUNK = 64 * 1024
+
+# Record message fields: number -> (channel, NumPy type, scale, offset)
+_FIT_RECORD_FIELDS = {
+    _FIT_TIMESTAMP: ("time", "u4", 1, -_FIT_EPOCH),
+    0: ("lat", "i4", 2 ** 31 / 180, 0),        # semicircles
+    1: ("lng", "i4", 2 ** 31 / 180, 0),
+    2: ("altitude", "u2", 5, 500),
+    3: ("heartrate", "u1", 1, 0),
+    4: ("cadence", "u1", 1, 0),
+    5: ("distance", "u4", 100, 0),
+    6: ("speed", "u2", 1000, 0),
+    7: ("watts", "u2", 1, 0),
+    13: ("temp", "i1", 1, 0),
+    73: ("speed", "u4", 1000, 0),              # enhanced_speed
+    78: ("altitude", "u4", 5, 500),            # enhanced_altitude
+}
+_FIT_SPORTS = {1: "running", 2: "cycling", 5: "swimming", 11: "walking", 15: "rowing", 17: "hiking"}
+
+# Value FIT uses for "no data", by type
+_FIT_INVALID = {"u1": 0xFF, "i1": 0x7F, "u2": 0xFFFF, "u4": 0xFFFFFFFF, "i4": 0x7FFFFFFF}
+
+
+class _FitDefinition(NamedTuple):
+    global_number: int
+    size: int
+    endian: str
+    # Record fields as a structured type over the message body, sport offset for sessions
+    dtype: Optional[np.dtype]
+    sport_offset: Optional[int]
+    timestamp_offset: Optional[int]
+    # Serial number and time created offsets for file_id messages
+    file_id_offsets: Optional[Tuple[int, int]] = None
+
+
+class _FitReader:
+    """
+    Exact reads over a stream through a chunk buffer; FIT messages are too
+    small to fetch from the stream one at a time.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.buffer = b""
+        self.position = 0
+
+    def read(self, size: int) -> bytes:
+        end = self.position + size
+        if end > len(self.buffer):
+            self.buffer = self.buffer[self.position:] + self.stream.read(max(size, _FIT_CHUNK))
+            self.position, end = 0, size
+            if end > len(self.buffer):
+                raise ActivityFileError("Truncated FIT file")
+        data = self.buffer[self.position:end]
+        self.position = end
+        return data
+
+    def at_end(self) -> bool:
+        if self.position < len(self.buffer):
+            return False
+        self.buffer, self.position = self.stream.read(_FIT_CHUNK), 0
+        return not self.buffer
+
+
+def _fit_definition(reader: _FitReader, developer: bool) -> Tuple[_FitDefinition, int]:
+    """
+    Read a definition message after its header byte; returns it and its length.
+    """
+    _, architecture = reader.read(2)
+    endian = ">" if architecture else "<"
+    global_number, count = struct.unpack(endian + "HB", reader.read(3))
+    raw = reader.read(3 * count)
+    size = 0
+    fields: Dict[str, Tuple[str, int]] = {}
+    sport_offset = timestamp_offset = serial_offset = created_offset = None
+    for i in range(count):
+        number, field_size, _ = raw[3 * i:3 * i + 3]
+        if number == _FIT_TIMESTAMP and field_size == 4:
+            timestamp_offset = size
+        if global_number == _FIT_FILE_ID and field_size == 4:
+            if number == _FIT_FILE_ID_SERIAL:
+                serial_offset = size
+            elif number == _FIT_FILE_ID_CREATED:
+                created_offset = size
+        known = _FIT_RECORD_FIELDS.get(number)
+        if global_number == _FIT_RECORD and known and np.dtype(known[1]).itemsize == field_size:
+            fields[str(number)] = (endian + known[1], size)
+        elif global_number == _FIT_SESSION and number == _FIT_SESSION_SPORT and field_size == 1:
+            sport_offset = size
+        size += field_size
+    length = 5 + 3 * count
+    if developer:
+        count, = reader.read(1)
+        raw = reader.read(3 * count)
+        size += sum(raw[3 * i + 1] for i in range(count))
+        length += 1 + 3 * count
+
+    dtype = None
+    if fields:
+        dtype = np.dtype({
+            "names": list(fields),
+            "formats": [kind for kind, _ in fields.values()],
+            "offsets": [offset for _, offset in fields.values()],
+            "itemsize": size,
+        })
+    file_id_offsets = None
+    if serial_offset is not None and created_offset is not None:
+        file_id_offsets = (serial_offset, created_offset)
+    return _FitDefinition(
+        global_number, size, endian, dtype, sport_offset, timestamp_offset, file_id_offsets
+    ), length
+
+
+def _fit_messages(stream: BinaryIO) -> Iterator[Tuple[_FitDefinition, bytes, Optional[int]]]:
+    """
+    Yield ``(definition, body, timestamp)`` for each data message of a
+    (possibly chained) FIT file. ``timestamp`` is set for messages with a
+    compressed timestamp header.
+    """
+    reader = _FitReader(stream)
+    while not reader.at_end():
+        header_size = reader.read(1)[0]
+        if header_size < 12:
+            raise ActivityFileError("Invalid FIT header")
+        rest = reader.read(header_size - 1)
+        data_size = struct.unpack_from("<I", rest, 3)[0]
+        if rest[7:11] != b".FIT":
+            raise ActivityFileError("Not a FIT file")
+
+        definitions: Dict[int, _FitDefinition] = {}
+        last_timestamp = 0
+        remaining = data_size
+        while remaining > 0:
+            byte = reader.read(1)[0]
+            timestamp = None
+            if byte & 0x80:
+                # Compressed timestamp header: 5 low bits of the time since the last full timestamp
+                local = byte >> 5 & 0x3
+                timestamp = last_timestamp + ((byte - last_timestamp) & 0x1F)
+                last_timestamp = timestamp
+            elif byte & 0x40:
+                definitions[byte & 0xF], length = _fit_definition(reader, bool(byte & 0x20))
+                remaining -= 1 + length
+                continue
+            else:
+                local = byte & 0xF
+
+            definition = definitions.get(local)
+            if definition is None:
+                raise ActivityFileError("FIT message without a definition")
+            body = reader.read(definition.size)
+            remaining -= 1 + definition.size
+            if timestamp is None and definition.timestamp_offset is not None:
+                value, = struct.unpack_from(definition.endian + "I", body, definition.timestamp_offset)
+                if value != 0xFFFFFFFF:
+                    last_timestamp = value
+            yield definition, body, timestamp
+
+        reader.read(2)  # CRC
+
+
+def _fit_file_id(definition: _FitDefinition, body: bytes) -> Optional[str]:
+    """
+    The device serial number and creation time of a file_id message, which
+    together identify a recording; None if the device left either out.
+    """
+    serial, created = (
+        struct.unpack_from(definition.endian + "I", body, offset)[0]
+        for offset in definition.file_id_offsets
+    )
+    # serial_number is a uint32z (0 is invalid), time_created a uint32
+    if serial == 0 or created == 0xFFFFFFFF:
+        return None
+    return f"fit:{serial}:{created}"
+
+
+def _decode_records(dtype: np.dtype, body: bytearray, stamps: array) -> Dict[str, np.ndarray]:
+    """
+    Decode every record message of one definition at once.
+    """
+    records = np.frombuffer(body, dtype=dtype)
+    channels: Dict[str, np.ndarray] = {}
+    # By field number, so enhanced speed and altitude override the plain ones
+    for number in sorted(dtype.names, key=int):
+        channel, kind, scale, shift = _FIT_RECORD_FIELDS[int(number)]
+        raw = records[number]
+        values = np.where(raw == _FIT_INVALID[kind], np.nan, raw / scale - shift)
+        if channel in channels:
+            values = np.where(np.isnan(values), channels[channel], values)
+        channels[channel] = values
+
+    compressed = np.frombuffer(stamps, dtype=np.float64) + _FIT_EPOCH
+    time = channels.get("time", np.full(len(records), np.nan))
+    channels["time"] = np.where(np.isnan(compressed), time, compressed)
+    return channels
+
+
+def parse_fit(stream: BinaryIO) -> ParsedActivity:
+    """
+    Read the record and session messages of a FIT file.
+
+    Record bodies are collected raw, grouped by definition, and decoded with
+    one structured NumPy view per group, so a message costs a couple of
+    buffer appends however many fields it has.
+    """
+    # Record groups by definition; the definition is kept alive so its id stays unique
+    groups: Dict[int, Tuple[_FitDefinition, bytearray, array, array]] = {}
+    sport: Optional[str] = None
+    file_id: Optional[str] = None
+    count = 0
+    for definition, body, timestamp in _fit_messages(stream):
+        if definition.sport_offset is not None:
+            sport = sport or _FIT_SPORTS.get(body[definition.sport_offset])
+        if definition.file_id_offsets is not None and file_id is None:
+            file_id = _fit_file_id(definition, body)
+        if definition.dtype is None:
+            continue
+        group = groups.get(id(definition))
+        if group is None:
+            group = groups[id(definition)] = (definition, bytearray(), array("d"), array("q"))
+        group[1].extend(body)
+        group[2].append(np.nan if timestamp is None else timestamp)
+        group[3].append(count)
+        count += 1
+
+    if not count:
+        raise ActivityFileError("No track points found in file")
+
+    order = None
+    if len(groups) > 1:
+        # Messages of different definitions interleave; put them back in file order
+        order = np.argsort(np.concatenate([np.frombuffer(group[3], dtype=np.int64) for group in groups.values()]))
+    decoded = []
+    while groups:
+        definition, body, stamps, _ = groups.popitem()[1]
+        decoded.insert(0, _decode_records(definition.dtype, body, stamps))
+    sizes = [len(channels["time"]) for channels in decoded]
+
+    points = {channel: _missing(count) for channel in CHANNELS}
+    for channel in {channel for channels in decoded for channel in channels}:
+        # Each channel's parts are dropped as soon as they are merged
+        parts = [channels.pop(channel, None) for channels in decoded]
+        parts = [part if part is not None else _missing(size) for part, size in zip(parts, sizes)]
+        points[channel] = parts[0] if order is None else np.concatenate(parts)[order]
+    return ParsedActivity(points, None, sport_type(sport), file_id)
+
+
+class _LimitedReader:
+    """
+    Read-only view of a stream that fails once more than ``limit`` bytes
+    have been read, so a small compressed upload can't expand without bound.
+    """
+
+    def __init__(self, stream: BinaryIO, limit: int):
+        self.stream = stream
+        self.remaining = limit
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size if size >= 0 else self.remaining + 1)
+        self.remaining -= len(data)
+        if self.remaining < 0:
+            raise ActivityFileError("File is too large")
+        return data
+
+
+def parse_activity_file(stream: BinaryIO, max_bytes: Optional[int] = None) -> ParsedActivity:
+    """
+    Parse a GPX, TCX or FIT file (optionally gzipped), detected from its content.
+
+    ``stream`` is read front to back in small chunks, never whole; it only
+    needs to be seekable for format detection. ``max_bytes`` caps the
+    (decompressed) size.
+    """
+    head = stream.read(_SNIFF_BYTES)
+    stream.seek(0)
+    if head.startswith(_GZIP_MAGIC):
+        with gzip.GzipFile(fileobj=stream, mode="rb") as unzipped:
+            try:
+                return parse_activity_file(unzipped, max_bytes)
+            except (OSError, EOFError, zlib.error) as e:
+                raise ActivityFileError(f"Invalid gzip file: {e}")
+
+    reader = _LimitedReader(stream, max_bytes) if max_bytes is not None else stream
+    if head[8:12] == b".FIT":
+        return parse_fit(reader)
+    if b"<gpx" in head or b"<TrainingCenterDatabase" in head:
+        return parse_xml(reader)
+    raise ActivityFileError("Unsupported file format (expected GPX, TCX or FIT)")
@@ -1,21 +1,191 @@
 
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from typing import Dict
+from jose import JWTError, jwt
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# This is a placeholder for the actual JWT verification
-# In a real implementation, this would verify the JWT token against Supabase
+ASYMMETRIC_ALGORITHMS = {"RS256", "ES256"}
+
+
+class JWKSCache:
+    """
+    In-memory copy of the Supabase Auth JSON Web Key Set.
+
+    Keys are refreshed periodically by a background task so verification
+    never waits on the network. An unknown ``kid`` (key rotation) triggers
+    an on-demand refresh, throttled to avoid hammering the endpoint with
+    tokens signed by keys that don't exist.
+    """
+
+    def __init__(self, url: str, refresh_interval: float, min_refresh_interval: float = 30.0):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._last_refresh = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.get(self.url)
+                response.raise_for_status()
+            keys = response.json().get("keys", [])
+            self._keys = {key["kid"]: key for key in keys if "kid" in key}
+            self._last_refresh = time.monotonic()
+
+    async def get_key(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._last_refresh > self.min_refresh_interval:
+            try:
+                await self.refresh()
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning("JWKS refresh failed: %s", e)
+            key = self._keys.get(kid)
+        return key
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning("JWKS refresh failed: %s", e)
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class TokenCache:
+    """
+    LRU of already-verified tokens, keyed by SHA-256 of the token.
+    Entries are served until the token's ``exp`` claim.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        claims = self._entries.get(key)
+        if claims is None:
+            return None
+        if claims["exp"] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def set(self, token: str, claims: Dict[str, Any]) -> None:
+        key = self._key(token)
+        self._entries[key] = claims
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+jwks_cache = JWKSCache(
+    settings.SUPABASE_JWKS_URL or f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json",
+    refresh_interval=settings.JWKS_REFRESH_SECONDS,
+)
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+def _credentials_exception(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def verify_token(token: str) -> Dict[str, Any]:
+    """
+    Verify a Supabase access token locally and return its claims.
+
+    HS256 tokens are checked against the project JWT secret; RS256/ES256
+    tokens against the cached JWKS. No request is made to Supabase Auth.
+    """
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError:
+        raise _credentials_exception("Invalid authentication token")
+
+    algorithm = header.get("alg")
+    if algorithm == "HS256" and settings.SUPABASE_JWT_SECRET:
+        key: Any = settings.SUPABASE_JWT_SECRET
+    elif algorithm in ASYMMETRIC_ALGORITHMS:
+        key = await jwks_cache.get_key(header.get("kid"))
+        if key is None:
+            raise _credentials_exception("Unknown token signing key")
+    else:
+        raise _credentials_exception("Unsupported token algorithm")
+
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.JWT_AUDIENCE,
+            issuer=settings.SUPABASE_JWT_ISSUER,
+            options={"require_exp": True, "require_sub": True},
+        )
+    except JWTError as e:
+        raise _credentials_exception(f"Invalid authentication token: {e}")
+
+    token_cache.set(token, claims)
+    return claims
+
+
+async def get_user_from_token(token: str) -> Dict:
+    """
+    Verify a raw token and return the user information derived from it.
+    Used directly by WebSocket/SSE endpoints, which receive the token as a
+    query parameter because browsers can't set headers on those connections.
+    """
+    claims = await verify_token(token)
+    return {
+        "user_id": claims["sub"],
+        "email": claims.get("email"),
+        "role": claims.get("role"),
+    }
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict:
     """
     Get the current authenticated user from the JWT token.
-    This is a placeholder for the actual implementation.
-    """
-    # In a real implementation, this would:
-    # 1. Verify the JWT token against Supabase
-    # 2. Extract the user ID and other claims from the token
-    # 3. Return the user information
-    
-    # For now, we'll just return a mock user
-    return {"user_id": "00000000-0000-0000-0000-000000000000"}
+    """
+    return await get_user_from_token(token)
@@ -0,0 +1,138 @@
+
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+
+class CacheBackend:
+    """
+    Minimal async key/value interface shared by the cache backends.
+    """
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        """
+        Atomically add ``amount`` to an integer counter and return the new
+        value. A missing counter starts at zero and expires after ``ttl``.
+        """
+        raise NotImplementedError
+
+
+class InMemoryCache(CacheBackend):
+    """
+    Per-process TTL cache with LRU eviction.
+    """
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is None or entry[0] <= now:
+            entry = (now + ttl, "0")
+        value = int(entry[1]) + amount
+        await self.set(key, str(value), entry[0] - now)
+        return value
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared across workers, backed by any Redis-protocol server
+    (Redis, Valkey, KeyDB, Dragonfly, ...). Requires the ``redis`` package.
+    """
+
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("CACHE_URL is set but the 'redis' package is not installed")
+        self._client = redis_asyncio.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self._client.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(key)
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.incrby(key, amount)
+            pipe.pexpire(key, int(ttl * 1000))
+            value, _ = await pipe.execute()
+        return value
+
+
+def create_cache_backend(url: Optional[str] = None) -> CacheBackend:
+    """
+    Return a Redis-backed cache when ``url`` is set, otherwise an in-process one.
+    """
+    if url:
+        return RedisCache(url)
+    return InMemoryCache()
+
+
+class MembershipCache:
+    """
+    Cache of positive ``(user, conversation)`` participant lookups.
+
+    Only memberships are cached, never their absence, so a newly added
+    participant is never locked out. Removals are invalidated explicitly;
+    with the in-process backend other workers may keep a stale entry for
+    at most ``ttl`` seconds.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(user_id: str, conversation_id: str) -> str:
+        return f"membership:{conversation_id}:{user_id}"
+
+    async def is_member(self, user_id: str, conversation_id: str) -> bool:
+        return await self.backend.get(self._key(user_id, conversation_id)) is not None
+
+    async def remember(self, user_id: str, conversation_id: str) -> None:
+        await self.backend.set(self._key(user_id, conversation_id), "1", self.ttl)
+
+    async def invalidate(self, user_id: str, conversation_id: str) -> None:
+        await self.backend.delete(self._key(user_id, conversation_id))
+
+
+cache_backend = create_cache_backend(settings.CACHE_URL)
+membership_cache = MembershipCache(cache_backend, ttl=settings.MEMBERSHIP_CACHE_TTL_SECONDS)
@@ -1,5 +1,5 @@
 
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -14,6 +14,79 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_SERVICE_KEY: str
     
+    # Database (PostgREST) client settings
+    DB_POOL_MAX_CONNECTIONS: int = 100
+    DB_POOL_MAX_KEEPALIVE: int = 20
+    DB_POOL_KEEPALIVE_EXPIRY: float = 30.0
+    DB_TIMEOUT: float = 10.0
+    DB_CONNECT_TIMEOUT: float = 5.0
+    DB_MAX_CONCURRENCY: int = 500
+    DB_HTTP2: bool = True
+    
+    # Auth settings
+    SUPABASE_JWT_SECRET: Optional[str] = None
+    SUPABASE_JWKS_URL: Optional[str] = None
+    SUPABASE_JWT_ISSUER: Optional[str] = None
+    JWT_AUDIENCE: str = "authenticated"
+    JWKS_REFRESH_SECONDS: int = 600
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    
+    # Cache settings (CACHE_URL points at a Redis-compatible server; unset = in-process)
+    CACHE_URL: Optional[str] = None
+    MEMBERSHIP_CACHE_TTL_SECONDS: int = 300
+    
+    # Realtime settings (PUBSUB_URL points at a Redis-compatible server; unset = single worker)
+    PUBSUB_URL: Optional[str] = None
+    REALTIME_QUEUE_SIZE: int = 100
+    REALTIME_HEARTBEAT_SECONDS: float = 15.0
+    
+    # Strava settings
+    STRAVA_CLIENT_ID: str = "YOUR_STRAVA_CLIENT_ID"
+    STRAVA_CLIENT_SECRET: str = "YOUR_STRAVA_CLIENT_SECRET"
+    STRAVA_REDIRECT_URI: str = "http://localhost:8000/api/v1/strava/callback"
+    STRAVA_API_BASE: str = "https://www.strava.com/api/v3"
+    STRAVA_TOKEN_URL: str = "https://www.strava.com/oauth/token"
+    STRAVA_PAGE_SIZE: int = 200
+    STRAVA_SYNC_CONCURRENCY: int = 4
+    STRAVA_INITIAL_SYNC_DAYS: int = 30
+    STRAVA_BACKFILL_BATCH_SIZE: int = 1000
+    STRAVA_RATE_LIMIT_SHORT: int = 200
+    STRAVA_RATE_LIMIT_DAILY: int = 2000
+    STRAVA_READ_RATE_LIMIT_SHORT: int = 100
+    STRAVA_READ_RATE_LIMIT_DAILY: int = 1000
+    STRAVA_RATE_LIMIT_RETRIES: int = 3
+    STRAVA_BACKFILL_SHARE: float = 0.8
+    STRAVA_TOKEN_REFRESH_MARGIN_SECONDS: int = 900
+    STRAVA_WEBHOOK_VERIFY_TOKEN: Optional[str] = None
+    STRAVA_WEBHOOK_SUBSCRIPTION_ID: Optional[int] = None
+    STRAVA_WEBHOOK_DEBOUNCE_SECONDS: float = 5.0
+    
+    # Background jobs
+    JOB_WORKERS: int = 4
+    JOB_STALE_SECONDS: int = 300
+    
+    # Geometry (SPATIAL_BACKEND: "geohash" uses plain B-tree indexes; "postgis" needs supabase/spatial/postgis.sql)
+    SPATIAL_BACKEND: str = "geohash"
+    GEOMETRY_OFFLOAD_POINTS: int = 2000
+    ROUTE_MATCH_THRESHOLD_M: float = 100.0
+    
+    # Activity map tiles (rendered tiles are cached on local disk per user)
+    TILE_CACHE_DIR: str = ".cache/tiles"
+    TILE_CACHE_MAX_BYTES_PER_USER: int = 64 * 1024 * 1024
+    TILE_MAX_ZOOM: int = 18
+    
+    # Activity file uploads (GPX/TCX/FIT; the size limit applies after decompression) and bulk creates
+    ACTIVITY_UPLOAD_MAX_BYTES: int = 100 * 1024 * 1024
+    ACTIVITY_BULK_MAX_ITEMS: int = 1000
+    
+    # Data exports (limits are per worker; exports beyond them get a 429)
+    EXPORT_PAGE_SIZE: int = 500
+    EXPORT_MAX_CONCURRENT_PER_USER: int = 1
+    EXPORT_MAX_CONCURRENT: int = 4
+    # Exports requested by range are spooled here so resumes don't regenerate them
+    EXPORT_SPOOL_DIR: str = ".cache/exports"
+    EXPORT_SPOOL_TTL_SECONDS: int = 3600
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
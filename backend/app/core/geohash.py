@@ -0,0 +1,82 @@
+
+from typing import List, Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_PRECISION = 12
+
+BBox = Tuple[float, float, float, float]  # min_lng, min_lat, max_lng, max_lat
+
+
+def encode(lat: float, lng: float, precision: int = MAX_PRECISION) -> str:
+    """
+    Geohash of a point; cells sharing a prefix are nested inside each other.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Width and height of a cell in degrees.
+    """
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 360.0 / 2 ** lng_bits, 180.0 / 2 ** lat_bits
+
+
+def cover_cell(bbox: BBox) -> str:
+    """
+    The smallest cell containing the whole box (``""`` for the whole world).
+    """
+    low = encode(bbox[1], bbox[0])
+    high = encode(bbox[3], bbox[2])
+    length = 0
+    while length < MAX_PRECISION and low[length] == high[length]:
+        length += 1
+    return low[:length]
+
+
+def cells_covering(bbox: BBox, max_cells: int = 32) -> List[str]:
+    """
+    The cells of the finest precision that cover ``bbox`` in at most
+    ``max_cells`` cells.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    best = [""]
+    for precision in range(1, MAX_PRECISION + 1):
+        width, height = cell_size(precision)
+        columns = int((max_lng + 180) // width) - int((min_lng + 180) // width) + 1
+        rows = int((max_lat + 90) // height) - int((min_lat + 90) // height) + 1
+        if columns * rows > max_cells:
+            break
+        cells = set()
+        for row in range(rows):
+            lat = min(min_lat + row * height, max_lat)
+            for column in range(columns):
+                lng = min(min_lng + column * width, max_lng)
+                cells.add(encode(lat, lng, precision))
+            cells.add(encode(lat, max_lng, precision))
+        for column in range(columns):
+            cells.add(encode(max_lat, min(min_lng + column * width, max_lng), precision))
+        cells.add(encode(max_lat, max_lng, precision))
+        best = sorted(cells)
+    return best
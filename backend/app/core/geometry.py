@@ -0,0 +1,280 @@
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core import polyline
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def line_coordinates(coordinates: Any) -> Optional[list]:
+    """
+    Return the raw position list of a line.
+
+    Accepts a bare list of ``[lng, lat(, ele)]`` positions, a GeoJSON
+    LineString or a Feature wrapping one. Returns None for anything else.
+    """
+    if isinstance(coordinates, dict):
+        if coordinates.get("type") == "Feature":
+            coordinates = coordinates.get("geometry") or {}
+        if coordinates.get("type") != "LineString":
+            return None
+        coordinates = coordinates.get("coordinates")
+
+    if not isinstance(coordinates, list) or not coordinates:
+        return None
+    return coordinates
+
+
+def line_positions(coordinates: Any) -> Optional[np.ndarray]:
+    """
+    Extract the positions of a line (see ``line_coordinates``) as an
+    ``(n, k)`` float array.
+    """
+    coordinates = line_coordinates(coordinates)
+    if coordinates is None:
+        return None
+    try:
+        positions = np.asarray(coordinates, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if positions.ndim != 2 or positions.shape[1] < 2:
+        return None
+    return positions
+
+
+def polyline_positions(value: Optional[str]) -> Optional[np.ndarray]:
+    """
+    Decode an encoded (lat/lng) polyline into ``[lng, lat]`` positions.
+    Returns None for an empty or malformed polyline.
+    """
+    try:
+        positions = polyline.decode(value or "")
+    except ValueError:
+        return None
+    return positions[:, ::-1] if len(positions) else None
+
+
+def with_positions(coordinates: Any, positions: list) -> Any:
+    """
+    Return ``positions`` wrapped in the same container as ``coordinates``.
+    """
+    if isinstance(coordinates, dict):
+        if coordinates.get("type") == "Feature":
+            geometry = with_positions(coordinates.get("geometry") or {}, positions)
+            return {**coordinates, "geometry": geometry}
+        return {**coordinates, "coordinates": positions}
+    return positions
+
+
+def project(lnglat: np.ndarray, origin_lat: Optional[float] = None) -> np.ndarray:
+    """
+    Project ``[lng, lat]`` degrees to local equirectangular meters.
+
+    Accurate to well under a percent over the extent of a ride, which is
+    all simplification and nearest-point tests need. Lines that are compared
+    with each other must share ``origin_lat`` (default: the line's mean).
+    """
+    radians = np.radians(lnglat[:, :2])
+    if origin_lat is not None:
+        scale_x = np.cos(np.radians(origin_lat))
+    else:
+        scale_x = np.cos(np.mean(radians[:, 1])) if len(radians) else 1.0
+    return np.column_stack((radians[:, 0] * scale_x, radians[:, 1])) * EARTH_RADIUS_M
+
+
+def significance(points: np.ndarray, tolerance: float = 0.0) -> np.ndarray:
+    """
+    Douglas-Peucker significance of every point of a line.
+
+    ``points`` are planar (e.g. from ``project``). A point survives
+    simplification at tolerance ``t`` exactly when its significance is
+    greater than ``t``, so one pass serves every tolerance down to
+    ``tolerance``; endpoints are infinitely significant. Each split measures
+    every point of its span against the chord in one NumPy pass, so the
+    Python-level work grows with the number of points kept rather than the
+    number of input points.
+    """
+    count = len(points)
+    scores = np.zeros(count)
+    scores[[0, -1] if count else []] = np.inf
+    stack = [(0, count - 1, np.inf)]
+    while stack:
+        start, end, parent = stack.pop()
+        if end - start < 2:
+            continue
+        span = points[start + 1:end]
+        a, b = points[start], points[end]
+        chord = b - a
+        length_sq = chord @ chord
+        if length_sq == 0.0:
+            distances = np.hypot(*(span - a).T)
+        else:
+            # Distance to the chord segment, not the infinite line
+            t = np.clip((span - a) @ chord / length_sq, 0.0, 1.0)
+            distances = np.hypot(*(span - (a + t[:, None] * chord)).T)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            # A point only survives at tolerances its ancestors survive too
+            scores[index] = min(distances[farthest], parent)
+            stack.append((start, index, scores[index]))
+            stack.append((index, end, scores[index]))
+    return scores
+
+
+def simplify(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Douglas-Peucker line simplification; returns a mask of points to keep.
+    """
+    return significance(points, tolerance) > tolerance
+
+
+def distances_to_lines(
+    points: np.ndarray, vertices: np.ndarray, offsets: np.ndarray, chunk_size: int = 64
+) -> np.ndarray:
+    """
+    Distance from every point to each of several planar polylines.
+
+    The polylines are stacked in ``vertices`` and line ``i`` spans
+    ``vertices[offsets[i]:offsets[i + 1]]`` (the layout of
+    ``polyline.decode_many``) and needs at least two vertices. Returns a
+    ``(len(points), len(offsets) - 1)`` array. All segments of all lines are measured at once, ``chunk_size``
+    points at a time to bound memory.
+    """
+    starts = vertices[:-1]
+    chords = vertices[1:] - starts
+    # Drop the bogus segments joining the end of one line to the next
+    keep = np.ones(len(starts), dtype=bool)
+    keep[offsets[1:-1] - 1] = False
+    starts, chords = starts[keep], chords[keep]
+    lengths_sq = np.einsum("ij,ij->i", chords, chords)
+    lengths_sq[lengths_sq == 0.0] = np.inf  # zero-length segments measure to their start
+
+    # Index of each line's first segment, once the joins are gone
+    segment_offsets = offsets[:-1] - np.arange(len(offsets) - 1)
+
+    result = np.empty((len(points), len(offsets) - 1))
+    for begin in range(0, len(points), chunk_size):
+        block = points[begin:begin + chunk_size, None, :] - starts[None, :, :]
+        t = np.clip(np.einsum("psj,sj->ps", block, chords) / lengths_sq, 0.0, 1.0)
+        gaps = block - t[:, :, None] * chords[None, :, :]
+        distances = np.sqrt(np.einsum("psj,psj->ps", gaps, gaps))
+        result[begin:begin + chunk_size] = np.minimum.reduceat(distances, segment_offsets, axis=1)
+    return result
+
+
+def hausdorff_to_lines(track: np.ndarray, vertices: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Symmetric Hausdorff distance between a planar ``track`` and each
+    polyline stacked in ``vertices``/``offsets`` (see ``distances_to_lines``).
+
+    Distances are measured to segments rather than vertices, so sparse,
+    simplified lines compare as well as dense ones.
+    """
+    # How far the track strays from each line...
+    away = distances_to_lines(track, vertices, offsets).max(axis=0)
+    # ...and how far each line strays from the track
+    track_offsets = np.array([0, len(track)])
+    missed = np.maximum.reduceat(distances_to_lines(vertices, track, track_offsets)[:, 0], offsets[:-1])
+    return np.maximum(away, missed)
+
+
+def segment_lengths(lnglat: np.ndarray) -> np.ndarray:
+    """
+    Haversine length in meters of every segment of a ``[lng, lat]`` line.
+    """
+    radians = np.radians(lnglat[:, :2])
+    dlng, dlat = np.diff(radians, axis=0).T
+    lat = radians[:, 1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def elevation_gain(elevations: np.ndarray, threshold: float = 3.0) -> float:
+    """
+    Total climb in meters, ignoring wiggles smaller than ``threshold``.
+
+    Climbing is counted with hysteresis: a rise only counts once it clears
+    ``threshold`` above the last committed elevation, and a descent moves
+    that reference down only once it drops ``threshold`` below it. GPS and
+    barometer noise on flat ground therefore doesn't add up to phantom
+    climbing, while real climbs are counted in full.
+    """
+    if len(elevations) < 2:
+        return 0.0
+    # Only the turning points of the signal can commit a new reference
+    steps = np.diff(elevations)
+    turning = np.flatnonzero(np.sign(steps[1:]) != np.sign(steps[:-1])) + 1
+    values = elevations[np.concatenate(([0], turning, [len(elevations) - 1]))].tolist()
+
+    gain = 0.0
+    reference = values[0]
+    for value in values[1:]:
+        if value >= reference + threshold:
+            gain += value - reference
+            reference = value
+        elif value <= reference - threshold:
+            reference = value
+    return gain
+
+
+def smooth_along(distances: np.ndarray, values: np.ndarray, window: float) -> np.ndarray:
+    """
+    Moving average of ``values`` over ``window`` meters of line centered on
+    each point; ``distances`` is the cumulative distance along the line.
+    """
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    start = np.searchsorted(distances, distances - window / 2, side="left")
+    end = np.searchsorted(distances, distances + window / 2, side="right")
+    return (sums[end] - sums[start]) / (end - start)
+
+
+# Upper edges of the grade histogram bins, in percent; the last bin is open
+GRADE_BINS = (-15.0, -10.0, -5.0, -2.0, 2.0, 5.0, 10.0, 15.0)
+
+
+def grade_histogram(
+    distances: np.ndarray, elevations: np.ndarray, window: float = 50.0
+) -> List[float]:
+    """
+    Meters of line in each ``GRADE_BINS`` grade bin.
+
+    ``distances`` is the cumulative distance along the line. Grades are
+    measured over ``window``-meter steps rather than between raw points, so
+    closely spaced noisy samples don't produce absurd grades.
+    """
+    total = float(distances[-1]) if len(distances) else 0.0
+    if total <= 0.0:
+        return [0.0] * (len(GRADE_BINS) + 1)
+    stations = np.append(np.arange(0.0, total, window), total)
+    step_elevations = np.interp(stations, distances, elevations)
+    steps = np.diff(stations)
+    grades = np.diff(step_elevations) / steps * 100.0
+    bins = np.searchsorted(GRADE_BINS, grades)
+    return np.bincount(bins, weights=steps, minlength=len(GRADE_BINS) + 1).tolist()
+
+
+# Elevation is averaged over this much line before measuring climbing
+ELEVATION_SMOOTHING_M = 100.0
+
+
+def line_metrics(lnglat: np.ndarray) -> Dict[str, Any]:
+    """
+    Distance, and climbing and grade breakdown when the line carries
+    elevation, for a ``[lng, lat(, ele)]`` line.
+    """
+    lengths = segment_lengths(lnglat)
+    metrics: Dict[str, Any] = {"distance_m": float(lengths.sum())}
+    if lnglat.shape[1] < 3 or np.isnan(lnglat[:, 2]).any():
+        return metrics
+
+    distances = np.concatenate(([0.0], np.cumsum(lengths)))
+    elevations = smooth_along(distances, lnglat[:, 2], ELEVATION_SMOOTHING_M)
+    metrics["elevation_gain_m"] = elevation_gain(elevations)
+    metrics["grade_histogram"] = {
+        "edges": list(GRADE_BINS),
+        "distance_m": grade_histogram(distances, elevations),
+    }
+    return metrics
@@ -0,0 +1,95 @@
+
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.db import supabase
+
+
+async def update_owned(
+    table: str,
+    row_id: str,
+    owner_column: str,
+    owner_id: str,
+    data: Dict[str, Any],
+    detail: str,
+    status_code: int = status.HTTP_404_NOT_FOUND,
+    columns: str = "*",
+) -> Dict[str, Any]:
+    """
+    Update a row only if it belongs to ``owner_id``, in a single round trip.
+
+    The ownership check is part of the ``UPDATE ... WHERE`` filter, so there
+    is no window between checking and writing. Zero affected rows means the
+    row doesn't exist or isn't owned by the caller and raises ``status_code``.
+    ``columns`` narrows the returned row.
+    """
+    response = await supabase.table(table) \
+                             .update(data) \
+                             .eq("id", row_id) \
+                             .eq(owner_column, owner_id) \
+                             .select(columns) \
+                             .execute()
+
+    if response.error is not None:
+        raise HTTPException(status_code=400, detail=str(response.error))
+
+    if not response.data:
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    return response.data[0]
+
+
+async def delete_owned(
+    table: str,
+    row_id: str,
+    owner_column: str,
+    owner_id: str,
+    detail: str,
+    status_code: int = status.HTTP_404_NOT_FOUND,
+) -> Dict[str, Any]:
+    """
+    Delete a row only if it belongs to ``owner_id``, in a single round trip.
+    Returns the deleted row; raises ``status_code`` if nothing matched.
+    """
+    response = await supabase.table(table) \
+                             .delete() \
+                             .eq("id", row_id) \
+                             .eq(owner_column, owner_id) \
+                             .execute()
+
+    if response.error is not None:
+        raise HTTPException(status_code=400, detail=str(response.error))
+
+    if not response.data:
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    return response.data[0]
+
+
+async def update_activity_track(
+    activity_id: str, user_id: str, data: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Update one of the user's activities, returning the updated row and the
+    map polyline it had before.
+
+    Both come from one ``update_activity_track`` call that locks the row, so
+    a concurrent update can't change the previous polyline in between.
+    """
+    response = await supabase.rpc("update_activity_track", {
+        "p_activity_id": activity_id,
+        "p_user_id": user_id,
+        "p_changes": data,
+    }).execute()
+
+    if response.error is not None:
+        raise HTTPException(status_code=400, detail=str(response.error))
+
+    if not response.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Activity not found or you don't have permission"
+        )
+
+    return response.data[0]["activity"], response.data[0]["previous_map_polyline"]
@@ -0,0 +1,151 @@
+
+import math
+import struct
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+EXTENT = 4096
+MAX_LATITUDE = 85.0511287798066
+
+# Web mercator tile of a ``z/x/y`` address, as ``min_lng, min_lat, max_lng, max_lat``
+BBox = Tuple[float, float, float, float]
+
+Feature = Tuple[List[np.ndarray], Dict[str, Any]]
+
+_MOVE_TO = 1 | 1 << 3
+_LINESTRING = 2
+
+
+def tile_bounds(z: int, x: int, y: int) -> BBox:
+    """
+    Longitude/latitude bounds of a web mercator tile.
+    """
+    scale = 2 ** z
+
+    def lat(row: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / scale))))
+
+    return x / scale * 360 - 180, lat(y + 1), (x + 1) / scale * 360 - 180, lat(y)
+
+
+def to_tile(lnglat: np.ndarray, z: int, x: int, y: int, extent: int = EXTENT) -> np.ndarray:
+    """
+    Project ``[lng, lat]`` positions to the pixel grid of tile ``z/x/y``.
+    Positions outside the tile land outside ``[0, extent]``.
+    """
+    scale = 2 ** z
+    lat = np.radians(np.clip(lnglat[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+    column = (lnglat[:, 0] + 180) / 360 * scale
+    row = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * scale
+    return np.column_stack((column - x, row - y)) * extent
+
+
+def _varints(values: np.ndarray) -> bytes:
+    """
+    Protobuf varints of non-negative integers, all encoded at once.
+    """
+    if len(values) < 32:
+        # Array setup costs more than it saves on a handful of values
+        return b"".join(_varint(int(value)) for value in values)
+    values = np.asarray(values, dtype=np.uint64)
+    shifts = np.arange(10, dtype=np.uint64) * np.uint64(7)
+    groups = (values[:, None] >> shifts) & np.uint64(0x7F)
+    sizes = np.maximum(1, 10 - np.argmax(groups[:, ::-1] != 0, axis=1))
+    sizes[(groups == 0).all(axis=1)] = 1
+    position = np.arange(10)
+    more = position < (sizes - 1)[:, None]
+    encoded = (groups | (more.astype(np.uint64) << np.uint64(7)))[position < sizes[:, None]]
+    return encoded.astype(np.uint8).tobytes()
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """
+    A length-delimited protobuf field.
+    """
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _value(value: Any) -> bytes:
+    if isinstance(value, bool):
+        return _varint(7 << 3) + _varint(int(value))
+    if isinstance(value, int):
+        return _varint(4 << 3) + _varint(value & 0xFFFFFFFFFFFFFFFF)
+    if isinstance(value, float):
+        return _varint(3 << 3 | 1) + struct.pack("<d", value)
+    return _field(1, str(value).encode("utf-8"))
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def line_geometry(parts: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    MVT geometry commands for a (multi-)linestring of integer tile positions.
+
+    Each part needs at least two positions. The cursor carries over from
+    one part to the next, as the spec requires.
+    """
+    commands = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for part in parts:
+        deltas = np.diff(part, axis=0, prepend=cursor[None, :])
+        cursor = part[-1]
+        zigzag = _zigzag(deltas)
+        line_to = np.uint64(2 | (len(part) - 1) << 3)
+        commands.append(np.concatenate((
+            [np.uint64(_MOVE_TO)], zigzag[0], [line_to], zigzag[1:].ravel(),
+        )))
+    return np.concatenate(commands) if commands else np.zeros(0, dtype=np.uint64)
+
+
+def encode_layer(name: str, features: Sequence[Feature], extent: int = EXTENT) -> bytes:
+    """
+    Encode a layer of linestring features.
+
+    Each feature is its parts (``(n, 2)`` integer arrays in tile pixels)
+    and a dict of properties; keys and values are shared across the layer.
+    """
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, Any], int] = {}
+    encoded_features = []
+    for parts, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        encoded_features.append(_field(2, b"".join((
+            _field(2, _varints(tags)),
+            _varint(3 << 3) + _varint(_LINESTRING),
+            _field(4, _varints(line_geometry(parts))),
+        ))))
+
+    layer = b"".join((
+        _varint(15 << 3) + _varint(2),
+        _field(1, name.encode("utf-8")),
+        *encoded_features,
+        *(_field(3, key.encode("utf-8")) for key in keys),
+        *(_field(4, _value(value)) for _, value in values),
+        _varint(5 << 3) + _varint(extent),
+    ))
+    return layer
+
+
+def encode_tile(layers: Sequence[bytes]) -> bytes:
+    """
+    Wrap encoded layers into a tile.
+    """
+    return b"".join(_field(3, layer) for layer in layers)
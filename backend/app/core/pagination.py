@@ -0,0 +1,91 @@
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, Response
+
+from app.db import QueryBuilder, format_filter_value
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: str, row_id: str) -> str:
+    """
+    Encode a ``(timestamp, id)`` keyset position as an opaque URL-safe token.
+    """
+    raw = json.dumps([timestamp, str(row_id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decode a cursor produced by ``encode_cursor``.
+    Raises a 400 if the token has been tampered with or is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(timestamp), str(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def paginate(
+    query: QueryBuilder,
+    order_column: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+) -> QueryBuilder:
+    """
+    Apply newest-first pagination to a query.
+
+    With a cursor, rows are filtered to those strictly after the
+    ``(order_column, id)`` position, so any page costs the same index seek as
+    the first one. Without a cursor, the legacy ``skip`` offset is used.
+    """
+    query = query.order(order_column, desc=True).order("id", desc=True)
+
+    if cursor is None:
+        return query.range(skip, skip + limit - 1)
+
+    timestamp, row_id = decode_cursor(cursor)
+    timestamp = format_filter_value(timestamp)
+    row_id = format_filter_value(row_id)
+    return query.or_(
+        f"{order_column}.lt.{timestamp},"
+        f"and({order_column}.eq.{timestamp},id.lt.{row_id})"
+    ).limit(limit)
+
+
+def next_cursor(rows: List[Dict[str, Any]], order_column: str, limit: int) -> Optional[str]:
+    """
+    Return the cursor for the page after ``rows``, or None on the last page.
+    """
+    if len(rows) < limit or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(last[order_column], last["id"])
+
+
+def paged(
+    response: Response,
+    rows: List[Dict[str, Any]],
+    order_column: str,
+    limit: int,
+    envelope: bool = False,
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Return ``rows`` as a list page.
+
+    The next page cursor is always sent in the ``X-Next-Cursor`` header, so
+    plain list responses stay unchanged for existing clients. With
+    ``envelope`` the body becomes ``{"items": rows, "next_cursor": ...}``.
+    """
+    cursor = next_cursor(rows, order_column, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    if envelope:
+        return {"items": rows, "next_cursor": cursor}
+    return rows
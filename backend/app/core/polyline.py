@@ -0,0 +1,117 @@
+
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_PRECISION = 5
+
+# Longest zigzagged varint a 32-bit coordinate delta can need, in 5-bit chunks
+_MAX_CHUNKS = 7
+
+
+def _values(data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode a buffer of polyline characters into signed integers.
+
+    Returns the values and, for every byte, whether it ends a value.
+    """
+    chunks = data.astype(np.int64) - 63
+    if chunks.size and (chunks.min() < 0 or chunks.max() > 63):
+        raise ValueError("Invalid polyline character")
+
+    ends = chunks < 0x20
+    if chunks.size and not ends[-1]:
+        raise ValueError("Truncated polyline")
+
+    if not chunks.size:
+        return np.zeros(0, dtype=np.int64), ends
+
+    # Position of each byte within its value, restarting after every end
+    end_positions = np.flatnonzero(ends)
+    starts = np.empty_like(end_positions)
+    starts[0] = 0
+    starts[1:] = end_positions[:-1] + 1
+    shifts = 5 * (np.arange(chunks.size) - np.repeat(starts, end_positions - starts + 1))
+
+    values = np.add.reduceat((chunks & 0x1F) << shifts, starts)
+    return (values >> 1) ^ -(values & 1), ends
+
+
+def decode(polyline: str, precision: int = DEFAULT_PRECISION) -> np.ndarray:
+    """
+    Decode an encoded polyline into an ``(n, 2)`` float array of lat/lng.
+
+    Every step is a whole-array NumPy operation: chunk extraction, varint
+    reassembly, zigzag decoding and the running sum of deltas.
+    """
+    data = np.frombuffer(polyline.encode("ascii"), dtype=np.uint8)
+    values, _ = _values(data)
+    if len(values) % 2:
+        raise ValueError("Polyline has an odd number of coordinates")
+    return np.cumsum(values.reshape(-1, 2), axis=0) / 10.0 ** precision
+
+
+def decode_many(
+    polylines: Sequence[str], precision: int = DEFAULT_PRECISION
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode many polylines in one pass.
+
+    Returns all points as one ``(N, 2)`` array plus ``offsets`` of length
+    ``len(polylines) + 1``: track ``i`` is ``points[offsets[i]:offsets[i + 1]]``.
+    Empty or missing polylines decode to no points.
+    """
+    encoded = [(polyline or "").encode("ascii") for polyline in polylines]
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    values, ends = _values(data)
+    if len(values) % 2:
+        raise ValueError("Polyline has an odd number of coordinates")
+
+    # Count the values that finish inside each polyline's byte range
+    byte_bounds = np.cumsum([0] + [len(e) for e in encoded])
+    last_bytes = byte_bounds[1:][np.diff(byte_bounds) > 0] - 1
+    if not ends[last_bytes].all():
+        raise ValueError("Truncated polyline")
+    ends_before = np.concatenate(([0], np.cumsum(ends)))
+    value_bounds = ends_before[byte_bounds]
+    if np.any(value_bounds % 2):
+        raise ValueError("Polyline has an odd number of coordinates")
+    offsets = value_bounds // 2
+
+    deltas = values.reshape(-1, 2)
+    totals = np.cumsum(deltas, axis=0)
+    # Restart the running sum at the first point of every polyline
+    lengths = np.diff(offsets)
+    bases = np.zeros((len(lengths), 2), dtype=np.int64)
+    nonempty = (lengths > 0) & (offsets[:-1] > 0)
+    bases[nonempty] = totals[offsets[:-1][nonempty] - 1]
+    totals -= np.repeat(bases, lengths, axis=0)
+
+    return totals / 10.0 ** precision, offsets
+
+
+def split(points: np.ndarray, offsets: np.ndarray) -> List[np.ndarray]:
+    """
+    Split the output of ``decode_many`` into one array per polyline (views).
+    """
+    return np.split(points, offsets[1:-1])
+
+
+def encode(points: np.ndarray, precision: int = DEFAULT_PRECISION) -> str:
+    """
+    Encode an ``(n, 2)`` array of lat/lng into a polyline string.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    fixed = np.rint(points * 10.0 ** precision).astype(np.int64)
+    deltas = np.diff(fixed, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+
+    # One row per value, one column per 5-bit chunk, least significant first
+    shifts = 5 * np.arange(_MAX_CHUNKS)
+    chunks = (zigzag[:, None] >> shifts) & 0x1F
+    lengths = 1 + ((zigzag[:, None] >> shifts[1:]) > 0).sum(axis=1)
+    column = np.arange(_MAX_CHUNKS)
+    chunks |= np.where(column < (lengths - 1)[:, None], 0x20, 0)
+    chunks += 63
+
+    return chunks[column < lengths[:, None]].astype(np.uint8).tobytes().decode("ascii")
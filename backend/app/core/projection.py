@@ -0,0 +1,35 @@
+
+from typing import Iterable, Optional, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+
+def build_select(
+    full_model: Type[BaseModel],
+    summary_model: Type[BaseModel],
+    view: str = "full",
+    fields: Optional[str] = None,
+    required: Iterable[str] = ("id",),
+) -> str:
+    """
+    Build the PostgREST ``select`` clause for a list endpoint.
+
+    ``fields`` is a comma-separated sparse fieldset and takes precedence over
+    ``view``. Columns in ``required`` (the row key and the pagination column)
+    are always selected so cursors keep working on projected pages.
+    """
+    if fields:
+        columns = [column.strip() for column in fields.split(",") if column.strip()]
+        unknown = sorted(set(columns) - set(full_model.model_fields))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    elif view == "summary":
+        columns = list(summary_model.model_fields)
+    else:
+        return "*"
+
+    for column in required:
+        if column not in columns:
+            columns.append(column)
+    return ",".join(columns)
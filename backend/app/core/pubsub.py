@@ -0,0 +1,239 @@
+
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DeliverCallback = Callable[[str, str], Awaitable[None]]
+
+
+class Subscription:
+    """
+    One connected client's view of a topic, with a bounded queue.
+
+    Publishing never blocks on a slow client: when the queue is full the
+    subscription is flagged as overflowed and stops receiving messages.
+    The endpoint then disconnects it so the client re-syncs from the
+    paginated history instead of silently missing messages.
+
+    A subscription held for a member is closed when that member's access
+    is revoked, and receives nothing after that.
+    """
+
+    def __init__(self, topic: str, max_size: int, member: Optional[str] = None):
+        self.topic = topic
+        self.member = member
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=max_size)
+        self.overflowed = False
+        self.closed = False
+
+    def offer(self, payload: str) -> None:
+        if self.overflowed or self.closed:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            # Wakes a pending get; a full queue means nobody is waiting
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Wait for the next payload; returns None on timeout, overflow or close.
+        """
+        if self.overflowed or self.closed:
+            return None
+        try:
+            payload = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return None if self.closed else payload
+
+
+class Broker:
+    """
+    Transport between workers. Every payload published on any worker is
+    handed to ``deliver`` on every worker subscribed to the topic.
+    """
+
+    def __init__(self):
+        self.deliver: Optional[DeliverCallback] = None
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, topic: str, payload: str) -> None:
+        raise NotImplementedError
+
+    async def subscribe(self, topic: str) -> None:
+        pass
+
+    async def unsubscribe(self, topic: str) -> None:
+        pass
+
+
+class LocalBroker(Broker):
+    """
+    Single-process broker: publishing delivers straight to local subscribers.
+    """
+
+    async def publish(self, topic: str, payload: str) -> None:
+        await self.deliver(topic, payload)
+
+
+class RedisBroker(Broker):
+    """
+    Broker backed by Redis-protocol pub/sub so all workers share one stream.
+    Requires the ``redis`` package.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("PUBSUB_URL is set but the 'redis' package is not installed")
+        self._client = redis_asyncio.from_url(url, decode_responses=True)
+        self._pubsub = self._client.pubsub()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._pubsub.close()
+        await self._client.close()
+
+    async def _listen(self) -> None:
+        while True:
+            if not self._pubsub.subscribed:
+                await asyncio.sleep(0.1)
+                continue
+            message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is not None:
+                await self.deliver(message["channel"], message["data"])
+
+    async def publish(self, topic: str, payload: str) -> None:
+        await self._client.publish(topic, payload)
+
+    async def subscribe(self, topic: str) -> None:
+        await self._pubsub.subscribe(topic)
+
+    async def unsubscribe(self, topic: str) -> None:
+        await self._pubsub.unsubscribe(topic)
+
+
+def _revocation_topic(topic: str, member: str) -> str:
+    return f"{topic}:revoke:{member}"
+
+
+class MessageHub:
+    """
+    Fans published events out to the subscriptions held by this worker.
+    The broker is only subscribed to topics with at least one local listener.
+
+    Subscriptions held for a member also listen on a per-member revocation
+    topic, so ``revoke`` closes them on every worker.
+    """
+
+    def __init__(self, broker: Broker, queue_size: int):
+        self.broker = broker
+        self.broker.deliver = self._deliver
+        self.queue_size = queue_size
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._revocations: Dict[str, Set[Subscription]] = {}
+
+    async def _deliver(self, topic: str, payload: str) -> None:
+        for subscription in list(self._topics.get(topic, ())):
+            subscription.offer(payload)
+        for subscription in list(self._revocations.get(topic, ())):
+            subscription.close()
+
+    async def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        try:
+            await self.broker.publish(topic, json.dumps(event, default=str))
+        except Exception as e:
+            # Realtime delivery is best effort; the write itself already succeeded
+            logger.warning("Failed to publish to %s: %s", topic, e)
+
+    async def revoke(self, topic: str, member: str) -> None:
+        """
+        Close every subscription to ``topic`` held for ``member``.
+        """
+        try:
+            await self.broker.publish(_revocation_topic(topic, member), "{}")
+        except Exception as e:
+            logger.warning("Failed to revoke %s on %s: %s", member, topic, e)
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        if topic is not None:
+            return len(self._topics.get(topic, ()))
+        return sum(len(subscriptions) for subscriptions in self._topics.values())
+
+    async def _add(self, topics: Dict[str, Set[Subscription]], topic: str, subscription: Subscription) -> None:
+        subscriptions = topics.setdefault(topic, set())
+        subscriptions.add(subscription)
+        if len(subscriptions) == 1:
+            await self.broker.subscribe(topic)
+
+    async def _remove(self, topics: Dict[str, Set[Subscription]], topic: str, subscription: Subscription) -> None:
+        subscriptions = topics.get(topic, set())
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            topics.pop(topic, None)
+            await self.broker.unsubscribe(topic)
+
+    @asynccontextmanager
+    async def subscribe(self, topic: str, member: Optional[str] = None) -> AsyncIterator[Subscription]:
+        """
+        Subscribe to ``topic``; with ``member``, ``revoke(topic, member)``
+        closes the subscription.
+        """
+        subscription = Subscription(topic, self.queue_size, member)
+        await self._add(self._topics, topic, subscription)
+        try:
+            if member is not None:
+                await self._add(self._revocations, _revocation_topic(topic, member), subscription)
+            yield subscription
+        finally:
+            await self._remove(self._topics, topic, subscription)
+            if member is not None:
+                await self._remove(self._revocations, _revocation_topic(topic, member), subscription)
+
+
+def create_broker(url: Optional[str] = None) -> Broker:
+    """
+    Return a Redis-backed broker when ``url`` is set, otherwise a local one.
+    """
+    if url:
+        return RedisBroker(url)
+    return LocalBroker()
+
+
+def conversation_topic(conversation_id: str) -> str:
+    return f"conversation:{conversation_id}"
+
+
+message_hub = MessageHub(create_broker(settings.PUBSUB_URL), queue_size=settings.REALTIME_QUEUE_SIZE)
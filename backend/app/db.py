@@ -1,11 +1,360 @@
 
-from supabase import create_client, Client
+import asyncio
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+import httpx
+
 from app.core.config import settings
 
-def get_supabase_client() -> Client:
+
+@dataclass
+class APIResponse:
+    """
+    Result of a PostgREST request.
+
+    Mirrors the shape of the old supabase-py response so routers can keep
+    checking ``response.error`` and reading ``response.data``.
+    """
+    data: Any = None
+    count: Optional[int] = None
+    error: Optional[Dict[str, Any]] = None
+    status_code: int = 200
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # PostgREST takes bytea columns in Postgres' hex format
+        return "\\x" + bytes(value).hex()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def decode_bytea(value: Optional[str]) -> Optional[bytes]:
+    """
+    Decode a bytea column as returned by PostgREST (``\\x`` + hex).
+    """
+    if value is None:
+        return None
+    return bytes.fromhex(value[2:] if value.startswith("\\x") else value)
+
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+
+
+def _operand(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    return value.isoformat() if isinstance(value, (datetime, date)) else str(value)
+
+
+def format_filter_value(value: Any) -> str:
+    """
+    Render an operand inside an ``in.(...)`` list or an ``or=(...)`` tree,
+    quoting it when it contains PostgREST reserved characters. Top-level
+    filters take the value literally and must not be quoted.
+    """
+    value = _operand(value)
+    if any(char in value for char in ',:()"'):
+        return '"' + value.replace('"', '\\"') + '"'
+    return value
+
+
+class QueryBuilder:
+    """
+    Awaitable, chainable PostgREST query for a single table.
+
+    The API follows postgrest-py (``select``/``eq``/``order``/``range``/...)
+    so that ``await supabase.table("x").select("*").eq("id", 1).execute()``
+    reads the same as the synchronous client it replaces.
+    """
+
+    def __init__(self, client: "AsyncPostgrestClient", table: str):
+        self._client = client
+        self._table = table
+        self._method = "GET"
+        self._params: List[Tuple[str, str]] = []
+        self._headers: Dict[str, str] = {}
+        self._prefer: List[str] = []
+        self._order: List[str] = []
+        self._body: Any = None
+
+    # Operations
+
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "QueryBuilder":
+        """
+        Select columns. On an insert/update/delete this only narrows the
+        returned representation, e.g. ``.upsert(rows).select("id")``.
+        """
+        if self._body is None and self._method != "DELETE":
+            self._method = "GET"
+        self._params.append(("select", columns))
+        if count:
+            self._prefer.append(f"count={count}")
+        return self
+
+    def insert(self, data: Any, returning: str = "representation") -> "QueryBuilder":
+        self._method = "POST"
+        self._body = data
+        self._prefer.append(f"return={returning}")
+        return self
+
+    def upsert(
+        self,
+        data: Any,
+        on_conflict: Optional[str] = None,
+        ignore_duplicates: bool = False,
+        returning: str = "representation",
+    ) -> "QueryBuilder":
+        self.insert(data, returning=returning)
+        resolution = "ignore-duplicates" if ignore_duplicates else "merge-duplicates"
+        self._prefer.append(f"resolution={resolution}")
+        if on_conflict:
+            self._params.append(("on_conflict", on_conflict))
+        return self
+
+    def update(self, data: Dict[str, Any], returning: str = "representation") -> "QueryBuilder":
+        self._method = "PATCH"
+        self._body = data
+        self._prefer.append(f"return={returning}")
+        return self
+
+    def delete(self, returning: str = "representation") -> "QueryBuilder":
+        self._method = "DELETE"
+        self._prefer.append(f"return={returning}")
+        return self
+
+    # Filters
+
+    def _filter(self, column: str, operator: str, value: Any) -> "QueryBuilder":
+        self._params.append((column, f"{operator}.{_operand(value)}"))
+        return self
+
+    def eq(self, column: str, value: Any) -> "QueryBuilder":
+        return self._filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "QueryBuilder":
+        return self._filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "QueryBuilder":
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "QueryBuilder":
+        return self._filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "QueryBuilder":
+        return self._filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "QueryBuilder":
+        return self._filter(column, "lte", value)
+
+    def is_(self, column: str, value: Any) -> "QueryBuilder":
+        return self._filter(column, "is", value)
+
+    def in_(self, column: str, values: Iterable[Any]) -> "QueryBuilder":
+        rendered = ",".join(format_filter_value(value) for value in values)
+        self._params.append((column, f"in.({rendered})"))
+        return self
+
+    def or_(self, filters: str) -> "QueryBuilder":
+        """
+        Add a raw PostgREST ``or`` expression, e.g. ``"a.eq.1,b.gt.2"``.
+        """
+        self._params.append(("or", f"({filters})"))
+        return self
+
+    # Modifiers
+
+    def order(self, column: str, desc: bool = False) -> "QueryBuilder":
+        self._order.append(f"{column}.{'desc' if desc else 'asc'}")
+        return self
+
+    def limit(self, size: int) -> "QueryBuilder":
+        self._params.append(("limit", str(size)))
+        return self
+
+    def range(self, start: int, end: int) -> "QueryBuilder":
+        self._params.append(("offset", str(start)))
+        self._params.append(("limit", str(end - start + 1)))
+        return self
+
+    async def execute(self) -> APIResponse:
+        params = list(self._params)
+        if self._order:
+            params.append(("order", ",".join(self._order)))
+        headers = dict(self._headers)
+        if self._prefer:
+            headers["Prefer"] = ",".join(self._prefer)
+        return await self._client.request(
+            self._method, f"/{self._table}", params=params, headers=headers, body=self._body
+        )
+
+
+class RPCBuilder:
+    """
+    Awaitable call to a PostgREST stored procedure (``POST /rpc/<fn>``).
+    """
+
+    def __init__(self, client: "AsyncPostgrestClient", function: str, params: Dict[str, Any]):
+        self._client = client
+        self._function = function
+        self._body = params
+        self._params: List[Tuple[str, str]] = []
+
+    def select(self, columns: str = "*") -> "RPCBuilder":
+        """
+        Narrow the columns returned by a set-returning function.
+        """
+        self._params.append(("select", columns))
+        return self
+
+    async def execute(self) -> APIResponse:
+        return await self._client.request(
+            "POST", f"/rpc/{self._function}", params=self._params, body=self._body
+        )
+
+
+class AsyncPostgrestClient:
+    """
+    Non-blocking PostgREST client backed by a pooled, keep-alive httpx client.
+
+    A single ``httpx.AsyncClient`` is shared by every request on the worker.
+    With HTTP/2 enabled, requests are multiplexed over a handful of
+    connections; the semaphore caps how many are in flight at once so a
+    burst of traffic queues in the worker instead of overwhelming PostgREST.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        *,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        max_concurrency: int = 500,
+        http2: bool = True,
+    ):
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self._headers = {
+            "apikey": api_key,
+            "Authorization": f"Bearer {api_key}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        }
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._http2 = http2
+        self._max_concurrency = max_concurrency
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the running event loop
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers,
+                limits=self._limits,
+                timeout=self._timeout,
+                http2=self._http2,
+            )
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._http
+
+    def table(self, name: str) -> QueryBuilder:
+        return QueryBuilder(self, name)
+
+    def from_(self, name: str) -> QueryBuilder:
+        return self.table(name)
+
+    def rpc(self, function: str, params: Optional[Dict[str, Any]] = None) -> RPCBuilder:
+        return RPCBuilder(self, function, params or {})
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[List[Tuple[str, str]]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        body: Any = None,
+    ) -> APIResponse:
+        http = self._get_http()
+        content = _dumps(body) if body is not None else None
+        try:
+            async with self._semaphore:
+                response = await http.request(
+                    method, path, params=params, headers=headers, content=content
+                )
+        except httpx.HTTPError as e:
+            # Reported like any other failed request, so callers' error paths apply
+            return APIResponse(
+                data=[], error={"message": f"Database request failed: {e!r}"}, status_code=503
+            )
+        return self._parse_response(response)
+
+    @staticmethod
+    def _parse_response(response: httpx.Response) -> APIResponse:
+        payload = None
+        if response.content and "json" in response.headers.get("content-type", ""):
+            try:
+                payload = response.json()
+            except ValueError:
+                payload = None
+
+        if response.status_code >= 400:
+            if not isinstance(payload, dict):
+                payload = {"message": response.text or response.reason_phrase}
+            return APIResponse(data=[], error=payload, status_code=response.status_code)
+
+        count = None
+        content_range = response.headers.get("content-range")
+        if content_range and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            count = int(total) if total.isdigit() else None
+
+        return APIResponse(
+            data=payload if payload is not None else [],
+            count=count,
+            status_code=response.status_code,
+        )
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+def get_supabase_client() -> AsyncPostgrestClient:
     """
-    Create and return a Supabase client instance.
+    Create and return an async PostgREST client for the Supabase project.
     """
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+    return AsyncPostgrestClient(
+        settings.SUPABASE_URL,
+        settings.SUPABASE_SERVICE_KEY,
+        max_connections=settings.DB_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.DB_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.DB_POOL_KEEPALIVE_EXPIRY,
+        timeout=settings.DB_TIMEOUT,
+        connect_timeout=settings.DB_CONNECT_TIMEOUT,
+        max_concurrency=settings.DB_MAX_CONCURRENCY,
+        http2=settings.DB_HTTP2,
+    )
 
 supabase = get_supabase_client()
@@ -1,5 +1,5 @@
 
-from typing import Optional, Any, List
+from typing import Optional, Any, List, Literal
 from datetime import datetime
 from uuid import UUID
 from pydantic import BaseModel, Field
@@ -59,3 +59,77 @@ class ActivityResponse(ActivityBase):
     
     class Config:
         orm_mode = True
+
+
+class ActivitySummary(BaseModel):
+    """
+    Slim activity shape for feed and list views (no map polyline).
+    """
+    id: UUID
+    name: Optional[str] = None
+    type: Optional[str] = None
+    start_date: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    distance_km: Optional[float] = None
+    elevation_gain_m: Optional[float] = None
+    moving_time_seconds: Optional[int] = None
+    average_speed_kph: Optional[float] = None
+    route_id: Optional[UUID] = None
+
+
+class ActivityListItem(ActivitySummary):
+    """
+    Any projection of an activity row returned by the list endpoint.
+    Only the selected columns are serialized.
+    """
+    user_id: Optional[UUID] = None
+    elapsed_time_seconds: Optional[int] = None
+    max_speed_kph: Optional[float] = None
+    average_heartrate_bpm: Optional[float] = None
+    max_heartrate_bpm: Optional[float] = None
+    average_cadence_rpm: Optional[float] = None
+    average_watts: Optional[float] = None
+    map_polyline: Optional[str] = None
+    strava_activity_id: Optional[int] = None
+    external_id: Optional[str] = None
+    kudos_count: Optional[int] = None
+    comment_count: Optional[int] = None
+    athlete_count: Optional[int] = None
+    private: Optional[bool] = None
+    trainer: Optional[bool] = None
+    commute: Optional[bool] = None
+
+
+class ActivityNearItem(ActivityListItem):
+    """
+    An activity returned by a near-point search, with the distance from the
+    search point to its start.
+    """
+    distance_m: float
+
+
+class ActivityBulkItem(ActivityCreate):
+    """
+    One activity of a bulk create. Imported activities keep the time they
+    were recorded at, so ``start_date`` is required.
+    """
+    start_date: datetime
+
+
+class ActivityBulkResult(BaseModel):
+    """
+    Outcome of one item of a bulk create, by its position in the request.
+    ``id`` is the new activity, or the existing one a duplicate matched.
+    """
+    index: int
+    status: Literal["created", "duplicate", "invalid", "failed"]
+    id: Optional[UUID] = None
+    detail: Optional[str] = None
+
+
+class ActivityBulkResponse(BaseModel):
+    created: int
+    duplicates: int
+    invalid: int
+    failed: int
+    results: List[ActivityBulkResult]
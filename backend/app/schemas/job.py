@@ -0,0 +1,20 @@
+
+from typing import Optional, Any, Dict
+from datetime import datetime
+from uuid import UUID
+from pydantic import BaseModel
+
+
+class JobResponse(BaseModel):
+    id: UUID
+    kind: str
+    status: str
+    progress: Dict[str, Any] = {}
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        orm_mode = True
@@ -1,5 +1,5 @@
 
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from uuid import UUID
 from pydantic import BaseModel
@@ -61,6 +61,26 @@ class ParticipantCreate(ParticipantBase):
 class ParticipantResponse(ParticipantBase):
     id: UUID
     joined_at: datetime
+    last_read_at: Optional[datetime] = None
     
     class Config:
         orm_mode = True
+
+
+class InboxParticipant(BaseModel):
+    user_id: UUID
+    username: Optional[str] = None
+    full_name: Optional[str] = None
+    avatar_url: Optional[str] = None
+
+
+class InboxEntry(ConversationResponse):
+    """
+    A conversation as shown in the inbox: last message, unread count and
+    up to five participants.
+    """
+    last_activity_at: datetime
+    last_message: Optional[MessageResponse] = None
+    unread_count: int = 0
+    participant_count: int = 0
+    participants: List[InboxParticipant] = []
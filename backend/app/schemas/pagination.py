@@ -0,0 +1,12 @@
+from typing import Generic, List, Optional, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    """
+    One page of a list, with the cursor of the next page (null on the last one)
+    """
+    items: List[T]
+    next_cursor: Optional[str] = None
@@ -1,5 +1,5 @@
 
-from typing import Optional, Any, List
+from typing import Optional, Any, Dict, List
 from datetime import datetime
 from uuid import UUID
 from pydantic import BaseModel, Field
@@ -31,6 +31,38 @@ class RouteResponse(RouteBase):
     id: UUID
     user_id: Optional[UUID] = None
     created_at: datetime
+    grade_histogram: Optional[Dict[str, Any]] = None
     
     class Config:
         orm_mode = True
+
+
+class RouteSummary(BaseModel):
+    """
+    Slim route shape for list views (no coordinates).
+    """
+    id: UUID
+    name: Optional[str] = None
+    type: Optional[str] = None
+    distance_km: Optional[float] = None
+    elevation_gain_m: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+
+class RouteListItem(RouteSummary):
+    """
+    Any projection of a route row returned by the list endpoint.
+    Only the selected columns are serialized.
+    """
+    user_id: Optional[UUID] = None
+    description: Optional[str] = None
+    coordinates: Optional[Any] = None
+    grade_histogram: Optional[Dict[str, Any]] = None
+
+
+class RouteNearItem(RouteListItem):
+    """
+    A route returned by a near-point search, with the distance from the
+    search point to its start.
+    """
+    distance_m: float
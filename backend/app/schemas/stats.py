@@ -0,0 +1,17 @@
+from datetime import date
+from typing import Literal, Optional
+from pydantic import BaseModel
+
+
+class ActivityStatsBucket(BaseModel):
+    """
+    Totals of a user's activities of one type in one week, month or year
+    """
+    period: Literal["week", "month", "year"]
+    period_start: date
+    type: Optional[str] = None
+    activity_count: int
+    distance_km: float
+    elevation_gain_m: float
+    moving_time_seconds: int
+    elapsed_time_seconds: int
@@ -0,0 +1,15 @@
+from typing import Dict, Any
+from pydantic import BaseModel
+
+
+class StravaWebhookEvent(BaseModel):
+    """
+    Schema for events pushed by a Strava webhook subscription
+    """
+    object_type: str
+    object_id: int
+    aspect_type: str
+    owner_id: int
+    subscription_id: int
+    event_time: int
+    updates: Dict[str, Any] = {}
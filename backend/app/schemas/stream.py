@@ -0,0 +1,13 @@
+from typing import Any, Dict, List
+from uuid import UUID
+from pydantic import BaseModel
+
+
+class ActivityStreamsResponse(BaseModel):
+    """
+    Schema for an activity's (optionally downsampled) streams
+    """
+    activity_id: UUID
+    original_size: int
+    point_count: int
+    streams: Dict[str, List[Any]]
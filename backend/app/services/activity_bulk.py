@@ -0,0 +1,208 @@
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.db import format_filter_value, supabase
+from app.schemas.activity import ActivityBulkItem
+from app.services.activity_tiles import invalidate_activity_tiles
+from app.services.route_geometry import derive_activity_columns
+from app.services.route_matching import schedule_route_matching
+
+# Rows per multi-row upsert, and keys per duplicate lookup (they go in the URL)
+BULK_CHUNK_SIZE = 500
+LOOKUP_BATCH_SIZE = 100
+
+Item = Tuple[int, ActivityBulkItem]
+
+
+class ActivityBulkError(Exception):
+    """
+    Raised when a chunk of a bulk create can't be written.
+    """
+
+
+def _result(index: int, status: str, activity_id: Optional[str] = None, detail: Optional[str] = None) -> Dict[str, Any]:
+    return {"index": index, "status": status, "id": activity_id, "detail": detail}
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in issue['loc']) or 'item'}: {issue['msg']}"
+        for issue in error.errors()
+    )
+
+
+def validate_items(items: List[Any]) -> Tuple[List[Item], Dict[int, Dict[str, Any]]]:
+    """
+    Validate every item and drop repeats within the request.
+
+    An item repeats an earlier one when they share a ``strava_activity_id``
+    or an ``external_id``. Returns the items to write with their positions,
+    and the results of the ones rejected.
+    """
+    valid: List[Item] = []
+    rejected: Dict[int, Dict[str, Any]] = {}
+    seen: Dict[Tuple[str, Any], int] = {}
+    for index, item in enumerate(items):
+        try:
+            activity = ActivityBulkItem.model_validate(item)
+        except ValidationError as e:
+            rejected[index] = _result(index, "invalid", detail=_validation_detail(e))
+            continue
+
+        keys = [
+            key for key in (("strava", activity.strava_activity_id), ("external", activity.external_id))
+            if key[1] is not None
+        ]
+        earlier = next((seen[key] for key in keys if key in seen), None)
+        if earlier is not None:
+            rejected[index] = _result(index, "duplicate", detail=f"Same activity as item {earlier}")
+            continue
+        for key in keys:
+            seen[key] = index
+        valid.append((index, activity))
+    return valid, rejected
+
+
+async def _existing(user_id: str, chunk: List[Item]) -> Dict[Tuple[str, Any], str]:
+    """
+    Ids of the user's activities that share a key with an item of ``chunk``.
+    """
+    existing: Dict[Tuple[str, Any], str] = {}
+    for start in range(0, len(chunk), LOOKUP_BATCH_SIZE):
+        batch = [activity for _, activity in chunk[start:start + LOOKUP_BATCH_SIZE]]
+        strava_ids = [str(a.strava_activity_id) for a in batch if a.strava_activity_id is not None]
+        external_ids = [format_filter_value(a.external_id) for a in batch if a.external_id is not None]
+        filters = []
+        if strava_ids:
+            filters.append(f"strava_activity_id.in.({','.join(strava_ids)})")
+        if external_ids:
+            filters.append(f"external_id.in.({','.join(external_ids)})")
+        if not filters:
+            continue
+
+        response = await supabase.table("activities") \
+                                 .select("id,strava_activity_id,external_id") \
+                                 .eq("user_id", user_id) \
+                                 .or_(",".join(filters)) \
+                                 .execute()
+        if response.error is not None:
+            raise ActivityBulkError(str(response.error))
+        for row in response.data:
+            if row["strava_activity_id"] is not None:
+                existing[("strava", row["strava_activity_id"])] = row["id"]
+            if row["external_id"] is not None:
+                existing[("external", row["external_id"])] = row["id"]
+    return existing
+
+
+def build_rows(user_id: str, activities: List[ActivityBulkItem]) -> List[Dict[str, Any]]:
+    """
+    ``activities`` rows with their derived columns, all with the same keys
+    so they can go in one multi-row write.
+
+    Activities without a route are left for one matching pass over the
+    whole batch rather than matched one by one.
+    """
+    now = datetime.now(timezone.utc)
+    rows = []
+    for activity in activities:
+        row = activity.dict()
+        row["user_id"] = user_id
+        row.update(derive_activity_columns(activity.map_polyline, activity.distance_km is not None))
+        row["route_matched_at"] = now if activity.route_id is not None else None
+        rows.append(row)
+    return rows
+
+
+async def _insert(user_id: str, items: List[Item], keyed: bool) -> List[Dict[str, Any]]:
+    """
+    Write ``items`` in one statement; they all have a Strava id or none do.
+    """
+    rows = await asyncio.to_thread(build_rows, user_id, [activity for _, activity in items])
+    query = supabase.table("activities")
+    if keyed:
+        # strava_activity_id is unique across users; a clash is skipped rather than failing the chunk
+        query = query.upsert(rows, on_conflict="strava_activity_id", ignore_duplicates=True)
+    else:
+        query = query.insert(rows)
+    response = await query.select("id,strava_activity_id,map_polyline,route_id").execute()
+    if response.error is not None:
+        raise ActivityBulkError(str(response.error))
+    return response.data
+
+
+async def _write_chunk(user_id: str, chunk: List[Item], results: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Write the items of ``chunk`` that aren't stored yet and record every
+    item's result. Returns the rows created.
+
+    Items with and without a Strava id go in separate statements, so a
+    failure of one group doesn't fail the other.
+    """
+    existing = await _existing(user_id, chunk)
+    keyed: List[Item] = []
+    keyless: List[Item] = []
+    for index, activity in chunk:
+        match = existing.get(("strava", activity.strava_activity_id)) or existing.get(("external", activity.external_id))
+        if match is not None:
+            results[index] = _result(index, "duplicate", match, "Already imported")
+        elif activity.strava_activity_id is not None:
+            keyed.append((index, activity))
+        else:
+            keyless.append((index, activity))
+
+    created: List[Dict[str, Any]] = []
+    for items, is_keyed in ((keyed, True), (keyless, False)):
+        if not items:
+            continue
+        try:
+            rows = await _insert(user_id, items, is_keyed)
+        except ActivityBulkError as e:
+            for index, _ in items:
+                results[index] = _result(index, "failed", detail=str(e))
+            continue
+
+        if is_keyed:
+            by_strava_id = {row["strava_activity_id"]: row for row in rows}
+            matched = [by_strava_id.get(activity.strava_activity_id) for _, activity in items]
+        else:
+            # Inserted rows come back in the order they were sent
+            matched = rows
+        for (index, _), row in zip(items, matched):
+            if row is None:
+                results[index] = _result(index, "duplicate", detail="Already imported")
+            else:
+                results[index] = _result(index, "created", row["id"])
+        created.extend(rows)
+    return created
+
+
+async def create_activities(user_id: str, items: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Create many activities for a user in chunked multi-row writes.
+
+    Items are validated and deduplicated (against each other and the user's
+    stored activities, on ``strava_activity_id`` or ``external_id``) first.
+    A chunk that fails to write marks its items as failed without undoing
+    earlier chunks. Returns one result per item, in request order.
+    """
+    valid, results = validate_items(items)
+
+    created: List[Dict[str, Any]] = []
+    for start in range(0, len(valid), BULK_CHUNK_SIZE):
+        chunk = valid[start:start + BULK_CHUNK_SIZE]
+        try:
+            created.extend(await _write_chunk(user_id, chunk, results))
+        except ActivityBulkError as e:
+            for index, _ in chunk:
+                results.setdefault(index, _result(index, "failed", detail=str(e)))
+
+    if created:
+        await invalidate_activity_tiles(user_id, [row["map_polyline"] for row in created])
+        if any(row["route_id"] is None for row in created):
+            await schedule_route_matching(user_id)
+    return [results[index] for index in range(len(items))]
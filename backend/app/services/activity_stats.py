@@ -0,0 +1,78 @@
+
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from app.db import supabase
+from app.services.jobs import ProgressReporter, job_queue
+
+STATS_REBUILD_JOB_KIND = "stats_rebuild"
+
+BUCKET_COLUMNS = (
+    "period,period_start,type,activity_count,distance_km,elevation_gain_m,"
+    "moving_time_seconds,elapsed_time_seconds"
+)
+
+
+class StatsError(Exception):
+    """
+    Raised when training stats can't be read or rebuilt.
+    """
+
+
+async def get_stats(
+    user_id: str,
+    period: str,
+    activity_type: Optional[str] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    limit: int = 500,
+) -> List[Dict[str, Any]]:
+    """
+    The user's ``period`` buckets, most recent first, one per sport type.
+
+    Buckets are maintained by triggers on ``activities`` (see the
+    ``activity_stats`` migration), so this reads one row per period and
+    type however many activities they hold. ``since`` and ``until`` bound
+    the periods' start dates.
+    """
+    query = supabase.table("activity_stats") \
+                    .select(BUCKET_COLUMNS) \
+                    .eq("user_id", user_id) \
+                    .eq("period", period)
+    if activity_type is not None:
+        query = query.eq("type", activity_type)
+    if since is not None:
+        query = query.gte("period_start", since)
+    if until is not None:
+        query = query.lte("period_start", until)
+    response = await query.order("period_start", desc=True) \
+                          .order("type") \
+                          .limit(limit) \
+                          .execute()
+    if response.error is not None:
+        raise StatsError(str(response.error))
+
+    for bucket in response.data:
+        # Untyped activities are stored under '' to keep the key non-null
+        bucket["type"] = bucket["type"] or None
+    return response.data
+
+
+async def rebuild_stats(user_id: str) -> Dict[str, int]:
+    """
+    Recompute all of the user's buckets from their activities.
+    """
+    response = await supabase.rpc("rebuild_activity_stats", {"p_user_id": user_id}).execute()
+    if response.error is not None:
+        raise StatsError(str(response.error))
+    return {"buckets": response.data}
+
+
+async def run_stats_rebuild_job(job: Dict[str, Any], report: ProgressReporter) -> Dict[str, int]:
+    """
+    Job handler for ``POST /stats/rebuild``.
+    """
+    return await rebuild_stats(job["user_id"])
+
+
+job_queue.register(STATS_REBUILD_JOB_KIND, run_stats_rebuild_job)
@@ -0,0 +1,308 @@
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core import polyline
+from app.core.geometry import polyline_positions
+from app.core.mvt import EXTENT, encode_layer, encode_tile, tile_bounds, to_tile
+from app.services.spatial import SpatialQueryError, spatial_index
+
+logger = logging.getLogger(__name__)
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+LAYER_NAME = "activities"
+
+# Lines are kept this far past the tile edge (in tile pixels) so strokes
+# don't end abruptly at tile seams
+BUFFER = 64
+# Tracks are snapped to a grid this many tile pixels wide (a 512px tile
+# has 8 per screen pixel)
+SIMPLIFY_TOLERANCE = 4.0
+MAX_FEATURES = 10_000
+
+TileKey = Tuple[int, int, int]
+
+# Per-user file whose mtime changes on every invalidation
+INVALIDATION_MARKER = ".invalidated"
+
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class TileError(Exception):
+    """
+    Raised when a tile's activities can't be loaded.
+    """
+
+
+def render_tile(rows: Iterable[Dict[str, Any]], z: int, x: int, y: int) -> bytes:
+    """
+    Encode the tracks of ``rows`` (with ``id``, ``type`` and ``map_polyline``)
+    that cross tile ``z/x/y`` as one MVT layer of linestrings.
+
+    All tracks are projected, clipped and simplified in one pass over their
+    points: segments that don't reach into the buffered tile are dropped,
+    and positions are snapped to a ``SIMPLIFY_TOLERANCE`` pixel grid with
+    repeats removed, so a track keeps at most one point per grid cell it
+    crosses. Only the surviving runs are handled one at a time.
+    """
+    rows = list(rows)
+    try:
+        points, offsets = polyline.decode_many([row.get("map_polyline") for row in rows])
+        positions = points[:, ::-1]
+        counts = np.diff(offsets)
+    except ValueError:
+        # Decode one by one so a malformed polyline only drops its own track
+        tracks = [polyline_positions(row.get("map_polyline")) for row in rows]
+        tracks = [track if track is not None else np.zeros((0, 2)) for track in tracks]
+        positions = np.concatenate(tracks)
+        counts = np.array([len(track) for track in tracks])
+    if not len(positions):
+        return b""
+    owner = np.repeat(np.arange(len(rows)), counts)
+    grid = np.rint(to_tile(positions, z, x, y) / SIMPLIFY_TOLERANCE)
+    snapped = (grid * SIMPLIFY_TOLERANCE).astype(np.int64)
+
+    starts, ends = snapped[:-1], snapped[1:]
+    reaches = (np.minimum(starts, ends) <= EXTENT + BUFFER) & (np.maximum(starts, ends) >= -BUFFER)
+    keep = (owner[:-1] == owner[1:]) & reaches.all(axis=1)
+    edges = np.diff(np.concatenate(([0], keep.astype(np.int8), [0])))
+
+    parts: Dict[int, List[np.ndarray]] = {}
+    for first, last in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        run = snapped[first:last + 1]
+        run = run[np.concatenate(([True], (np.diff(run, axis=0) != 0).any(axis=1)))]
+        if len(run) >= 2:
+            parts.setdefault(int(owner[first]), []).append(run)
+
+    if not parts:
+        return b""
+    features = [
+        (track_parts, {"id": rows[i]["id"], "type": rows[i].get("type")})
+        for i, track_parts in parts.items()
+    ]
+    return encode_tile([encode_layer(LAYER_NAME, features)])
+
+
+def touched_tiles(tracks: List[np.ndarray], z: int, tiles: np.ndarray) -> np.ndarray:
+    """
+    Mask of the ``(n, 2)`` tile addresses at zoom ``z`` that any segment of
+    the ``[lng, lat]`` ``tracks`` reaches, buffer included.
+
+    Each segment is tested by its bounding box, so a tile next to a diagonal
+    segment may be reported too; that only costs a rebuild.
+    """
+    touched = np.zeros(len(tiles), dtype=bool)
+    margin = BUFFER / EXTENT
+    for track in tracks:
+        # Global tile units at zoom z
+        units = to_tile(track, z, 0, 0, extent=1)
+        if len(units) == 1:
+            units = np.repeat(units, 2, axis=0)
+        low = np.minimum(units[:-1], units[1:]) - margin
+        high = np.maximum(units[:-1], units[1:]) + margin
+        hit = ((low[None, :, :] < tiles[:, None, :] + 1) & (high[None, :, :] >= tiles[:, None, :])).all(axis=2)
+        touched |= hit.any(axis=1)
+    return touched
+
+
+class TileCache:
+    """
+    Rendered tiles on local disk, one directory per user.
+
+    Each user's tiles are evicted least recently used first once they take
+    more than ``max_bytes``. Recency is the file mtime, which hits refresh,
+    so workers sharing the directory share one LRU order. The in-memory
+    index only tracks what this worker has seen; it is rebuilt from disk
+    before evicting, and invalidation always works from the disk.
+
+    Every invalidation also bumps the mtime of a per-user marker file. A
+    tile is only kept if the marker hasn't changed since its data was read,
+    so no worker can store a tile rendered before another worker's edit.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._index: Dict[str, "OrderedDict[TileKey, int]"] = {}
+
+    def _user_dir(self, user_id: str) -> Path:
+        if not _SAFE_ID.match(user_id):
+            raise ValueError(f"Unsafe user id for tile cache: {user_id!r}")
+        return self.directory / user_id
+
+    def _path(self, user_id: str, key: TileKey) -> Path:
+        z, x, y = key
+        return self._user_dir(user_id) / str(z) / str(x) / f"{y}.mvt"
+
+    def _scan(self, user_id: str) -> "OrderedDict[TileKey, int]":
+        entries = []
+        for path in self._user_dir(user_id).glob("*/*/*.mvt"):
+            try:
+                stat = path.stat()
+                key = (int(path.parent.parent.name), int(path.parent.name), int(path.stem))
+            except (OSError, ValueError):
+                continue
+            entries.append((stat.st_mtime, key, stat.st_size))
+        entries.sort()
+        return OrderedDict((key, size) for _, key, size in entries)
+
+    def _marker(self, user_id: str) -> Path:
+        return self._user_dir(user_id) / INVALIDATION_MARKER
+
+    def _generation(self, user_id: str) -> int:
+        try:
+            return self._marker(user_id).stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _bump(self, user_id: str) -> None:
+        marker = self._marker(user_id)
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        previous = self._generation(user_id)
+        marker.touch()
+        # Coarse filesystem clocks could leave the mtime unchanged
+        now = max(time.time_ns(), previous + 1)
+        os.utime(marker, ns=(now, now))
+
+    async def generation(self, user_id: str) -> int:
+        """
+        Changes whenever the user's tiles are invalidated, by any worker; a
+        tile rendered from data read before a change must not be stored after it.
+        """
+        return await asyncio.to_thread(self._generation, user_id)
+
+    def _read(self, user_id: str, key: TileKey) -> Optional[bytes]:
+        path = self._path(user_id, key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def _write(self, user_id: str, key: TileKey, data: bytes, generation: int) -> None:
+        if self._generation(user_id) != generation:
+            return
+        path = self._path(user_id, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+        if self._generation(user_id) != generation:
+            # Invalidated while writing; the invalidation may have scanned before the file existed
+            path.unlink(missing_ok=True)
+            return
+
+        index = self._index.setdefault(user_id, OrderedDict())
+        index[key] = len(data)
+        index.move_to_end(key)
+        if sum(index.values()) > self.max_bytes:
+            index = self._index[user_id] = self._scan(user_id)
+            total = sum(index.values())
+            while total > self.max_bytes and len(index) > 1:
+                evicted, size = index.popitem(last=False)
+                self._path(user_id, evicted).unlink(missing_ok=True)
+                total -= size
+
+    def _invalidate(self, user_id: str, tracks: List[np.ndarray]) -> int:
+        removed = 0
+        index = self._index.get(user_id, OrderedDict())
+        for zoom_dir in self._user_dir(user_id).glob("*"):
+            try:
+                z = int(zoom_dir.name)
+            except ValueError:
+                continue
+            paths = list(zoom_dir.glob("*/*.mvt"))
+            if not paths:
+                continue
+            tiles = np.array([(int(p.parent.name), int(p.stem)) for p in paths])
+            for i in np.flatnonzero(touched_tiles(tracks, z, tiles)):
+                paths[i].unlink(missing_ok=True)
+                index.pop((z, int(tiles[i, 0]), int(tiles[i, 1])), None)
+                removed += 1
+        return removed
+
+    def _clear(self, user_id: str) -> None:
+        for path in self._user_dir(user_id).glob("*/*/*.mvt"):
+            path.unlink(missing_ok=True)
+        self._index.pop(user_id, None)
+
+    async def get(self, user_id: str, key: TileKey) -> Optional[bytes]:
+        data = await asyncio.to_thread(self._read, user_id, key)
+        index = self._index.get(user_id)
+        if index is not None:
+            if data is None:
+                index.pop(key, None)
+            elif key in index:
+                index.move_to_end(key)
+        return data
+
+    async def set(self, user_id: str, key: TileKey, data: bytes, generation: int) -> None:
+        await asyncio.to_thread(self._write, user_id, key, data, generation)
+
+    async def invalidate(self, user_id: str, tracks: List[np.ndarray]) -> int:
+        """
+        Drop the user's cached tiles that any of ``tracks`` passes through.
+        Returns how many were removed.
+        """
+        await asyncio.to_thread(self._bump, user_id)
+        if not tracks:
+            return 0
+        return await asyncio.to_thread(self._invalidate, user_id, tracks)
+
+    async def clear(self, user_id: str) -> None:
+        await asyncio.to_thread(self._bump, user_id)
+        await asyncio.to_thread(self._clear, user_id)
+
+
+tile_cache = TileCache(settings.TILE_CACHE_DIR, settings.TILE_CACHE_MAX_BYTES_PER_USER)
+
+
+async def get_tile(user_id: str, z: int, x: int, y: int) -> bytes:
+    """
+    Return the user's activity tile ``z/x/y``, rendering and caching it on a miss.
+    """
+    key = (z, x, y)
+    cached = await tile_cache.get(user_id, key)
+    if cached is not None:
+        return cached
+
+    generation = await tile_cache.generation(user_id)
+    buffer = BUFFER / EXTENT
+    bounds = tile_bounds(z, x, y)
+    width, height = bounds[2] - bounds[0], bounds[3] - bounds[1]
+    search = (
+        max(bounds[0] - width * buffer, -180.0), max(bounds[1] - height * buffer, -90.0),
+        min(bounds[2] + width * buffer, 180.0), min(bounds[3] + height * buffer, 90.0),
+    )
+    try:
+        rows = await spatial_index.within(
+            "activities", user_id, search, "id,type,map_polyline", MAX_FEATURES
+        )
+    except SpatialQueryError as e:
+        raise TileError(str(e))
+
+    data = await asyncio.to_thread(render_tile, rows, z, x, y)
+    await tile_cache.set(user_id, key, data, generation)
+    return data
+
+
+async def invalidate_activity_tiles(user_id: str, polylines: Iterable[Optional[str]]) -> None:
+    """
+    Drop the cached tiles the given activity polylines pass through.
+    Cache failures are logged; the data change they follow has already happened.
+    """
+    tracks = [track for track in map(polyline_positions, polylines) if track is not None]
+    try:
+        await tile_cache.invalidate(user_id, tracks)
+    except (OSError, ValueError) as e:
+        logger.warning("Failed to invalidate tiles for %s: %s", user_id, e)
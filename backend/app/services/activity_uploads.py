@@ -0,0 +1,224 @@
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.activity_files import ActivityFileError, ParsedActivity, parse_activity_file, sport_type
+from app.core.config import settings
+from app.core import polyline
+from app.core.geometry import (
+    ELEVATION_SMOOTHING_M, elevation_gain, polyline_positions, project, segment_lengths, significance,
+    smooth_along,
+)
+from app.db import supabase
+from app.services.activity_tiles import invalidate_activity_tiles
+from app.services.route_geometry import compute_activity_columns
+from app.services.route_matching import RouteMatchError, match_route
+from app.services.strava import StravaError
+from app.services.strava_streams import encode_streams, write_streams
+
+DEFAULT_NAME = "Uploaded activity"
+
+# A sample counts as moving at this smoothed speed or above
+MOVING_SPEED_MPS = 0.5
+# Speed is measured over this many seconds and grade over this many meters
+SPEED_WINDOW_S = 10.0
+GRADE_WINDOW_M = 50.0
+# Simplification tolerance of the stored map polyline
+MAP_POLYLINE_TOLERANCE_M = 5.0
+
+
+class ActivityUploadError(Exception):
+    """
+    Raised when an uploaded activity can't be stored.
+    """
+
+
+def _fill(values: np.ndarray) -> np.ndarray:
+    """
+    Replace NaN samples with the previous valid one (the first valid one at
+    the start). All-NaN input is returned unchanged.
+    """
+    valid = ~np.isnan(values)
+    if valid.all() or not valid.any():
+        return values
+    last = np.maximum.accumulate(np.where(valid, np.arange(len(values)), -1))
+    return values[np.where(last >= 0, last, np.argmax(valid))]
+
+
+def _windowed_rate(x: np.ndarray, y: np.ndarray, window: float) -> np.ndarray:
+    """
+    Rate of change of ``y`` over ``x`` measured across ``window`` units of
+    ``x`` centered on each sample (shrunk at the ends). ``x`` is non-decreasing.
+    """
+    low = np.maximum(x - window / 2, x[0])
+    high = np.minimum(x + window / 2, x[-1])
+    span = high - low
+    change = np.interp(high, x, y) - np.interp(low, x, y)
+    return np.divide(change, span, out=np.zeros_like(span), where=span > 0)
+
+
+def _mean(values: np.ndarray) -> Optional[float]:
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else None
+
+
+def _max(values: np.ndarray) -> Optional[float]:
+    values = values[~np.isnan(values)]
+    return float(values.max()) if len(values) else None
+
+
+def summarize_track(points: Dict[str, np.ndarray]) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Compute the ``ActivityBase`` summary fields and the streams of a track.
+
+    ``points`` holds the per-sample channels of ``activity_files.CHANNELS``.
+    Every field is derived with whole-array operations; the device's own
+    distance and speed are preferred over ones derived from positions.
+    Returns the summary columns and the streams keyed like Strava's.
+    """
+    count = len(points["time"])
+    summary: Dict[str, Any] = {}
+    streams: Dict[str, np.ndarray] = {}
+
+    located = ~(np.isnan(points["lat"]) | np.isnan(points["lng"]))
+    lnglat = np.column_stack((points["lng"], points["lat"]))[located]
+    if len(lnglat):
+        streams["latlng"] = np.column_stack((_fill(points["lat"]), _fill(points["lng"])))
+        keep = significance(project(lnglat), MAP_POLYLINE_TOLERANCE_M) > MAP_POLYLINE_TOLERANCE_M
+        summary["map_polyline"] = polyline.encode(lnglat[keep][:, ::-1])
+
+    distance = None
+    if not np.isnan(points["distance"]).all():
+        distance = np.maximum.accumulate(np.nan_to_num(_fill(points["distance"])))
+    elif len(lnglat) >= 2:
+        distance = np.full(count, np.nan)
+        distance[located] = np.concatenate(([0.0], np.cumsum(segment_lengths(lnglat))))
+        distance = np.nan_to_num(_fill(distance))
+    if distance is not None:
+        distance -= distance[0]
+        streams["distance"] = distance
+        summary["distance_km"] = float(distance[-1]) / 1000
+
+    time = _fill(points["time"])
+    if not np.isnan(time).all():
+        summary["start_date"] = datetime.fromtimestamp(time[0], timezone.utc).isoformat()
+        elapsed = np.maximum.accumulate(time - time[0])
+        streams["time"] = elapsed
+        summary["elapsed_time_seconds"] = int(round(elapsed[-1]))
+
+        velocity = _fill(points["speed"])
+        if distance is not None:
+            derived = _windowed_rate(elapsed, distance, SPEED_WINDOW_S)
+            velocity = np.where(np.isnan(velocity), derived, velocity)
+        if not np.isnan(velocity).all():
+            velocity = np.nan_to_num(velocity)
+            streams["velocity_smooth"] = velocity
+            summary["max_speed_kph"] = float(velocity.max()) * 3.6
+
+            moving = velocity >= MOVING_SPEED_MPS
+            streams["moving"] = moving.astype(np.int8)
+            steps = np.diff(elapsed)
+            segments = moving[1:]
+            if distance is not None:
+                # Pauses the device recorded as a gap don't count, however fast either end is
+                segments &= np.diff(distance) >= MOVING_SPEED_MPS * steps
+            moving_time = float(steps[segments].sum())
+            summary["moving_time_seconds"] = int(round(moving_time))
+            if distance is not None and moving_time > 0:
+                summary["average_speed_kph"] = float(distance[-1]) / moving_time * 3.6
+
+    altitude = points["altitude"]
+    measured = ~np.isnan(altitude)
+    if measured.any():
+        streams["altitude"] = _fill(altitude)
+        if distance is not None:
+            smoothed = smooth_along(distance[measured], altitude[measured], ELEVATION_SMOOTHING_M)
+            summary["elevation_gain_m"] = elevation_gain(smoothed)
+            grade = _windowed_rate(distance[measured], smoothed, GRADE_WINDOW_M) * 100
+            streams["grade_smooth"] = np.interp(distance, distance[measured], grade)
+        else:
+            summary["elevation_gain_m"] = elevation_gain(altitude[measured])
+
+    summary["average_heartrate_bpm"] = _mean(points["heartrate"])
+    summary["max_heartrate_bpm"] = _max(points["heartrate"])
+    # Coasting isn't pedalling slowly, so zero cadence is left out of the average
+    cadence = points["cadence"]
+    summary["average_cadence_rpm"] = _mean(np.where(cadence > 0, cadence, np.nan))
+    summary["average_watts"] = _mean(points["watts"])
+    for stream_type, channel in (("heartrate", "heartrate"), ("cadence", "cadence"),
+                                 ("watts", "watts"), ("temp", "temp")):
+        if not np.isnan(points[channel]).all():
+            streams[stream_type] = _fill(points[channel])
+
+    return summary, streams
+
+
+def read_activity_file(stream: BinaryIO) -> Tuple[ParsedActivity, Dict[str, Any], Dict[str, Any]]:
+    """
+    Parse, summarize and encode the streams of an activity file in one go,
+    for running off the event loop. Returns the parsed file, the summary
+    columns and the encoded ``activity_streams`` columns.
+    """
+    parsed = parse_activity_file(stream, settings.ACTIVITY_UPLOAD_MAX_BYTES)
+    summary, streams = summarize_track(parsed.points)
+    if "start_date" not in summary:
+        # Every activity needs a start date, and routes without times belong in routes
+        raise ActivityFileError("File has no timestamps; upload a recorded activity")
+    return parsed, summary, encode_streams(streams)
+
+
+async def import_activity_file(
+    user_id: str,
+    stream: BinaryIO,
+    name: Optional[str] = None,
+    activity_type: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Create an activity, with its streams, from an uploaded GPX, TCX or FIT file.
+
+    The file is parsed and summarized, and its streams encoded, in a worker
+    thread. Raises ``ActivityFileError`` for unreadable files and
+    ``ActivityUploadError`` if the activity can't be stored.
+    """
+    parsed, summary, stream_columns = await asyncio.to_thread(read_activity_file, stream)
+
+    activity_data: Dict[str, Any] = {
+        **summary,
+        "user_id": user_id,
+        "name": name or parsed.name or DEFAULT_NAME,
+        "type": sport_type(activity_type) or activity_type or parsed.type,
+        # Filenames repeat across rides; only a FIT file_id identifies the recording
+        "external_id": parsed.file_id,
+    }
+    map_polyline = summary.get("map_polyline")
+    activity_data.update(await compute_activity_columns(map_polyline, "distance_km" in summary))
+    try:
+        route_id = await match_route(user_id, polyline_positions(map_polyline))
+    except RouteMatchError as e:
+        raise ActivityUploadError(str(e))
+    if route_id is not None:
+        activity_data["route_id"] = route_id
+    activity_data["route_matched_at"] = datetime.now(timezone.utc)
+
+    response = await supabase.table("activities") \
+                             .insert(activity_data) \
+                             .execute()
+    if response.error is not None:
+        raise ActivityUploadError(str(response.error))
+    activity = response.data[0]
+
+    try:
+        await write_streams(activity, stream_columns)
+    except StravaError as e:
+        # Don't leave an activity behind whose streams would never arrive
+        await supabase.table("activities") \
+                      .delete(returning="minimal") \
+                      .eq("id", activity["id"]) \
+                      .execute()
+        raise ActivityUploadError(str(e))
+
+    await invalidate_activity_tiles(user_id, [map_polyline])
+    return activity
@@ -0,0 +1,412 @@
+
+import asyncio
+import io
+import json
+import os
+import re
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Type
+from xml.sax.saxutils import escape
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core import polyline
+from app.core.pagination import next_cursor, paginate
+from app.core.streams import decode_stream
+from app.db import decode_bytea, supabase
+from app.schemas.activity import ActivityResponse
+from app.schemas.bike import BikeResponse
+from app.schemas.route import RouteResponse
+
+# What an export contains, in order: (record type, ZIP entry, table, public row shape)
+EXPORT_TABLES: Tuple[Tuple[str, str, str, Type[BaseModel]], ...] = (
+    ("bike", "bikes.ndjson", "bikes", BikeResponse),
+    ("route", "routes.ndjson", "routes_data", RouteResponse),
+    ("activity", "activities.ndjson", "activities", ActivityResponse),
+)
+GPX_STREAMS = ("latlng", "time", "altitude", "heartrate", "cadence", "watts", "temp")
+# Activities whose streams are fetched (and held, still compressed) at once
+STREAM_BATCH_SIZE = 10
+GPX_POINTS_PER_CHUNK = 2000
+SPOOL_READ_SIZE = 64 * 1024
+
+ExportStream = Callable[[], AsyncIterator[bytes]]
+
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class ExportError(Exception):
+    """
+    Raised when an export can't read the user's data.
+    """
+
+
+class ExportBusyError(ExportError):
+    """
+    Raised when starting an export would exceed the concurrency limits.
+    """
+
+
+class ExportLease:
+    """
+    One running export's slot; releasing it more than once is harmless.
+    """
+
+    def __init__(self, limiter: "ExportLimiter", user_id: str):
+        self._limiter = limiter
+        self._user_id = user_id
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release(self._user_id)
+
+
+class ExportLimiter:
+    """
+    Caps how many exports run at once, per user and on this worker.
+
+    Exports read a user's whole history, so they are refused rather than
+    queued when the limits are reached; interactive requests keep the
+    database connections and the event loop.
+    """
+
+    def __init__(self, per_user: int, total: int):
+        self.per_user = per_user
+        self.total = total
+        self._running: Dict[str, int] = {}
+
+    def acquire(self, user_id: str) -> ExportLease:
+        running = self._running.get(user_id, 0)
+        if running >= self.per_user:
+            raise ExportBusyError("An export is already running for this user")
+        if sum(self._running.values()) >= self.total:
+            raise ExportBusyError("Too many exports are running, try again shortly")
+        self._running[user_id] = running + 1
+        return ExportLease(self, user_id)
+
+    def _release(self, user_id: str) -> None:
+        running = self._running.get(user_id, 0) - 1
+        if running > 0:
+            self._running[user_id] = running
+        else:
+            self._running.pop(user_id, None)
+
+
+export_limiter = ExportLimiter(settings.EXPORT_MAX_CONCURRENT_PER_USER, settings.EXPORT_MAX_CONCURRENT)
+
+
+async def _pages(
+    table: str, columns: str, user_id: str, as_of: datetime
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Walk the user's rows created up to ``as_of``, newest first, one keyset page at a time.
+    """
+    page_size = settings.EXPORT_PAGE_SIZE
+    cursor: Optional[str] = None
+    while True:
+        query = supabase.table(table) \
+                        .select(columns) \
+                        .eq("user_id", user_id) \
+                        .lte("created_at", as_of)
+        response = await paginate(query, "created_at", page_size, cursor=cursor).execute()
+        if response.error is not None:
+            raise ExportError(str(response.error))
+        if response.data:
+            yield response.data
+        cursor = next_cursor(response.data, "created_at", page_size)
+        if cursor is None:
+            return
+
+
+def _columns(model: Type[BaseModel]) -> str:
+    return ",".join(model.model_fields)
+
+
+def _ndjson(record_type: str, rows: List[Dict[str, Any]]) -> bytes:
+    return b"".join(
+        json.dumps({"type": record_type, "data": row}, separators=(",", ":"), default=str).encode() + b"\n"
+        for row in rows
+    )
+
+
+async def ndjson_export(user_id: str, as_of: datetime) -> AsyncIterator[bytes]:
+    """
+    Every bike, route and activity of the user as one JSON record per line.
+    """
+    for record_type, _, table, model in EXPORT_TABLES:
+        async for rows in _pages(table, _columns(model), user_id, as_of):
+            yield _ndjson(record_type, rows)
+
+
+def _gpx_time(start: datetime, seconds: np.ndarray) -> List[str]:
+    instants = np.datetime64(int(start.timestamp()), "s") + np.rint(seconds).astype("timedelta64[s]")
+    return [f"{value}Z" for value in np.datetime_as_string(instants, unit="s")]
+
+
+def activity_gpx(activity: Dict[str, Any], streams: Dict[str, np.ndarray]) -> Iterator[str]:
+    """
+    Write an activity as GPX, a chunk of track points at a time.
+
+    Positions and samples come from the recorded streams; an activity
+    without streams falls back to its (simplified, untimed) map polyline.
+    Streams that don't cover every position are left out.
+    """
+    start = activity.get("start_date")
+    start = datetime.fromisoformat(start) if isinstance(start, str) else start
+    latlng = streams.get("latlng")
+    if latlng is None:
+        try:
+            latlng = polyline.decode(activity.get("map_polyline") or "")
+        except ValueError:
+            latlng = np.zeros((0, 2))
+        streams = {}
+    streams = {key: values for key, values in streams.items() if len(values) == len(latlng)}
+    if start is None:
+        streams.pop("time", None)
+
+    name = escape(activity.get("name") or "")
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<gpx version="1.1" creator="{settings.PROJECT_NAME}" xmlns="http://www.topografix.com/GPX/1/1" '
+        'xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1">\n'
+        f"<metadata><name>{name}</name>"
+        + (f"<time>{start.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}</time>" if start else "")
+        + f"</metadata>\n<trk><name>{name}</name><type>{escape(activity.get('type') or '')}</type><trkseg>\n"
+    )
+
+    for first in range(0, len(latlng), GPX_POINTS_PER_CHUNK):
+        window = slice(first, first + GPX_POINTS_PER_CHUNK)
+        count = len(latlng[window])
+
+        def column(stream_type: str, template: str) -> List[str]:
+            values = streams.get(stream_type)
+            if values is None:
+                return [""] * count
+            return [template.format(value) for value in values[window].tolist()]
+
+        times = _gpx_time(start, streams["time"][window]) if "time" in streams else [""] * count
+        elevations = column("altitude", "<ele>{:.1f}</ele>")
+        extensions = zip(
+            column("temp", "<gpxtpx:atemp>{:.0f}</gpxtpx:atemp>"),
+            column("heartrate", "<gpxtpx:hr>{:.0f}</gpxtpx:hr>"),
+            column("cadence", "<gpxtpx:cad>{:.0f}</gpxtpx:cad>"),
+        )
+        watts = column("watts", "<power>{:.0f}</power>")
+        points = []
+        for (lat, lng), elevation, timestamp, extension, power in zip(
+            latlng[window].tolist(), elevations, times, extensions, watts
+        ):
+            extension = "".join(extension)
+            if extension:
+                extension = f"<gpxtpx:TrackPointExtension>{extension}</gpxtpx:TrackPointExtension>"
+            if extension or power:
+                extension = f"<extensions>{power}{extension}</extensions>"
+            timestamp = f"<time>{timestamp}</time>" if timestamp else ""
+            points.append(f'<trkpt lat="{lat:.7f}" lon="{lng:.7f}">{elevation}{timestamp}{extension}</trkpt>\n')
+        yield "".join(points)
+
+    yield "</trkseg></trk>\n</gpx>\n"
+
+
+async def _stream_blobs(activity_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    response = await supabase.table("activity_streams") \
+                             .select(",".join(("activity_id",) + GPX_STREAMS)) \
+                             .in_("activity_id", activity_ids) \
+                             .execute()
+    if response.error is not None:
+        raise ExportError(str(response.error))
+    return {row["activity_id"]: row for row in response.data}
+
+
+def _decode_streams(row: Optional[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    if row is None:
+        return {}
+    return {
+        stream_type: decode_stream(decode_bytea(row[stream_type]))
+        for stream_type in GPX_STREAMS
+        if row.get(stream_type)
+    }
+
+
+class _ZipSink(io.RawIOBase):
+    """
+    Write-only, unseekable target that hands the ZIP bytes written so far
+    to the response; ``zipfile`` then uses data descriptors instead of
+    seeking back to fill in sizes.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry(name: str, as_of: datetime) -> zipfile.ZipInfo:
+    # A fixed timestamp keeps the archive byte-for-byte reproducible, which resuming relies on
+    info = zipfile.ZipInfo(name, date_time=as_of.astimezone(timezone.utc).timetuple()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def _write_gpx(
+    archive: zipfile.ZipFile, as_of: datetime, activity: Dict[str, Any], blobs: Optional[Dict[str, Any]]
+) -> None:
+    with archive.open(_entry(f"activities/{activity['id']}.gpx", as_of), "w") as entry:
+        for chunk in activity_gpx(activity, _decode_streams(blobs)):
+            entry.write(chunk.encode("utf-8"))
+
+
+async def zip_export(user_id: str, as_of: datetime) -> AsyncIterator[bytes]:
+    """
+    A ZIP of one NDJSON file per record type plus a GPX file per activity.
+
+    Entries are compressed in a worker thread one page or activity at a
+    time, and the bytes are passed on as soon as they are written.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w") as archive:
+        for record_type, entry_name, table, model in EXPORT_TABLES:
+            with archive.open(_entry(entry_name, as_of), "w", force_zip64=True) as entry:
+                async for rows in _pages(table, _columns(model), user_id, as_of):
+                    await asyncio.to_thread(entry.write, _ndjson(record_type, rows))
+                    yield sink.drain()
+
+        async for activities in _pages("activities", "id,name,type,start_date,map_polyline,created_at",
+                                       user_id, as_of):
+            for first in range(0, len(activities), STREAM_BATCH_SIZE):
+                batch = activities[first:first + STREAM_BATCH_SIZE]
+                blobs = await _stream_blobs([activity["id"] for activity in batch])
+                for activity in batch:
+                    if activity["id"] not in blobs and not activity.get("map_polyline"):
+                        continue
+                    await asyncio.to_thread(_write_gpx, archive, as_of, activity, blobs.get(activity["id"]))
+                    yield sink.drain()
+    yield sink.drain()
+
+
+class ExportSpool:
+    """
+    Finished exports on local disk, one directory per user, so resumed
+    downloads are served from a file instead of regenerating the export
+    for every range request.
+
+    Files are named by the caller (format and ``as_of``), written under a
+    temporary name and renamed once complete, and removed ``ttl`` seconds
+    after they were written. Workers sharing the directory share the files.
+    """
+
+    def __init__(self, directory: str, ttl: int):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self._locks: Dict[Path, asyncio.Lock] = {}
+
+    def _path(self, user_id: str, name: str) -> Path:
+        if not _SAFE_ID.match(user_id):
+            raise ValueError(f"Unsafe user id for export spool: {user_id!r}")
+        return self.directory / user_id / name
+
+    def _open_fresh(self, path: Path) -> Optional[BinaryIO]:
+        try:
+            handle = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        if os.fstat(handle.fileno()).st_mtime + self.ttl < time.time():
+            handle.close()
+            return None
+        return handle
+
+    def _prune(self, directory: Path) -> None:
+        # Expired exports, and temporary files left by interrupted writes
+        deadline = time.time() - self.ttl
+        for path in directory.glob("*"):
+            try:
+                if path.stat().st_mtime < deadline:
+                    path.unlink()
+            except FileNotFoundError:
+                continue
+
+    def _create(self, path: Path) -> BinaryIO:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._prune(path.parent)
+        return tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False)
+
+    def _finish(self, handle: BinaryIO, path: Path) -> BinaryIO:
+        handle.close()
+        os.replace(handle.name, path)
+        return open(path, "rb")
+
+    async def open(self, user_id: str, name: str, stream: ExportStream) -> BinaryIO:
+        """
+        The spooled export ``name`` of the user, open for reading; it is
+        generated with ``stream`` first unless a fresh copy exists. Concurrent
+        requests for the same export on this worker wait for one copy.
+        """
+        path = self._path(user_id, name)
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        try:
+            async with lock:
+                handle = await asyncio.to_thread(self._open_fresh, path)
+                if handle is not None:
+                    return handle
+
+                temporary = await asyncio.to_thread(self._create, path)
+                try:
+                    async for chunk in stream():
+                        await asyncio.to_thread(temporary.write, chunk)
+                except BaseException:
+                    temporary.close()
+                    Path(temporary.name).unlink(missing_ok=True)
+                    raise
+                return await asyncio.to_thread(self._finish, temporary, path)
+        finally:
+            if not lock.locked():
+                self._locks.pop(path, None)
+
+
+export_spool = ExportSpool(settings.EXPORT_SPOOL_DIR, settings.EXPORT_SPOOL_TTL_SECONDS)
+
+
+async def file_range(handle: BinaryIO, start: int, end: int) -> AsyncIterator[bytes]:
+    """
+    Bytes ``start`` to ``end`` (inclusive) of an open file, which is closed afterwards.
+    """
+    try:
+        await asyncio.to_thread(handle.seek, start)
+        remaining = end + 1 - start
+        while remaining > 0:
+            chunk = await asyncio.to_thread(handle.read, min(remaining, SPOOL_READ_SIZE))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+async def leased(chunks: AsyncIterator[bytes], lease: ExportLease) -> AsyncIterator[bytes]:
+    """
+    Pass an export through, releasing its slot once it ends or is abandoned.
+    """
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        lease.release()
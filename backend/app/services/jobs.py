@@ -0,0 +1,217 @@
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db import supabase
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+ProgressReporter = Callable[[Dict[str, Any]], Awaitable[None]]
+JobHandler = Callable[[Dict[str, Any], ProgressReporter], Awaitable[Dict[str, Any]]]
+
+
+class JobError(Exception):
+    """
+    Raised when a job record can't be created or read.
+    """
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """
+    Background job runner with job state persisted in the ``jobs`` table.
+
+    Jobs are executed by a pool of asyncio worker tasks on the worker that
+    accepted them, while their status and progress live in the database so
+    any API worker can answer a status poll. At most one queued or running
+    job exists per ``(user, kind)``; enqueueing again returns the active
+    job. A running job whose heartbeat is older than ``stale_after`` (its
+    worker died) no longer blocks new ones; workers claim jobs with a
+    conditional update, so a job replaced that way never runs twice.
+
+    Jobs still queued when their worker exited are picked up again by
+    ``start``; if several workers start at once, the claim lets only one
+    of them run each job.
+    """
+
+    def __init__(self, workers: int, stale_after: float):
+        self.workers = workers
+        self.stale_after = stale_after
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def _update(self, job_id: str, **fields: Any) -> None:
+        fields["heartbeat_at"] = _now()
+        response = await supabase.table("jobs").update(fields, returning="minimal").eq("id", job_id).execute()
+        if response.error is not None:
+            logger.warning("Failed to update job %s: %s", job_id, response.error)
+
+    async def _find_active(self, kind: str, user_id: str) -> Optional[Dict[str, Any]]:
+        response = await supabase.table("jobs") \
+                                 .select("*") \
+                                 .eq("user_id", user_id) \
+                                 .eq("kind", kind) \
+                                 .in_("status", ACTIVE_STATUSES) \
+                                 .execute()
+        if response.error is not None:
+            raise JobError(str(response.error))
+        if not response.data:
+            return None
+
+        job = response.data[0]
+        # Only a running job heartbeats; a queued one may just be waiting for a free worker
+        heartbeat = datetime.fromisoformat(job["heartbeat_at"].replace("Z", "+00:00"))
+        if job["status"] == "running" and _now() - heartbeat > timedelta(seconds=self.stale_after):
+            await self._update(job["id"], status="failed", error="Job stalled", finished_at=_now())
+            return None
+        return job
+
+    async def enqueue(
+        self, kind: str, user_id: str, payload: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Queue a job unless one is already active for this user and kind.
+        Returns the job and whether it was newly created.
+        """
+        if kind not in self._handlers:
+            raise JobError(f"No handler registered for job kind '{kind}'")
+
+        existing = await self._find_active(kind, user_id)
+        if existing is not None:
+            return existing, False
+
+        response = await supabase.table("jobs") \
+                                 .insert({
+                                     "user_id": user_id,
+                                     "kind": kind,
+                                     "status": "queued",
+                                     "payload": payload or {},
+                                     "progress": {},
+                                     "heartbeat_at": _now(),
+                                 }) \
+                                 .execute()
+
+        if response.error is not None:
+            # Lost a race with a concurrent enqueue; the unique index kept one
+            existing = await self._find_active(kind, user_id)
+            if existing is not None:
+                return existing, False
+            raise JobError(str(response.error))
+
+        job = response.data[0]
+        self._queue.put_nowait(job)
+        return job, True
+
+    async def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        response = await supabase.table("jobs") \
+                                 .select("*") \
+                                 .eq("id", job_id) \
+                                 .eq("user_id", user_id) \
+                                 .execute()
+        if response.error is not None:
+            raise JobError(str(response.error))
+        return response.data[0] if response.data else None
+
+    async def _claim(self, job_id: str) -> bool:
+        """
+        Move a job from queued to running. Returns False if it was no longer
+        queued (e.g. failed as stalled and replaced), so it runs at most once.
+        """
+        now = _now()
+        response = await supabase.table("jobs") \
+                                 .update({"status": "running", "started_at": now, "heartbeat_at": now}) \
+                                 .select("id") \
+                                 .eq("id", job_id) \
+                                 .eq("status", "queued") \
+                                 .execute()
+        if response.error is not None:
+            logger.warning("Failed to claim job %s: %s", job_id, response.error)
+            return False
+        return bool(response.data)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+
+        async def report(progress: Dict[str, Any]) -> None:
+            await self._update(job_id, progress=progress)
+
+        if not await self._claim(job_id):
+            logger.info("Job %s is no longer queued, skipping", job_id)
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await self._handlers[job["kind"]](job, report)
+        except asyncio.CancelledError:
+            await self._update(job_id, status="failed", error="Interrupted", finished_at=_now())
+            raise
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            await self._update(job_id, status="failed", error=str(e), finished_at=_now())
+        else:
+            await self._update(job_id, status="succeeded", result=result, finished_at=_now())
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        # Keeps long pauses (e.g. waiting on rate limits) from looking stalled
+        while True:
+            await asyncio.sleep(self.stale_after / 3)
+            await self._update(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker error")
+            finally:
+                self._queue.task_done()
+
+    async def _recover(self) -> None:
+        """
+        Queue the jobs of registered kinds that are still waiting to run,
+        oldest first; nothing else would ever run them after a restart.
+        """
+        response = await supabase.table("jobs") \
+                                 .select("*") \
+                                 .eq("status", "queued") \
+                                 .in_("kind", list(self._handlers)) \
+                                 .order("created_at") \
+                                 .execute()
+        if response.error is not None:
+            logger.warning("Failed to load queued jobs: %s", response.error)
+            return
+        for job in response.data:
+            self._queue.put_nowait(job)
+        if response.data:
+            logger.info("Recovered %d queued jobs", len(response.data))
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            if self._handlers:
+                self._tasks.append(asyncio.create_task(self._recover()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+job_queue = JobQueue(settings.JOB_WORKERS, settings.JOB_STALE_SECONDS)
@@ -0,0 +1,148 @@
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.geometry import (
+    line_coordinates, line_metrics, line_positions, polyline_positions, project, significance,
+    with_positions,
+)
+from app.db import supabase
+from app.services.spatial import spatial_columns
+
+# Simplification tolerance in meters for each precomputed level of detail
+DETAIL_TOLERANCES = {"low": 50.0, "medium": 10.0, "high": 2.5}
+DETAIL_LEVELS = ("low", "medium", "high", "full")
+
+# Ground size of a 256px web map tile pixel at zoom 0, at the equator
+_METERS_PER_PIXEL_Z0 = 156_543.03
+
+
+def detail_for_zoom(zoom: float) -> str:
+    """
+    Pick the coarsest level whose error stays under one pixel at ``zoom``.
+    """
+    pixel = _METERS_PER_PIXEL_Z0 / 2 ** zoom
+    for level, tolerance in DETAIL_TOLERANCES.items():
+        if tolerance <= pixel:
+            return level
+    return "full"
+
+
+def build_lod(coordinates: Any) -> Optional[Dict[str, Any]]:
+    """
+    Simplified copies of a route line at every level in ``DETAIL_TOLERANCES``.
+
+    Each level keeps a subset of the original positions (elevation
+    included) in the same container shape as the input. Returns None if the
+    coordinates aren't a line.
+    """
+    positions = line_positions(coordinates)
+    if positions is None:
+        return None
+
+    scores = significance(project(positions), min(DETAIL_TOLERANCES.values()))
+    original = line_coordinates(coordinates)
+    return {
+        level: with_positions(coordinates, [original[i] for i in np.flatnonzero(scores > tolerance)])
+        for level, tolerance in DETAIL_TOLERANCES.items()
+    }
+
+
+def derive_route_columns(coordinates: Any) -> Dict[str, Any]:
+    """
+    Columns computed from a route's coordinates whenever they are written.
+
+    Distance always comes from the geometry. Elevation gain and the grade
+    histogram do too when the positions carry elevation; otherwise
+    ``elevation_gain_m`` is left out so a client-sent value is kept.
+    """
+    positions = line_positions(coordinates)
+    columns = {
+        "coordinates_lod": build_lod(coordinates),
+        "grade_histogram": None,
+        **spatial_columns(positions),
+    }
+    if positions is not None:
+        metrics = line_metrics(positions)
+        columns["distance_km"] = metrics["distance_m"] / 1000
+        if "elevation_gain_m" in metrics:
+            columns["elevation_gain_m"] = metrics["elevation_gain_m"]
+            columns["grade_histogram"] = metrics["grade_histogram"]
+    return columns
+
+
+def derive_activity_columns(map_polyline: Optional[str], has_distance: bool) -> Dict[str, Any]:
+    """
+    Columns computed from an activity's map polyline whenever it is written.
+
+    A map polyline is a simplified summary of the recorded track, so its
+    length is only used when the activity has no distance of its own.
+    """
+    positions = polyline_positions(map_polyline)
+    columns = spatial_columns(positions)
+    if positions is not None and not has_distance:
+        columns["distance_km"] = line_metrics(positions)["distance_m"] / 1000
+    return columns
+
+
+async def _run_sized(size: int, function: Callable[..., Dict[str, Any]], *args: Any) -> Dict[str, Any]:
+    # Small lines are cheaper to process inline than to hand to a thread
+    if size > settings.GEOMETRY_OFFLOAD_POINTS:
+        return await asyncio.to_thread(function, *args)
+    return function(*args)
+
+
+async def compute_route_columns(coordinates: Any) -> Dict[str, Any]:
+    """
+    ``derive_route_columns`` run off the event loop for large routes.
+    """
+    return await _run_sized(len(line_coordinates(coordinates) or ()), derive_route_columns, coordinates)
+
+
+async def compute_activity_columns(map_polyline: Optional[str], has_distance: bool) -> Dict[str, Any]:
+    """
+    ``derive_activity_columns`` run off the event loop for long polylines.
+    """
+    # Each point takes at least two characters
+    size = len(map_polyline or "") // 2
+    return await _run_sized(size, derive_activity_columns, map_polyline, has_distance)
+
+
+def route_select(columns: List[str], detail: str) -> str:
+    """
+    Build a ``routes_data`` select that reads ``coordinates`` at ``detail``.
+
+    Lower levels are read straight out of ``coordinates_lod`` with a JSON
+    path, so only the chosen level leaves the database.
+    """
+    if detail == "full":
+        return ",".join(columns)
+    return ",".join(
+        f"coordinates:coordinates_lod->{detail}" if column == "coordinates" else column
+        for column in columns
+    )
+
+
+async def fill_missing_coordinates(rows: List[Dict[str, Any]]) -> None:
+    """
+    Fall back to full coordinates for rows written before LOD existed.
+    """
+    missing = [row["id"] for row in rows if "coordinates" in row and row["coordinates"] is None]
+    if not missing:
+        return
+
+    response = await supabase.table("routes_data") \
+                             .select("id,coordinates") \
+                             .in_("id", missing) \
+                             .execute()
+
+    if response.error is not None:
+        return
+
+    full = {row["id"]: row["coordinates"] for row in response.data}
+    for row in rows:
+        if row.get("id") in full and row.get("coordinates") is None:
+            row["coordinates"] = full[row["id"]]
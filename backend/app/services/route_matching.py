@@ -0,0 +1,205 @@
+
+import asyncio
+import logging
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.geometry import (
+    EARTH_RADIUS_M, hausdorff_to_lines, line_positions, polyline_positions, project, significance,
+)
+from app.db import supabase
+from app.services.jobs import JobError, ProgressReporter, job_queue
+from app.services.spatial import SpatialQueryError, spatial_index
+
+logger = logging.getLogger(__name__)
+
+ROUTE_MATCH_JOB_KIND = "route_match"
+
+# Routes are compared at this level of detail (see route_geometry.DETAIL_TOLERANCES)
+MATCH_DETAIL = "medium"
+MATCH_SIMPLIFY_TOLERANCE_M = 10.0
+MAX_CANDIDATES = 200
+
+BOX_COLUMNS = ("bbox_min_lng", "bbox_min_lat", "bbox_max_lng", "bbox_max_lat")
+
+
+class RouteMatchError(Exception):
+    """
+    Raised when candidate routes can't be loaded.
+    """
+
+
+def box_margin(lat: float, meters: float) -> Tuple[float, float]:
+    """
+    ``meters`` as degrees of longitude and latitude around ``lat``.
+    """
+    dlat = math.degrees(meters / EARTH_RADIUS_M)
+    return dlat / max(math.cos(math.radians(lat)), 1e-6), dlat
+
+
+def similar_boxes(bbox: Sequence[float], boxes: np.ndarray, margin: Tuple[float, float]) -> np.ndarray:
+    """
+    Mask of the ``(n, 4)`` ``boxes`` whose every edge is within ``margin``
+    of the matching edge of ``bbox``.
+
+    A route within the match threshold of a track everywhere has a bounding
+    box within the threshold of the track's, so this discards most of a
+    route library with four comparisons per route.
+    """
+    tolerance = np.array([margin[0], margin[1], margin[0], margin[1]])
+    return (np.abs(boxes - np.asarray(bbox)) <= tolerance).all(axis=1)
+
+
+def rank_routes(
+    track: np.ndarray, routes: List[np.ndarray], threshold: float
+) -> List[Tuple[int, float]]:
+    """
+    Score ``[lng, lat]`` ``routes`` against a ``[lng, lat]`` track.
+
+    Both sides are simplified and compared by symmetric Hausdorff distance
+    in one vectorized pass over every route. Returns ``(index, distance)``
+    for routes within ``threshold`` meters, best first.
+    """
+    if not routes or len(track) < 2:
+        return []
+
+    origin_lat = float(np.mean(track[:, 1]))
+    planar_track = project(track, origin_lat)
+    keep = significance(planar_track, MATCH_SIMPLIFY_TOLERANCE_M) > MATCH_SIMPLIFY_TOLERANCE_M
+    planar_track = planar_track[keep]
+
+    planar_routes = []
+    for route in routes:
+        planar = project(route, origin_lat)
+        if len(planar) == 1:
+            planar = np.repeat(planar, 2, axis=0)
+        planar_routes.append(planar)
+    offsets = np.concatenate(([0], np.cumsum([len(route) for route in planar_routes])))
+    distances = hausdorff_to_lines(planar_track, np.concatenate(planar_routes), offsets)
+
+    order = np.argsort(distances, kind="stable")
+    return [(int(i), float(distances[i])) for i in order if distances[i] <= threshold]
+
+
+async def _candidate_routes(
+    user_id: str, bbox: Sequence[float], threshold: float
+) -> List[Tuple[str, np.ndarray]]:
+    margin = box_margin((bbox[1] + bbox[3]) / 2, threshold)
+    search = (bbox[0] - margin[0], bbox[1] - margin[1], bbox[2] + margin[0], bbox[3] + margin[1])
+    try:
+        rows = await spatial_index.within(
+            "routes_data", user_id, search, ",".join(("id",) + BOX_COLUMNS), limit=10_000
+        )
+    except SpatialQueryError as e:
+        raise RouteMatchError(str(e))
+    if not rows:
+        return []
+
+    boxes = np.array([[row[column] for column in BOX_COLUMNS] for row in rows], dtype=np.float64)
+    close = np.flatnonzero(similar_boxes(bbox, boxes, margin))
+    if not len(close):
+        return []
+    # Closest boxes first, in case a user has an unusual number of near-identical routes
+    close = close[np.argsort(np.abs(boxes[close] - np.asarray(bbox)).max(axis=1))][:MAX_CANDIDATES]
+
+    response = await supabase.table("routes_data") \
+                             .select(f"id,coordinates,lod:coordinates_lod->{MATCH_DETAIL}") \
+                             .in_("id", [rows[i]["id"] for i in close]) \
+                             .execute()
+    if response.error is not None:
+        raise RouteMatchError(str(response.error))
+
+    candidates = []
+    for row in response.data:
+        # Routes written before LOD existed only have full coordinates
+        positions = line_positions(row["lod"] if row["lod"] is not None else row["coordinates"])
+        if positions is not None:
+            candidates.append((row["id"], positions))
+    return candidates
+
+
+async def match_route(user_id: str, track: Optional[np.ndarray]) -> Optional[str]:
+    """
+    Return the id of the user's route that a ``[lng, lat]`` track follows,
+    or None if no route is within ``ROUTE_MATCH_THRESHOLD_M`` everywhere.
+    Candidates are ranked in a worker thread.
+    """
+    if track is None or len(track) < 2:
+        return None
+
+    threshold = settings.ROUTE_MATCH_THRESHOLD_M
+    bbox = (*track[:, :2].min(axis=0), *track[:, :2].max(axis=0))
+    candidates = await _candidate_routes(user_id, [float(v) for v in bbox], threshold)
+    if not candidates:
+        return None
+    ranked = await asyncio.to_thread(
+        rank_routes, track[:, :2], [positions for _, positions in candidates], threshold
+    )
+    return candidates[ranked[0][0]][0] if ranked else None
+
+
+async def match_pending_activities(
+    user_id: str, report: Optional[ProgressReporter] = None, batch_size: int = 100
+) -> Dict[str, int]:
+    """
+    Try to match every activity of the user not yet considered by the matcher.
+
+    Activities that already have a route are only marked as considered, so a
+    route picked by hand is never replaced.
+    """
+    stats = {"activities_processed": 0, "activities_matched": 0}
+    while True:
+        response = await supabase.table("activities") \
+                                 .select("id,route_id,map_polyline") \
+                                 .eq("user_id", user_id) \
+                                 .is_("route_matched_at", None) \
+                                 .limit(batch_size) \
+                                 .execute()
+        if response.error is not None:
+            raise RouteMatchError(str(response.error))
+        if not response.data:
+            return stats
+
+        for activity in response.data:
+            update: Dict[str, Any] = {"route_matched_at": datetime.now(timezone.utc)}
+            if activity["route_id"] is None:
+                route_id = await match_route(user_id, polyline_positions(activity["map_polyline"]))
+                if route_id is not None:
+                    update["route_id"] = route_id
+                    stats["activities_matched"] += 1
+
+            result = await supabase.table("activities") \
+                                   .update(update, returning="minimal") \
+                                   .eq("id", activity["id"]) \
+                                   .execute()
+            if result.error is not None:
+                raise RouteMatchError(str(result.error))
+            stats["activities_processed"] += 1
+
+        if report is not None:
+            await report(dict(stats))
+
+
+async def schedule_route_matching(user_id: str) -> None:
+    """
+    Queue a matching pass for the user's new activities (deduplicated).
+    Failing to queue is logged rather than failing the caller's import.
+    """
+    try:
+        await job_queue.enqueue(ROUTE_MATCH_JOB_KIND, user_id)
+    except JobError as e:
+        logger.warning("Failed to queue route matching for %s: %s", user_id, e)
+
+
+async def run_route_match_job(job: Dict[str, Any], report: ProgressReporter) -> Dict[str, int]:
+    """
+    Job handler matching a user's newly imported activities to routes.
+    """
+    return await match_pending_activities(job["user_id"], report)
+
+
+job_queue.register(ROUTE_MATCH_JOB_KIND, run_route_match_job)
@@ -0,0 +1,214 @@
+
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core import geohash
+from app.core.config import settings
+from app.core.geometry import EARTH_RADIUS_M, polyline_positions
+from app.db import supabase
+
+BBox = geohash.BBox
+
+SPATIAL_COLUMNS = (
+    "bbox_min_lng", "bbox_min_lat", "bbox_max_lng", "bbox_max_lat",
+    "start_lng", "start_lat", "bbox_geohash", "start_geohash",
+)
+
+
+class SpatialQueryError(Exception):
+    """
+    Raised when a spatial query is rejected by the database.
+    """
+
+
+def spatial_columns(lnglat: Optional[np.ndarray]) -> Dict[str, Any]:
+    """
+    Bounding box, start point and their geohash keys for a ``[lng, lat]`` line.
+    All columns are None for an empty or missing line.
+    """
+    if lnglat is None or not len(lnglat):
+        return dict.fromkeys(SPATIAL_COLUMNS)
+
+    min_lng, min_lat = (float(v) for v in lnglat[:, :2].min(axis=0))
+    max_lng, max_lat = (float(v) for v in lnglat[:, :2].max(axis=0))
+    start_lng, start_lat = float(lnglat[0, 0]), float(lnglat[0, 1])
+    return {
+        "bbox_min_lng": min_lng,
+        "bbox_min_lat": min_lat,
+        "bbox_max_lng": max_lng,
+        "bbox_max_lat": max_lat,
+        "start_lng": start_lng,
+        "start_lat": start_lat,
+        "bbox_geohash": geohash.cover_cell((min_lng, min_lat, max_lng, max_lat)),
+        "start_geohash": geohash.encode(start_lat, start_lng),
+    }
+
+
+def polyline_spatial_columns(value: Optional[str]) -> Dict[str, Any]:
+    """
+    ``spatial_columns`` for an encoded (lat/lng) polyline; empty columns if
+    it can't be decoded.
+    """
+    return spatial_columns(polyline_positions(value))
+
+
+def parse_bbox(value: str) -> BBox:
+    """
+    Parse ``min_lng,min_lat,max_lng,max_lat``; raises ValueError when invalid.
+    """
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat")
+    if not (-180 <= min_lng <= max_lng <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat within lng/lat bounds")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def haversine_m(lng: float, lat: float, lngs: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    lng, lat, lngs, lats = map(np.radians, (lng, lat, lngs, lats))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def radius_bbox(lng: float, lat: float, radius_m: float) -> BBox:
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return max(lng - dlng, -180.0), max(lat - dlat, -90.0), min(lng + dlng, 180.0), min(lat + dlat, 90.0)
+
+
+def _with_distances(
+    rows: List[Dict[str, Any]], lng: float, lat: float, radius_m: float, limit: int
+) -> List[Dict[str, Any]]:
+    if not rows:
+        return []
+    distances = haversine_m(
+        lng, lat,
+        np.array([row["start_lng"] for row in rows], dtype=np.float64),
+        np.array([row["start_lat"] for row in rows], dtype=np.float64),
+    )
+    order = [i for i in np.argsort(distances, kind="stable") if distances[i] <= radius_m][:limit]
+    return [{**rows[i], "distance_m": float(distances[i])} for i in order]
+
+
+class SpatialIndex:
+    """
+    Viewport and near-point lookups over a table carrying ``SPATIAL_COLUMNS``.
+    """
+
+    async def within(
+        self, table: str, user_id: str, bbox: BBox, columns: str, limit: int
+    ) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def near(
+        self, table: str, user_id: str, lng: float, lat: float, radius_m: float,
+        columns: str, limit: int,
+    ) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class GeohashSpatialIndex(SpatialIndex):
+    """
+    Spatial lookups on plain B-tree indexes over geohash keys.
+
+    Each row stores the geohash of its start point and the smallest geohash
+    cell containing its bounding box. A viewport is covered by a handful of
+    cells; a row can only intersect it if its box cell is an ancestor of one
+    of those cells (an equality match on a few prefixes) or lies inside one
+    (a prefix range scan). Near-point queries range-scan the start geohash
+    over the cells covering the search circle. Every branch is an index seek,
+    so cost grows with the rows returned, not the table size; candidates are
+    then filtered exactly.
+    """
+
+    @staticmethod
+    def _prefix_filter(column: str, cells: List[str], ancestors: bool) -> str:
+        if "" in cells:
+            # The search covers the whole world
+            return f"{column}.not.is.null"
+        clauses = [f"{column}.like.{cell}*" for cell in cells if cell]
+        if ancestors:
+            prefixes = {cell[:length] for cell in cells for length in range(len(cell) + 1)}
+            rendered = ",".join(f'"{prefix}"' if not prefix else prefix for prefix in sorted(prefixes))
+            clauses.append(f"{column}.in.({rendered})")
+        return ",".join(clauses) if clauses else f"{column}.not.is.null"
+
+    async def within(self, table, user_id, bbox, columns, limit):
+        cells = geohash.cells_covering(bbox)
+        response = await supabase.table(table) \
+                                 .select(columns) \
+                                 .eq("user_id", user_id) \
+                                 .or_(self._prefix_filter("bbox_geohash", cells, ancestors=True)) \
+                                 .lte("bbox_min_lng", bbox[2]) \
+                                 .gte("bbox_max_lng", bbox[0]) \
+                                 .lte("bbox_min_lat", bbox[3]) \
+                                 .gte("bbox_max_lat", bbox[1]) \
+                                 .limit(limit) \
+                                 .execute()
+
+        if response.error is not None:
+            raise SpatialQueryError(str(response.error))
+        return response.data
+
+    async def near(self, table, user_id, lng, lat, radius_m, columns, limit):
+        cells = geohash.cells_covering(radius_bbox(lng, lat, radius_m), max_cells=16)
+        response = await supabase.table(table) \
+                                 .select(columns) \
+                                 .eq("user_id", user_id) \
+                                 .or_(self._prefix_filter("start_geohash", cells, ancestors=False)) \
+                                 .execute()
+
+        if response.error is not None:
+            raise SpatialQueryError(str(response.error))
+        return _with_distances(response.data, lng, lat, radius_m, limit)
+
+
+class PostGISSpatialIndex(SpatialIndex):
+    """
+    Spatial lookups through PostGIS GiST indexes, via the ``<table>_within``
+    and ``<table>_near`` functions in ``supabase/spatial/postgis.sql``.
+    """
+
+    async def within(self, table, user_id, bbox, columns, limit):
+        response = await supabase.rpc(f"{table}_within", {
+            "p_user_id": user_id,
+            "p_min_lng": bbox[0],
+            "p_min_lat": bbox[1],
+            "p_max_lng": bbox[2],
+            "p_max_lat": bbox[3],
+            "p_limit": limit,
+        }).select(columns).execute()
+
+        if response.error is not None:
+            raise SpatialQueryError(str(response.error))
+        return response.data
+
+    async def near(self, table, user_id, lng, lat, radius_m, columns, limit):
+        response = await supabase.rpc(f"{table}_near", {
+            "p_user_id": user_id,
+            "p_lng": lng,
+            "p_lat": lat,
+            "p_radius_m": radius_m,
+            "p_limit": limit,
+        }).select(columns).execute()
+
+        if response.error is not None:
+            raise SpatialQueryError(str(response.error))
+        return _with_distances(response.data, lng, lat, radius_m, limit)
+
+
+def create_spatial_index(backend: str) -> SpatialIndex:
+    """
+    Return the spatial index for ``backend`` (``"geohash"`` or ``"postgis"``).
+    """
+    if backend == "postgis":
+        return PostGISSpatialIndex()
+    if backend == "geohash":
+        return GeohashSpatialIndex()
+    raise RuntimeError(f"Unknown SPATIAL_BACKEND '{backend}'")
+
+
+spatial_index = create_spatial_index(settings.SPATIAL_BACKEND)
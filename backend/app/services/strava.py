@@ -0,0 +1,345 @@
+
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.db import supabase
+from app.services.activity_tiles import invalidate_activity_tiles
+from app.services.jobs import ProgressReporter, job_queue
+from app.services.route_matching import schedule_route_matching
+from app.services.spatial import polyline_spatial_columns
+from app.services.strava_ratelimit import (
+    BACKFILL, INTERACTIVE, StravaRateLimiter, rate_limiter,
+)
+from app.services.strava_tokens import StravaTokenManager
+
+SYNC_JOB_KIND = "strava_sync"
+
+PageCallback = Callable[[int, int], Awaitable[None]]
+
+
+class StravaError(Exception):
+    """
+    Raised when Strava or the database rejects part of a sync.
+    """
+
+
+class StravaClient:
+    """
+    Async client for the Strava REST API sharing one pooled connection set.
+
+    Every call waits for a slot from the app-wide rate limiter. A 429 marks
+    the exhausted window full, so the retry waits for it to reset; after
+    ``max_retries`` a ``StravaError`` is raised.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        limiter: StravaRateLimiter,
+        timeout: float = 30.0,
+        max_retries: int = settings.STRAVA_RATE_LIMIT_RETRIES,
+    ):
+        self.base_url = base_url
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+        return self._http
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        access_token: Optional[str] = None,
+        priority: int = INTERACTIVE,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        headers = kwargs.pop("headers", {})
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+        read = method.upper() == "GET"
+        for _ in range(self.max_retries + 1):
+            await self.limiter.acquire(priority, read)
+            response = await self._get_http().request(method, url, headers=headers, **kwargs)
+            await self.limiter.observe(response.headers, response.status_code, read)
+            if response.status_code != 429:
+                response.raise_for_status()
+                return response
+        raise StravaError(f"Strava rate limit still exceeded after {self.max_retries} retries")
+
+    async def get_athlete_activities(
+        self,
+        access_token: str,
+        after: Optional[int],
+        page: int,
+        per_page: int,
+        priority: int = INTERACTIVE,
+        before: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        params = {"page": page, "per_page": per_page}
+        if after is not None:
+            params["after"] = after
+        if before is not None:
+            params["before"] = before
+        response = await self.request(
+            "GET", "/athlete/activities", access_token=access_token, priority=priority, params=params
+        )
+        return response.json()
+
+    async def get_activity(
+        self, access_token: str, activity_id: int, priority: int = INTERACTIVE
+    ) -> Dict[str, Any]:
+        response = await self.request(
+            "GET", f"/activities/{activity_id}", access_token=access_token, priority=priority
+        )
+        return response.json()
+
+    async def get_athlete(self, access_token: str, priority: int = INTERACTIVE) -> Dict[str, Any]:
+        response = await self.request("GET", "/athlete", access_token=access_token, priority=priority)
+        return response.json()
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+strava_client = StravaClient(settings.STRAVA_API_BASE, rate_limiter)
+token_manager = StravaTokenManager(
+    strava_client,
+    settings.STRAVA_TOKEN_URL,
+    settings.STRAVA_CLIENT_ID,
+    settings.STRAVA_CLIENT_SECRET,
+    refresh_margin=settings.STRAVA_TOKEN_REFRESH_MARGIN_SECONDS,
+)
+
+
+async def get_connection(user_id: str) -> Dict[str, Any]:
+    """
+    Return the user's Strava connection row.
+    """
+    response = await supabase.table("user_connections") \
+                             .select("*") \
+                             .eq("user_id", user_id) \
+                             .eq("provider", "strava") \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+    if not response.data:
+        raise StravaError("No Strava connection found for user")
+
+    return response.data[0]
+
+
+def to_activity_row(strava_activity: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    """
+    Convert a Strava SummaryActivity into an ``activities`` row.
+
+    Every row has the same keys so a batch can be sent as one multi-row insert.
+    Spatial columns are derived from the summary polyline.
+    """
+    def scaled(key: str, factor: float) -> Optional[float]:
+        value = strava_activity.get(key)
+        return value * factor if value is not None else None
+
+    map_polyline = (strava_activity.get("map") or {}).get("summary_polyline")
+    return {
+        "user_id": user_id,
+        "strava_activity_id": strava_activity["id"],
+        "upload_id": strava_activity.get("upload_id"),
+        "external_id": strava_activity.get("external_id"),
+        "name": strava_activity.get("name") or "Strava activity",
+        "type": strava_activity.get("sport_type") or strava_activity.get("type"),
+        "start_date": strava_activity["start_date"],
+        "distance_km": scaled("distance", 1 / 1000),  # meters to km
+        "elevation_gain_m": strava_activity.get("total_elevation_gain"),
+        "moving_time_seconds": strava_activity.get("moving_time"),
+        "elapsed_time_seconds": strava_activity.get("elapsed_time"),
+        "average_speed_kph": scaled("average_speed", 3.6),  # m/s to km/h
+        "max_speed_kph": scaled("max_speed", 3.6),
+        "average_cadence_rpm": strava_activity.get("average_cadence"),
+        "average_watts": strava_activity.get("average_watts"),
+        "average_heartrate_bpm": strava_activity.get("average_heartrate"),
+        "max_heartrate_bpm": strava_activity.get("max_heartrate"),
+        "map_polyline": map_polyline,
+        "kudos_count": strava_activity.get("kudos_count"),
+        "comment_count": strava_activity.get("comment_count"),
+        "athlete_count": strava_activity.get("athlete_count"),
+        "private": strava_activity.get("private"),
+        "trainer": strava_activity.get("trainer"),
+        "commute": strava_activity.get("commute"),
+        **polyline_spatial_columns(map_polyline),
+    }
+
+
+async def latest_synced_start(user_id: str) -> Optional[datetime]:
+    """
+    Return the start date of the user's newest imported Strava activity.
+    """
+    response = await supabase.table("activities") \
+                             .select("start_date") \
+                             .eq("user_id", user_id) \
+                             .gt("strava_activity_id", 0) \
+                             .order("start_date", desc=True) \
+                             .limit(1) \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+    if not response.data:
+        return None
+    return datetime.fromisoformat(response.data[0]["start_date"].replace("Z", "+00:00"))
+
+
+async def fetch_athlete_activities(
+    access_token: str,
+    after: Optional[int],
+    per_page: int = settings.STRAVA_PAGE_SIZE,
+    concurrency: int = settings.STRAVA_SYNC_CONCURRENCY,
+    on_pages: Optional[PageCallback] = None,
+    priority: int = INTERACTIVE,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Fetch every activity after ``after`` (epoch seconds), page by page.
+
+    Strava doesn't report a total, so pages are requested in waves that
+    start at one page and double up to ``concurrency`` while pages keep
+    coming back full. A short page ends the walk. Incremental syncs with a
+    handful of new rides cost a single request.
+
+    ``on_pages`` is awaited after each wave with the pages and activities
+    fetched so far. Returns the activities and the number of pages requested.
+    """
+    activities: List[Dict[str, Any]] = []
+    page = 1
+    wave = 1
+    pages_fetched = 0
+
+    while True:
+        results = await asyncio.gather(*(
+            strava_client.get_athlete_activities(
+                access_token, after, page + offset, per_page, priority=priority
+            )
+            for offset in range(wave)
+        ))
+        pages_fetched += wave
+        for result in results:
+            activities.extend(result)
+        if on_pages is not None:
+            await on_pages(pages_fetched, len(activities))
+        if any(len(result) < per_page for result in results):
+            return activities, pages_fetched
+        page += wave
+        wave = min(wave * 2, concurrency)
+
+
+async def store_activities(rows: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+    """
+    Store activities keyed on ``strava_activity_id``, updating ones already
+    imported.
+
+    Each chunk is one multi-row upsert that merges duplicates. Rows only
+    carry the columns ``to_activity_row`` derives from Strava, so edits made
+    on Strava (name, type, track, ...) reach stored activities while local
+    columns such as the matched route are left alone. The chunk's stored
+    activities are read first, so tiles drawn with a track or type that
+    changed are invalidated along with the new ones. Returns the number of
+    new rows written.
+    """
+    stored = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        previous = await supabase.table("activities") \
+                                 .select("strava_activity_id,map_polyline,type") \
+                                 .in_("strava_activity_id", [row["strava_activity_id"] for row in chunk]) \
+                                 .execute()
+
+        if previous.error is not None:
+            raise StravaError(str(previous.error))
+
+        previous_rows = {old["strava_activity_id"]: old for old in previous.data}
+        response = await supabase.table("activities") \
+                                 .upsert(chunk, on_conflict="strava_activity_id") \
+                                 .select("user_id,strava_activity_id,map_polyline,type") \
+                                 .execute()
+
+        if response.error is not None:
+            raise StravaError(str(response.error))
+
+        stale: Dict[str, List[Optional[str]]] = defaultdict(list)
+        for row in response.data:
+            old = previous_rows.get(row["strava_activity_id"])
+            if old is None:
+                stored += 1
+                stale[row["user_id"]].append(row["map_polyline"])
+            elif (old["map_polyline"], old["type"]) != (row["map_polyline"], row["type"]):
+                # Tiles drawn with the old track or type have to go too
+                stale[row["user_id"]].extend((old["map_polyline"], row["map_polyline"]))
+        for user_id, polylines in stale.items():
+            await invalidate_activity_tiles(user_id, polylines)
+    return stored
+
+
+async def sync_activities(
+    user_id: str, access_token: str, report: Optional[ProgressReporter] = None
+) -> Dict[str, int]:
+    """
+    Import the user's Strava activities newer than the last synced one.
+
+    The first sync for a user covers ``STRAVA_INITIAL_SYNC_DAYS`` and runs at
+    backfill priority, so it can't starve incremental syncs of API quota.
+    """
+    latest = await latest_synced_start(user_id)
+    priority = INTERACTIVE
+    if latest is None:
+        latest = datetime.now(timezone.utc) - timedelta(days=settings.STRAVA_INITIAL_SYNC_DAYS)
+        priority = BACKFILL
+
+    async def on_pages(pages_fetched: int, activities_fetched: int) -> None:
+        if report is not None:
+            await report({
+                "pages_fetched": pages_fetched,
+                "activities_fetched": activities_fetched,
+                "activities_stored": 0,
+            })
+
+    activities, pages_fetched = await fetch_athlete_activities(
+        access_token, int(latest.timestamp()), on_pages=on_pages, priority=priority
+    )
+    rows = [to_activity_row(activity, user_id) for activity in activities]
+    activities_stored = await store_activities(rows)
+    if activities_stored:
+        await schedule_route_matching(user_id)
+
+    stats = {
+        "pages_fetched": pages_fetched,
+        "activities_fetched": len(activities),
+        "activities_stored": activities_stored,
+    }
+    if report is not None:
+        await report(stats)
+    return stats
+
+
+async def run_sync_job(job: Dict[str, Any], report: ProgressReporter) -> Dict[str, int]:
+    """
+    Job handler for ``POST /strava/sync``: refresh the token, fetch and store.
+    """
+    connection = await get_connection(job["user_id"])
+    access_token = await token_manager.get_access_token(connection)
+    return await sync_activities(job["user_id"], access_token, report)
+
+
+job_queue.register(SYNC_JOB_KIND, run_sync_job)
@@ -0,0 +1,120 @@
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.db import supabase
+from app.services.jobs import ProgressReporter, job_queue
+from app.services.route_matching import schedule_route_matching
+from app.services.strava import (
+    StravaError, get_connection, store_activities, strava_client, to_activity_row, token_manager,
+)
+from app.services.strava_ratelimit import BACKFILL
+
+BACKFILL_JOB_KIND = "strava_backfill"
+
+
+def _epoch(value: str) -> int:
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+async def get_checkpoint(user_id: str) -> Optional[Dict[str, Any]]:
+    response = await supabase.table("strava_backfills") \
+                             .select("*") \
+                             .eq("user_id", user_id) \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+    return response.data[0] if response.data else None
+
+
+async def save_checkpoint(user_id: str, checkpoint: Dict[str, Any]) -> None:
+    response = await supabase.table("strava_backfills") \
+                             .upsert(
+                                 {**checkpoint, "user_id": user_id, "updated_at": datetime.now(timezone.utc)},
+                                 on_conflict="user_id",
+                                 returning="minimal",
+                             ) \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+
+async def backfill_activities(
+    connection: Dict[str, Any],
+    report: Optional[ProgressReporter] = None,
+    per_page: int = settings.STRAVA_PAGE_SIZE,
+    batch_size: int = settings.STRAVA_BACKFILL_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """
+    Import the user's whole Strava history, newest to oldest.
+
+    History is walked with Strava's ``before`` cursor rather than page
+    numbers, so activities recorded mid-walk can't shift the pages. Rows
+    are buffered and written ``batch_size`` at a time; after each write the
+    cursor and running totals are saved to ``strava_backfills``. A run that
+    crashes or is interrupted resumes from the last checkpoint and re-fetches
+    at most the pages of one unwritten batch. Calls run at backfill
+    priority, so they pause for the rate limiter rather than fail; the token
+    is looked up per page since a long pause can outlast it.
+    """
+    user_id = connection["user_id"]
+    checkpoint = await get_checkpoint(user_id) or {}
+    state = {
+        "before": checkpoint.get("before"),
+        "pages_fetched": checkpoint.get("pages_fetched") or 0,
+        "activities_fetched": checkpoint.get("activities_fetched") or 0,
+        "activities_stored": checkpoint.get("activities_stored") or 0,
+        "completed_at": checkpoint.get("completed_at"),
+    }
+    if state["completed_at"] is not None:
+        return state
+
+    before = _epoch(state["before"]) if state["before"] else None
+    buffer: List[Dict[str, Any]] = []
+
+    async def flush(cursor: Optional[int], completed: bool) -> None:
+        stored = await store_activities(buffer, chunk_size=batch_size)
+        buffer.clear()
+        if stored:
+            state["activities_stored"] += stored
+            await schedule_route_matching(user_id)
+        if cursor is not None:
+            state["before"] = datetime.fromtimestamp(cursor, tz=timezone.utc).isoformat()
+        if completed:
+            state["completed_at"] = datetime.now(timezone.utc).isoformat()
+        await save_checkpoint(user_id, state)
+
+    while True:
+        access_token = await token_manager.get_access_token(connection)
+        activities = await strava_client.get_athlete_activities(
+            access_token, None, 1, per_page, priority=BACKFILL, before=before
+        )
+        state["pages_fetched"] += 1
+        state["activities_fetched"] += len(activities)
+        buffer.extend(to_activity_row(activity, user_id) for activity in activities)
+        if activities:
+            before = min(_epoch(activity["start_date"]) for activity in activities)
+
+        if len(activities) < per_page:
+            await flush(before, completed=True)
+        elif len(buffer) >= batch_size:
+            await flush(before, completed=False)
+        if report is not None:
+            await report(dict(state))
+        if state["completed_at"] is not None:
+            return state
+
+
+async def run_backfill_job(job: Dict[str, Any], report: ProgressReporter) -> Dict[str, Any]:
+    """
+    Job handler for ``POST /strava/backfill``.
+    """
+    connection = await get_connection(job["user_id"])
+    return await backfill_activities(connection, report)
+
+
+job_queue.register(BACKFILL_JOB_KIND, run_backfill_job)
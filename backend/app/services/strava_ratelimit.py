@@ -0,0 +1,177 @@
+
+import asyncio
+import time
+from typing import List, Mapping, Optional, Tuple
+
+from app.core.cache import CacheBackend, cache_backend
+from app.core.config import settings
+
+INTERACTIVE = 0
+BACKFILL = 1
+
+SHORT_WINDOW_SECONDS = 15 * 60
+DAILY_WINDOW_SECONDS = 24 * 60 * 60
+
+
+def parse_rate_limit_header(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    Parse a Strava ``"<15-minute>,<daily>"`` rate limit header.
+    """
+    if not value:
+        return None
+    try:
+        short, daily = (int(part) for part in value.split(","))
+    except ValueError:
+        return None
+    return short, daily
+
+
+class StravaRateLimiter:
+    """
+    App-wide budget for Strava API calls, shared across workers through the
+    cache backend.
+
+    Strava counts requests in 15-minute windows starting on the quarter hour
+    and in daily windows starting at midnight UTC, once overall and once
+    more for reads (GETs), which have lower limits. Each call reserves a
+    slot in every window it counts against before it is sent, so bursts
+    from many users queue here instead of running into 429s. Counters are
+    reconciled with the ``X-RateLimit-*`` and ``X-ReadRateLimit-*`` headers
+    on every response, which also accounts for calls made by workers using
+    another backend; a 429 marks the exhausted window as full.
+
+    Backfill calls may only use ``backfill_share`` of each window; the rest
+    is held back for interactive calls, which are also woken first when a
+    window resets.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        short_limit: int,
+        daily_limit: int,
+        backfill_share: float,
+        read_short_limit: Optional[int] = None,
+        read_daily_limit: Optional[int] = None,
+    ):
+        self.backend = backend
+        self.limits = {
+            "overall": (short_limit, daily_limit),
+            "read": (read_short_limit or short_limit, read_daily_limit or daily_limit),
+        }
+        self.backfill_share = backfill_share
+        self._interactive_waiting = 0
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+
+    @staticmethod
+    def _scopes(read: bool) -> Tuple[str, ...]:
+        return ("overall", "read") if read else ("overall",)
+
+    @staticmethod
+    def _windows(now: float, scope: str = "overall") -> List[Tuple[str, float]]:
+        """
+        Return the counter key and end time of the current short and daily windows.
+        """
+        windows = []
+        for name, length in (("short", SHORT_WINDOW_SECONDS), ("daily", DAILY_WINDOW_SECONDS)):
+            start = int(now // length * length)
+            windows.append((f"strava:ratelimit:{scope}:{name}:{start}", start + length))
+        return windows
+
+    def _caps(self, priority: int, scope: str = "overall") -> Tuple[int, int]:
+        if priority == INTERACTIVE:
+            return self.limits[scope]
+        return tuple(max(1, int(limit * self.backfill_share)) for limit in self.limits[scope])
+
+    async def _reserve(self, priority: int, read: bool = False) -> Optional[float]:
+        """
+        Try to take one slot in every window. Returns None on success or the
+        time at which the blocking window resets.
+        """
+        now = time.time()
+        taken = []
+        for scope in self._scopes(read):
+            for (key, ends_at), cap in zip(self._windows(now, scope), self._caps(priority, scope)):
+                count = await self.backend.incr(key, 1, ends_at - now + 60)
+                taken.append((key, ends_at))
+                if count > cap:
+                    for taken_key, taken_ends_at in taken:
+                        await self.backend.incr(taken_key, -1, taken_ends_at - now + 60)
+                    return ends_at
+        return None
+
+    async def acquire(self, priority: int = INTERACTIVE, read: bool = False) -> None:
+        """
+        Wait until a call of the given priority fits in the budget.
+        """
+        if priority == INTERACTIVE:
+            self._interactive_waiting += 1
+            self._interactive_idle.clear()
+        try:
+            while True:
+                if priority != INTERACTIVE:
+                    await self._interactive_idle.wait()
+                reset_at = await self._reserve(priority, read)
+                if reset_at is None:
+                    return
+                delay = max(reset_at - time.time(), 0.0)
+                if priority != INTERACTIVE:
+                    # Let interactive callers claim the fresh window first
+                    delay += 1.0
+                await asyncio.sleep(delay)
+        finally:
+            if priority == INTERACTIVE:
+                self._interactive_waiting -= 1
+                if self._interactive_waiting == 0:
+                    self._interactive_idle.set()
+
+    async def _raise_to(self, key: str, ends_at: float, now: float, used: int) -> None:
+        ttl = ends_at - now + 60
+        count = await self.backend.incr(key, 0, ttl)
+        if used > count:
+            await self.backend.incr(key, used - count, ttl)
+
+    async def observe(self, headers: Mapping[str, str], status_code: int, read: bool = False) -> None:
+        """
+        Reconcile local counters with the usage Strava reports for the app.
+
+        On a 429 the window that ran out is marked full, so callers wait for
+        it to reset instead of retrying straight away. Without usage showing
+        which one, the 15-minute windows of the call are.
+        """
+        now = time.time()
+        reported = {}
+        for scope, prefix in (("overall", "X-RateLimit"), ("read", "X-ReadRateLimit")):
+            limits = parse_rate_limit_header(headers.get(f"{prefix}-Limit"))
+            if limits is not None:
+                self.limits[scope] = limits
+            usage = parse_rate_limit_header(headers.get(f"{prefix}-Usage"))
+            if usage is not None:
+                reported[scope] = usage
+                for (key, ends_at), used in zip(self._windows(now, scope), usage):
+                    await self._raise_to(key, ends_at, now, used)
+        if status_code != 429:
+            return
+
+        exhausted = [
+            (scope, window)
+            for scope in self._scopes(read) if scope in reported
+            for window, (used, limit) in enumerate(zip(reported[scope], self.limits[scope]))
+            if used >= limit
+        ]
+        if not exhausted:
+            exhausted = [(scope, 0) for scope in self._scopes(read)]
+        for scope, window in exhausted:
+            key, ends_at = self._windows(now, scope)[window]
+            await self._raise_to(key, ends_at, now, self.limits[scope][window])
+
+
+rate_limiter = StravaRateLimiter(
+    cache_backend,
+    short_limit=settings.STRAVA_RATE_LIMIT_SHORT,
+    daily_limit=settings.STRAVA_RATE_LIMIT_DAILY,
+    backfill_share=settings.STRAVA_BACKFILL_SHARE,
+    read_short_limit=settings.STRAVA_READ_RATE_LIMIT_SHORT,
+    read_daily_limit=settings.STRAVA_READ_RATE_LIMIT_DAILY,
+)
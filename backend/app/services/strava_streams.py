@@ -0,0 +1,216 @@
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.core.streams import STREAM_SPECS, decode_stream, encode_stream
+from app.db import decode_bytea, supabase
+from app.services.jobs import ProgressReporter, job_queue
+from app.services.strava import StravaError, get_connection, strava_client, token_manager
+from app.services.strava_ratelimit import BACKFILL, INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+STREAMS_JOB_KIND = "strava_streams"
+STREAM_TYPES = tuple(STREAM_SPECS)
+
+
+def permanently_unavailable(error: httpx.HTTPStatusError) -> bool:
+    """
+    Whether Strava refused an activity's streams for good, rather than for
+    the token (401) or the rate limit (429).
+    """
+    status = error.response.status_code
+    return 400 <= status < 500 and status not in (401, 429)
+
+
+async def fetch_streams(
+    access_token: str, strava_activity_id: int, priority: int = INTERACTIVE
+) -> Dict[str, list]:
+    """
+    Fetch every available stream of an activity at full resolution.
+    Returns an empty dict when Strava has no streams for it.
+    """
+    try:
+        response = await strava_client.request(
+            "GET",
+            f"/activities/{strava_activity_id}/streams",
+            access_token=access_token,
+            priority=priority,
+            params={"keys": ",".join(STREAM_TYPES), "key_by_type": "true"},
+        )
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return {}
+        raise
+    return {
+        stream_type: stream["data"]
+        for stream_type, stream in response.json().items()
+        if stream_type in STREAM_SPECS
+    }
+
+
+def encode_streams(streams: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The ``activity_streams`` columns of a set of streams: ``point_count``
+    and one encoded blob (or None) per type. CPU-bound for long activities.
+    """
+    columns: Dict[str, Any] = {
+        "point_count": max((len(data) for data in streams.values()), default=0),
+    }
+    for stream_type in STREAM_TYPES:
+        data = streams.get(stream_type)
+        columns[stream_type] = encode_stream(data, STREAM_SPECS[stream_type]) if data is not None and len(data) else None
+    return columns
+
+
+async def write_streams(activity: Dict[str, Any], columns: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Write columns from ``encode_streams`` as the activity's streams row.
+    """
+    row = {"activity_id": activity["id"], "user_id": activity["user_id"], **columns}
+    response = await supabase.table("activity_streams") \
+                             .upsert(row, on_conflict="activity_id", returning="minimal") \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+    return row
+
+
+async def store_streams(activity: Dict[str, Any], streams: Dict[str, list]) -> Dict[str, Any]:
+    """
+    Encode and write an activity's streams, one bytea column per type.
+
+    An activity without streams still gets a row (``point_count`` 0) so it
+    isn't fetched again.
+    """
+    return await write_streams(activity, encode_streams(streams))
+
+
+async def ingest_streams(
+    connection: Dict[str, Any], activity: Dict[str, Any], priority: int = INTERACTIVE
+) -> Dict[str, Any]:
+    access_token = await token_manager.get_access_token(connection)
+    streams = await fetch_streams(access_token, activity["strava_activity_id"], priority)
+    return await store_streams(activity, streams)
+
+
+async def get_streams(
+    activity_id: str, user_id: str, types: Iterable[str]
+) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Return the decoded streams of one of the user's activities.
+
+    Streams of a Strava activity that haven't been imported yet are fetched
+    on first read. Returns None if the activity doesn't exist or isn't the
+    user's; requested types the activity doesn't have are left out.
+    """
+    types = list(types)
+    response = await supabase.table("activity_streams") \
+                             .select(",".join(["point_count", *types])) \
+                             .eq("activity_id", activity_id) \
+                             .eq("user_id", user_id) \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+    if response.data:
+        row = {key: decode_bytea(value) if key in STREAM_SPECS else value
+               for key, value in response.data[0].items()}
+    else:
+        activity_response = await supabase.table("activities") \
+                                          .select("id,user_id,strava_activity_id") \
+                                          .eq("id", activity_id) \
+                                          .eq("user_id", user_id) \
+                                          .execute()
+
+        if activity_response.error is not None:
+            raise StravaError(str(activity_response.error))
+
+        if not activity_response.data:
+            return None
+
+        activity = activity_response.data[0]
+        if not activity.get("strava_activity_id"):
+            return {}
+        row = await ingest_streams(await get_connection(user_id), activity)
+
+    return {
+        stream_type: decode_stream(row[stream_type])
+        for stream_type in types
+        if row.get(stream_type)
+    }
+
+
+async def import_missing_streams(
+    user_id: str, report: Optional[ProgressReporter] = None, batch_size: int = 100
+) -> Dict[str, int]:
+    """
+    Import streams for every Strava activity of the user that has none yet.
+
+    One activity failing doesn't stop the rest. Activities Strava refuses
+    for good (e.g. 403 for one made private) get an empty row so they
+    aren't asked for again; other failures are counted and left for the
+    next run.
+    """
+    connection = await get_connection(user_id)
+    semaphore = asyncio.Semaphore(settings.STRAVA_SYNC_CONCURRENCY)
+    stats = {"activities_processed": 0, "points_stored": 0, "activities_unavailable": 0, "activities_failed": 0}
+    failed = set()
+
+    async def ingest(activity: Dict[str, Any]) -> None:
+        async with semaphore:
+            try:
+                row = await ingest_streams(connection, activity, priority=BACKFILL)
+            except httpx.HTTPStatusError as e:
+                if not permanently_unavailable(e):
+                    raise
+                logger.info("Strava refused streams of activity %s (%s); not retrying",
+                            activity["strava_activity_id"], e.response.status_code)
+                row = await store_streams(activity, {})
+                stats["activities_unavailable"] += 1
+        stats["activities_processed"] += 1
+        stats["points_stored"] += row["point_count"]
+
+    while True:
+        response = await supabase.rpc("activities_missing_streams", {
+            "p_user_id": user_id,
+            "p_limit": batch_size,
+        }).execute()
+
+        if response.error is not None:
+            raise StravaError(str(response.error))
+
+        # Activities that failed earlier in this run keep coming back first
+        batch = [activity for activity in response.data if activity["id"] not in failed]
+        if not batch:
+            return stats
+
+        results = await asyncio.gather(*(ingest(activity) for activity in batch), return_exceptions=True)
+        for activity, result in zip(batch, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                logger.warning("Failed to import streams of activity %s: %s",
+                               activity["strava_activity_id"], result)
+                failed.add(activity["id"])
+                stats["activities_failed"] += 1
+        if report is not None:
+            await report(dict(stats))
+
+
+async def run_streams_job(job: Dict[str, Any], report: ProgressReporter) -> Dict[str, int]:
+    """
+    Job handler for ``POST /strava/streams``.
+    """
+    return await import_missing_streams(job["user_id"], report)
+
+
+job_queue.register(STREAMS_JOB_KIND, run_streams_job)
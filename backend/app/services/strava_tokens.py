@@ -0,0 +1,156 @@
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, NamedTuple
+
+from app.db import supabase
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRefreshError(Exception):
+    """
+    Raised when a Strava token can't be refreshed or persisted.
+    """
+
+
+class CachedToken(NamedTuple):
+    connection_id: str
+    access_token: str
+    refresh_token: str
+    expires_at: datetime
+
+
+def _parse_expires_at(value: Any) -> datetime:
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    if isinstance(value, datetime):
+        expires_at = value
+    else:
+        expires_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at
+
+
+class StravaTokenManager:
+    """
+    Hands out live Strava access tokens per user, refreshing them ahead of
+    expiry.
+
+    Tokens are cached in memory. Within ``refresh_margin`` of expiry the
+    cached token is still returned while a refresh runs in the background;
+    only an expired token makes the caller wait. Concurrent refreshes for
+    the same user share one in-flight call, so Strava is asked once and the
+    ``user_connections`` row is written once. Before calling Strava the row
+    is re-read, picking up a refresh already done by another worker.
+    """
+
+    def __init__(self, client: Any, token_url: str, client_id: str, client_secret: str,
+                 refresh_margin: float):
+        self.client = client
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self._tokens: Dict[str, CachedToken] = {}
+        self._refreshing: Dict[str, "asyncio.Task[CachedToken]"] = {}
+
+    @staticmethod
+    def _from_connection(connection: Dict[str, Any]) -> CachedToken:
+        return CachedToken(
+            connection_id=connection["id"],
+            access_token=connection["access_token"],
+            refresh_token=connection["refresh_token"],
+            expires_at=_parse_expires_at(connection["expires_at"]),
+        )
+
+    async def get_access_token(self, connection: Dict[str, Any]) -> str:
+        """
+        Return a usable access token for the connection's user.
+        """
+        user_id = connection["user_id"]
+        token = self._tokens.get(user_id)
+        stored = self._from_connection(connection)
+        if token is None or token.connection_id != stored.connection_id \
+                or stored.expires_at > token.expires_at:
+            token = stored
+            self._tokens[user_id] = token
+
+        now = datetime.now(timezone.utc)
+        if token.expires_at <= now:
+            token = await self._refresh(user_id, token)
+        elif token.expires_at - now <= self.refresh_margin:
+            self._refresh_in_background(user_id, token)
+        return token.access_token
+
+    def invalidate(self, user_id: str) -> None:
+        """
+        Drop the cached token, e.g. after the user reconnects Strava.
+        """
+        self._tokens.pop(user_id, None)
+
+    def _refresh_in_background(self, user_id: str, token: CachedToken) -> None:
+        def log_failure(task: "asyncio.Task[CachedToken]") -> None:
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning("Background Strava token refresh failed: %s", task.exception())
+
+        if user_id not in self._refreshing:
+            self._start_refresh(user_id, token).add_done_callback(log_failure)
+
+    def _start_refresh(self, user_id: str, token: CachedToken) -> "asyncio.Task[CachedToken]":
+        task = self._refreshing.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._do_refresh(user_id, token))
+            self._refreshing[user_id] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(user_id, None))
+        return task
+
+    async def _refresh(self, user_id: str, token: CachedToken) -> CachedToken:
+        # Shielded so one cancelled caller doesn't abort the refresh for the rest
+        return await asyncio.shield(self._start_refresh(user_id, token))
+
+    async def _do_refresh(self, user_id: str, token: CachedToken) -> CachedToken:
+        response = await supabase.table("user_connections") \
+                                 .select("id,user_id,access_token,refresh_token,expires_at") \
+                                 .eq("id", token.connection_id) \
+                                 .execute()
+        if response.error is not None:
+            raise TokenRefreshError(str(response.error))
+        if not response.data:
+            self.invalidate(user_id)
+            raise TokenRefreshError("Strava connection no longer exists")
+
+        stored = self._from_connection(response.data[0])
+        if stored.expires_at - datetime.now(timezone.utc) > self.refresh_margin:
+            self._tokens[user_id] = stored
+            return stored
+
+        token_response = await self.client.request("POST", self.token_url, data={
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "refresh_token",
+            "refresh_token": stored.refresh_token,
+        })
+        token_info = token_response.json()
+        refreshed = CachedToken(
+            connection_id=stored.connection_id,
+            access_token=token_info["access_token"],
+            refresh_token=token_info["refresh_token"],
+            expires_at=_parse_expires_at(token_info["expires_at"]),
+        )
+
+        update_response = await supabase.table("user_connections") \
+                                        .update({
+                                            "access_token": refreshed.access_token,
+                                            "refresh_token": refreshed.refresh_token,
+                                            "expires_at": refreshed.expires_at,
+                                        }, returning="minimal") \
+                                        .eq("id", refreshed.connection_id) \
+                                        .execute()
+        if update_response.error is not None:
+            raise TokenRefreshError(str(update_response.error))
+
+        self._tokens[user_id] = refreshed
+        return refreshed
@@ -0,0 +1,207 @@
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.db import supabase
+from app.schemas.strava_webhook import StravaWebhookEvent
+from app.services.activity_tiles import invalidate_activity_tiles
+from app.services.route_matching import schedule_route_matching
+from app.services.strava import StravaError, strava_client, to_activity_row, token_manager
+
+logger = logging.getLogger(__name__)
+
+EventKey = Tuple[str, int]
+
+
+async def get_connection_for_athlete(athlete_id: int) -> Optional[Dict]:
+    response = await supabase.table("user_connections") \
+                             .select("*") \
+                             .eq("provider", "strava") \
+                             .eq("provider_user_id", str(athlete_id)) \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+    return response.data[0] if response.data else None
+
+
+async def upsert_activity(connection: Dict, activity_id: int) -> None:
+    """
+    Fetch one activity and create or overwrite its ``activities`` row, or
+    delete the row if Strava answers 404.
+    """
+    access_token = await token_manager.get_access_token(connection)
+    try:
+        activity = await strava_client.get_activity(access_token, activity_id)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            # Deleted or made inaccessible before we got to it
+            await delete_activity(connection, activity_id)
+            return
+        raise
+
+    previous = await supabase.table("activities") \
+                             .select("map_polyline") \
+                             .eq("strava_activity_id", activity_id) \
+                             .eq("user_id", connection["user_id"]) \
+                             .execute()
+
+    if previous.error is not None:
+        raise StravaError(str(previous.error))
+
+    row = to_activity_row(activity, connection["user_id"])
+    response = await supabase.table("activities") \
+                             .upsert(row, on_conflict="strava_activity_id", returning="minimal") \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+    await schedule_route_matching(connection["user_id"])
+    await invalidate_activity_tiles(
+        connection["user_id"],
+        [row["map_polyline"]] + [old["map_polyline"] for old in previous.data],
+    )
+
+
+async def delete_activity(connection: Dict, activity_id: int) -> None:
+    response = await supabase.table("activities") \
+                             .delete() \
+                             .eq("strava_activity_id", activity_id) \
+                             .eq("user_id", connection["user_id"]) \
+                             .select("map_polyline") \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+    await invalidate_activity_tiles(
+        connection["user_id"], [row["map_polyline"] for row in response.data]
+    )
+
+
+async def deauthorize(connection: Dict) -> None:
+    response = await supabase.table("user_connections") \
+                             .delete(returning="minimal") \
+                             .eq("id", connection["id"]) \
+                             .execute()
+
+    if response.error is not None:
+        raise StravaError(str(response.error))
+
+    token_manager.invalidate(connection["user_id"])
+
+
+async def access_revoked(connection: Dict) -> bool:
+    """
+    Whether Strava rejects the connection's tokens with a 401, checked with
+    a token refresh (if due) and a call on the athlete's behalf.
+    """
+    try:
+        access_token = await token_manager.get_access_token(connection)
+        await strava_client.get_athlete(access_token)
+    except httpx.HTTPStatusError as e:
+        return e.response.status_code == 401
+    return False
+
+
+async def handle_event(event: StravaWebhookEvent) -> None:
+    """
+    Apply one (merged) webhook event.
+
+    Events aren't signed, so destructive ones are confirmed with Strava
+    first: an activity is only deleted once fetching it returns 404, and a
+    connection is only dropped once Strava rejects its tokens.
+    """
+    connection = await get_connection_for_athlete(event.owner_id)
+    if connection is None:
+        logger.debug("Ignoring Strava event for unknown athlete %s", event.owner_id)
+        return
+
+    if event.object_type == "athlete":
+        if str(event.updates.get("authorized", "")).lower() == "false":
+            if await access_revoked(connection):
+                await deauthorize(connection)
+            else:
+                logger.warning("Ignoring deauthorization of athlete %s; Strava still accepts its token",
+                               event.owner_id)
+    elif event.object_type == "activity":
+        # Deletes included: the fetch removes the activity only if Strava no longer has it
+        await upsert_activity(connection, event.object_id)
+
+
+class StravaWebhookConsumer:
+    """
+    Debounces and applies Strava webhook events off the request path.
+
+    The endpoint only puts events on an in-process queue, so Strava gets its
+    acknowledgement immediately. Events for the same object that arrive
+    within ``debounce`` seconds of the first are merged, keeping the latest
+    by ``event_time``: a create followed by title and privacy edits, or by
+    a delete, costs a single activity fetch.
+    Events still pending when the worker stops are lost; the next
+    incremental sync picks up anything missed.
+    """
+
+    def __init__(self, debounce: float, concurrency: int):
+        self.debounce = debounce
+        self.concurrency = concurrency
+        self._queue: "asyncio.Queue[StravaWebhookEvent]" = asyncio.Queue()
+        self._pending: Dict[EventKey, StravaWebhookEvent] = {}
+        self._timers: Dict[EventKey, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, event: StravaWebhookEvent) -> None:
+        self._queue.put_nowait(event)
+
+    def _merge(self, event: StravaWebhookEvent) -> None:
+        key = (event.object_type, event.object_id)
+        pending = self._pending.get(key)
+        if pending is None or event.event_time >= pending.event_time:
+            self._pending[key] = event
+        if key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: EventKey) -> None:
+        await asyncio.sleep(self.debounce)
+        # Events arriving from here on start a new window for this key
+        self._timers.pop(key, None)
+        event = self._pending.pop(key)
+        try:
+            async with self._semaphore:
+                await handle_event(event)
+        except Exception:
+            logger.exception("Failed to apply Strava %s event for %s %s",
+                             event.aspect_type, event.object_type, event.object_id)
+
+    async def _consume(self) -> None:
+        while True:
+            self._merge(await self._queue.get())
+
+    def start(self) -> None:
+        if self._task is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._consume())
+
+    async def stop(self) -> None:
+        tasks: List[asyncio.Task] = list(self._timers.values())
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._timers.clear()
+        self._pending.clear()
+
+
+webhook_consumer = StravaWebhookConsumer(
+    debounce=settings.STRAVA_WEBHOOK_DEBOUNCE_SECONDS,
+    concurrency=settings.STRAVA_SYNC_CONCURRENCY,
+)
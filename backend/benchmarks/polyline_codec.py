@@ -0,0 +1,81 @@
+
+"""
+Compare the NumPy polyline codec against a per-character Python decoder.
+
+Tracks are random walks the size of Strava summary polylines; the batch
+case decodes them all at once as bbox or route matching jobs would.
+
+    python -m benchmarks.polyline_codec --tracks 2000 --points 500
+"""
+import argparse
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from app.core import polyline
+
+
+def decode_naive(encoded: str, precision: int = 5) -> List[Tuple[float, float]]:
+    """
+    The usual pure-Python decoder, one character at a time.
+    """
+    points = []
+    index = lat = lng = 0
+    factor = 10 ** precision
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            result = shift = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+def random_tracks(count: int, points: int, seed: int = 0) -> List[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    starts = np.c_[rng.uniform(-60, 60, count), rng.uniform(-170, 170, count)]
+    return [start + np.cumsum(rng.normal(0, 2e-4, (points, 2)), axis=0) for start in starts]
+
+
+def timed(label: str, fn, baseline: float = None) -> float:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    speedup = f"  ({baseline / elapsed:5.1f}x)" if baseline else ""
+    print(f"{label:<28}{elapsed * 1000:9.1f} ms{speedup}")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tracks", type=int, default=2_000)
+    parser.add_argument("--points", type=int, default=500)
+    args = parser.parse_args()
+
+    tracks = random_tracks(args.tracks, args.points)
+    encoded = [polyline.encode(track) for track in tracks]
+
+    points, offsets = polyline.decode_many(encoded)
+    naive = [np.array(decode_naive(e)) for e in encoded]
+    assert all(np.allclose(a, b) for a, b in zip(polyline.split(points, offsets), naive))
+
+    print(f"{args.tracks} tracks x {args.points} points, "
+          f"{sum(map(len, encoded)) / 1e6:.1f} MB encoded")
+    naive_time = timed("naive decode", lambda: [decode_naive(e) for e in encoded])
+    timed("numpy decode, per track", lambda: [polyline.decode(e) for e in encoded], naive_time)
+    timed("numpy decode_many", lambda: polyline.decode_many(encoded), naive_time)
+    timed("numpy encode, per track", lambda: [polyline.encode(t) for t in tracks])
+
+
+if __name__ == "__main__":
+    main()
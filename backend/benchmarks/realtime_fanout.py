@@ -0,0 +1,75 @@
+
+"""
+Measure how many concurrent realtime subscribers one worker can hold.
+
+Each subscriber is an asyncio task draining its own bounded queue, which is
+what a WebSocket/SSE connection costs the hub minus the socket itself.
+
+    python -m benchmarks.realtime_fanout --subscribers 10000 --messages 100
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from app.core.pubsub import LocalBroker, MessageHub
+
+
+async def run(subscribers: int, messages: int, conversations: int, queue_size: int) -> None:
+    hub = MessageHub(LocalBroker(), queue_size=queue_size)
+    topics = [f"conversation:{i}" for i in range(conversations)]
+    ready = asyncio.Event()
+    received = 0
+    overflowed = 0
+
+    async def subscriber(topic: str, expected: int) -> None:
+        nonlocal received, overflowed
+        async with hub.subscribe(topic) as subscription:
+            await ready.wait()
+            for _ in range(expected):
+                await subscription.get()
+                if subscription.overflowed:
+                    overflowed += 1
+                    return
+                received += 1
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tasks = [
+        asyncio.create_task(subscriber(topics[i % conversations], messages))
+        for i in range(subscribers)
+    ]
+    while hub.subscriber_count() < subscribers:
+        await asyncio.sleep(0.01)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ready.set()
+
+    started = time.perf_counter()
+    for n in range(messages):
+        for topic in topics:
+            await hub.publish(topic, {"type": "message.created", "message": {"seq": n}})
+        # Let subscribers drain between bursts, as a real event loop would
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    print(f"subscribers held:        {subscribers}")
+    print(f"memory per subscriber:   {(held - baseline) / subscribers / 1024:.1f} KiB")
+    print(f"deliveries:              {received} in {elapsed:.2f}s "
+          f"({received / elapsed:,.0f}/s)")
+    print(f"overflowed subscribers:  {overflowed}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--conversations", type=int, default=1_000)
+    parser.add_argument("--queue-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.subscribers, args.messages, args.conversations, args.queue_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Time activity-to-route matching against a synthetic route library.
+
+Routes are smooth random rides packed into one city; activities are noisy
+re-recordings of some of them. Each activity is matched the way the
+matcher does it (bounding box prefilter, then one vectorized Hausdorff
+pass over the survivors) and, as a baseline, by scoring every route.
+
+    python -m benchmarks.route_matching --routes 2000 --activities 200
+"""
+import argparse
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from app.core.geometry import EARTH_RADIUS_M, project, significance
+from app.services.route_matching import box_margin, rank_routes, similar_boxes
+
+CENTER = (-0.1, 51.5)  # lng, lat
+THRESHOLD_M = 100.0
+
+
+def to_lnglat(meters: np.ndarray) -> np.ndarray:
+    lat = CENTER[1] + np.degrees(meters[:, 1] / EARTH_RADIUS_M)
+    lng = CENTER[0] + np.degrees(meters[:, 0] / (EARTH_RADIUS_M * np.cos(np.radians(CENTER[1]))))
+    return np.column_stack((lng, lat))
+
+
+def random_ride(rng: np.random.Generator, points: int, step: float = 5.0) -> np.ndarray:
+    heading = np.cumsum(rng.normal(0, 0.05, points)) + rng.uniform(0, 2 * np.pi)
+    steps = np.column_stack((np.cos(heading), np.sin(heading))) * step
+    return rng.uniform(-15_000, 15_000, 2) + np.cumsum(steps, axis=0)
+
+
+def simplified(lnglat: np.ndarray, tolerance: float = 10.0) -> np.ndarray:
+    return lnglat[significance(project(lnglat), tolerance) > tolerance]
+
+
+def build_library(count: int, seed: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    Full-resolution rides and their stored (simplified) route geometry.
+    """
+    rng = np.random.default_rng(seed)
+    rides = [to_lnglat(random_ride(rng, int(rng.integers(1_000, 8_000)))) for _ in range(count)]
+    return rides, [simplified(ride) for ride in rides]
+
+
+def rerecord(ride: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    A noisy GPS recording of ``ride``, simplified like a summary polyline.
+    """
+    noise = np.degrees(rng.normal(0, 5.0, ride.shape) / EARTH_RADIUS_M)
+    noise[:, 0] /= np.cos(np.radians(CENTER[1]))
+    return simplified(ride + noise, 20.0)
+
+
+def match(track: np.ndarray, boxes: np.ndarray, routes: List[np.ndarray]) -> int:
+    bbox = (*track.min(axis=0), *track.max(axis=0))
+    margin = box_margin(CENTER[1], THRESHOLD_M)
+    candidates = np.flatnonzero(similar_boxes(bbox, boxes, margin))
+    ranked = rank_routes(track, [routes[i] for i in candidates], THRESHOLD_M)
+    return int(candidates[ranked[0][0]]) if ranked else -1
+
+
+def match_all(track: np.ndarray, routes: List[np.ndarray]) -> int:
+    ranked = rank_routes(track, routes, THRESHOLD_M)
+    return ranked[0][0] if ranked else -1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--routes", type=int, default=2_000)
+    parser.add_argument("--activities", type=int, default=200)
+    parser.add_argument("--baseline", type=int, default=5, help="Activities to score against every route")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rides, routes = build_library(args.routes, args.seed)
+    boxes = np.array([(*route.min(axis=0), *route.max(axis=0)) for route in routes])
+    rng = np.random.default_rng(args.seed + 1)
+    targets = rng.choice(args.routes, args.activities, replace=False)
+    # Half the activities follow a route, half are unrelated rides
+    tracks = [
+        rerecord(rides[target], rng) if i % 2 == 0 else simplified(to_lnglat(random_ride(rng, 4_000)), 20.0)
+        for i, target in enumerate(targets)
+    ]
+    expected = [int(target) if i % 2 == 0 else -1 for i, target in enumerate(targets)]
+
+    print(f"{args.routes} routes, {sum(map(len, routes)) / args.routes:.0f} points each after simplification")
+
+    timings = []
+    correct = 0
+    for track, want in zip(tracks, expected):
+        started = time.perf_counter()
+        got = match(track, boxes, routes)
+        timings.append(time.perf_counter() - started)
+        correct += got == want
+    timings = np.array(timings) * 1000
+    print(f"prefilter + hausdorff      mean {timings.mean():7.2f} ms   "
+          f"p95 {np.percentile(timings, 95):7.2f} ms   correct {correct}/{len(tracks)}")
+
+    baseline = []
+    for track in tracks[:args.baseline]:
+        started = time.perf_counter()
+        match_all(track, routes)
+        baseline.append(time.perf_counter() - started)
+    print(f"hausdorff against all      mean {np.mean(baseline) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.api import api_router
+from app.core.auth import jwks_cache
 from app.core.config import settings
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.pubsub import message_hub
+from app.db import supabase
+from app.services.jobs import job_queue
+from app.services.strava import strava_client
+from app.services.strava_webhooks import webhook_consumer
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -19,11 +26,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.on_event("startup")
+async def start_background_tasks():
+    jwks_cache.start()
+    await message_hub.broker.start()
+    job_queue.start()
+    webhook_consumer.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await jwks_cache.stop()
+    await job_queue.stop()
+    await webhook_consumer.stop()
+    await message_hub.broker.stop()
+    await strava_client.aclose()
+    await supabase.aclose()
+
 # Basic root endpoint
 @app.get("/")
 async def root():
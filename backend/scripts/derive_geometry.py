@@ -0,0 +1,103 @@
+"""
+Compute the geometry-derived columns of rows written before they existed.
+
+Routes get their level-of-detail copies, bounding box, distance, climbing
+and grade histogram; activities with a map polyline get their bounding box
+(and a distance if they have none). Rows are walked in id order, so the
+script can be stopped and rerun safely:
+
+    python -m scripts.derive_geometry --table routes
+    python -m scripts.derive_geometry --table activities --batch-size 200
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+from app.db import supabase
+from app.services.route_geometry import compute_activity_columns, compute_route_columns
+
+
+async def derive_routes(batch_size: int) -> int:
+    updated = 0
+    last_id: Optional[str] = None
+    while True:
+        query = supabase.table("routes_data") \
+                        .select("id,coordinates") \
+                        .is_("bbox_geohash", None) \
+                        .order("id") \
+                        .limit(batch_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = await query.execute()
+        if response.error is not None:
+            raise RuntimeError(str(response.error))
+        if not response.data:
+            return updated
+
+        for row in response.data:
+            columns = await compute_route_columns(row["coordinates"])
+            result = await supabase.table("routes_data") \
+                                   .update(columns, returning="minimal") \
+                                   .eq("id", row["id"]) \
+                                   .execute()
+            if result.error is not None:
+                raise RuntimeError(str(result.error))
+            updated += 1
+        last_id = response.data[-1]["id"]
+        print(f"routes: {updated}")
+
+
+async def derive_activities(batch_size: int) -> int:
+    updated = 0
+    last_id: Optional[str] = None
+    while True:
+        query = supabase.table("activities") \
+                        .select("id,map_polyline,distance_km") \
+                        .is_("bbox_geohash", None) \
+                        .neq("map_polyline", "") \
+                        .order("id") \
+                        .limit(batch_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = await query.execute()
+        if response.error is not None:
+            raise RuntimeError(str(response.error))
+        if not response.data:
+            return updated
+
+        for row in response.data:
+            columns = await compute_activity_columns(
+                row["map_polyline"], row["distance_km"] is not None
+            )
+            result = await supabase.table("activities") \
+                                   .update(columns, returning="minimal") \
+                                   .eq("id", row["id"]) \
+                                   .execute()
+            if result.error is not None:
+                raise RuntimeError(str(result.error))
+            updated += 1
+        last_id = response.data[-1]["id"]
+        print(f"activities: {updated}")
+
+
+async def run(table: str, batch_size: int) -> None:
+    try:
+        if table == "routes":
+            total = await derive_routes(batch_size)
+        else:
+            total = await derive_activities(batch_size)
+        print(f"Done: {total} {table} updated")
+    finally:
+        await supabase.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--table", choices=("routes", "activities"), required=True)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.table, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
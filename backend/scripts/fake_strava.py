@@ -0,0 +1,196 @@
+
+"""
+Local stand-in for the Strava API and its webhook pushes.
+
+Serves the OAuth token, athlete activities and activity endpoints with
+rate limit headers, and can push webhook events at a running API:
+
+    python -m scripts.fake_strava --port 8090 \
+        --webhook-url http://localhost:8000/api/v1/strava/webhook
+
+Point the API at it with
+
+    STRAVA_API_BASE=http://localhost:8090/api/v3
+    STRAVA_TOKEN_URL=http://localhost:8090/oauth/token
+    STRAVA_WEBHOOK_VERIFY_TOKEN=fake
+
+then create, edit or delete activities through the control endpoints:
+
+    curl -X POST localhost:8090/_activities -H 'Content-Type: application/json' \
+        -d '{"id": 1, "name": "Morning ride"}'
+    curl -X POST localhost:8090/_activities/1/events -H 'Content-Type: application/json' \
+        -d '{"aspect_type": "update", "repeat": 5}'
+"""
+import argparse
+import itertools
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import FastAPI, Form, HTTPException, Request, Response
+from pydantic import BaseModel
+
+ATHLETE_ID = 1001
+SUBSCRIPTION_ID = 1
+
+app = FastAPI(title="Fake Strava")
+activities: Dict[int, Dict[str, Any]] = {}
+usage = {"short": 0, "daily": 0}
+config = {"webhook_url": None, "short_limit": 200, "daily_limit": 2000}
+token_counter = itertools.count(1)
+
+
+class ActivityIn(BaseModel):
+    id: int
+    name: str = "Fake ride"
+    distance: float = 25_000.0
+    moving_time: int = 3_600
+    start_date: Optional[str] = None
+    summary_polyline: Optional[str] = None
+
+
+class EventIn(BaseModel):
+    aspect_type: str = "update"
+    repeat: int = 1
+    updates: Dict[str, Any] = {}
+
+
+@app.middleware("http")
+async def rate_limit_headers(request: Request, call_next):
+    if request.url.path.startswith("/_"):
+        return await call_next(request)
+    usage["short"] += 1
+    usage["daily"] += 1
+    if usage["short"] > config["short_limit"] or usage["daily"] > config["daily_limit"]:
+        response = Response(status_code=429)
+    else:
+        response = await call_next(request)
+    response.headers["X-RateLimit-Limit"] = f"{config['short_limit']},{config['daily_limit']}"
+    response.headers["X-RateLimit-Usage"] = f"{usage['short']},{usage['daily']}"
+    return response
+
+
+@app.post("/oauth/token")
+async def token(grant_type: str = Form(...)):
+    n = next(token_counter)
+    return {
+        "token_type": "Bearer",
+        "access_token": f"fake-access-{n}",
+        "refresh_token": f"fake-refresh-{n}",
+        "expires_at": int(time.time()) + 6 * 3600,
+        "athlete": {"id": ATHLETE_ID},
+    }
+
+
+@app.get("/api/v3/athlete/activities")
+async def athlete_activities(
+    after: Optional[int] = None, before: Optional[int] = None, page: int = 1, per_page: int = 30
+):
+    def started(activity: Dict[str, Any]) -> float:
+        return datetime.fromisoformat(activity["start_date"].replace("Z", "+00:00")).timestamp()
+
+    # Like Strava: oldest first when "after" is given, newest first otherwise
+    matching = sorted(
+        (a for a in activities.values()
+         if (after is None or started(a) > after) and (before is None or started(a) < before)),
+        key=started,
+        reverse=after is None,
+    )
+    return matching[(page - 1) * per_page:page * per_page]
+
+
+@app.get("/api/v3/activities/{activity_id}")
+async def get_activity(activity_id: int):
+    if activity_id not in activities:
+        raise HTTPException(status_code=404, detail="Record Not Found")
+    return activities[activity_id]
+
+
+@app.get("/api/v3/activities/{activity_id}/streams")
+async def get_activity_streams(activity_id: int, keys: str = "", key_by_type: bool = True):
+    """
+    One hour of 1 Hz streams along a gently wandering line.
+    """
+    if activity_id not in activities:
+        raise HTTPException(status_code=404, detail="Record Not Found")
+    points = activities[activity_id]["moving_time"]
+    streams = {
+        "time": list(range(points)),
+        "latlng": [[45.0 + i * 1e-5, 7.0 + (i % 120) * 2e-6] for i in range(points)],
+        "altitude": [round(500 + 20 * ((i % 600) / 600), 1) for i in range(points)],
+        "heartrate": [130 + (i // 60) % 30 for i in range(points)],
+        "watts": [180 + (i * 7) % 60 for i in range(points)],
+    }
+    wanted = set(keys.split(",")) if keys else set(streams)
+    return {
+        key: {"data": data, "series_type": "time", "original_size": points, "resolution": "high"}
+        for key, data in streams.items() if key in wanted
+    }
+
+
+@app.post("/_activities")
+async def add_activity(activity: ActivityIn):
+    activities[activity.id] = {
+        "id": activity.id,
+        "name": activity.name,
+        "type": "Ride",
+        "sport_type": "Ride",
+        "distance": activity.distance,
+        "moving_time": activity.moving_time,
+        "elapsed_time": activity.moving_time,
+        "start_date": activity.start_date or datetime.now(timezone.utc).isoformat(),
+        "map": {"summary_polyline": activity.summary_polyline},
+    }
+    await push_event(activity.id, EventIn(aspect_type="create"))
+    return activities[activity.id]
+
+
+@app.post("/_activities/{activity_id}/events")
+async def push_event(activity_id: int, event: EventIn):
+    """
+    Push ``repeat`` webhook events for an activity, as Strava does for bursts of edits.
+    """
+    if event.aspect_type == "delete":
+        activities.pop(activity_id, None)
+    if not config["webhook_url"]:
+        return {"sent": 0}
+    async with httpx.AsyncClient() as client:
+        for _ in range(event.repeat):
+            await client.post(config["webhook_url"], json={
+                "object_type": "activity",
+                "object_id": activity_id,
+                "aspect_type": event.aspect_type,
+                "owner_id": ATHLETE_ID,
+                "subscription_id": SUBSCRIPTION_ID,
+                "event_time": int(time.time()),
+                "updates": event.updates,
+            })
+    return {"sent": event.repeat}
+
+
+@app.post("/_reset_usage")
+async def reset_usage():
+    usage.update(short=0, daily=0)
+    return usage
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--webhook-url")
+    parser.add_argument("--short-limit", type=int, default=200)
+    parser.add_argument("--daily-limit", type=int, default=2000)
+    args = parser.parse_args()
+    config.update(
+        webhook_url=args.webhook_url,
+        short_limit=args.short_limit,
+        daily_limit=args.daily_limit,
+    )
+
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import asyncio
+import os
+from typing import Callable, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+import pytest
+
+# Settings are read at import time; the tests never reach these services
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "test-service-key")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-jwt-secret")
+
+
+
+class FakePostgrest:
+    """
+    Stands in for PostgREST behind the shared client: records every request
+    and answers with ``handler`` (an empty 200 by default).
+    """
+
+    def __init__(self):
+        self.requests: List[httpx.Request] = []
+        self.handler: Callable[[httpx.Request], httpx.Response] = lambda request: httpx.Response(200, json=[])
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return self.handler(request)
+
+    def params(self, index: int = 0) -> List[Tuple[str, str]]:
+        return parse_qsl(urlsplit(str(self.requests[index].url)).query, keep_blank_values=True)
+
+
+@pytest.fixture
+def postgrest(monkeypatch) -> FakePostgrest:
+    from app.db import supabase
+
+    fake = FakePostgrest()
+    monkeypatch.setattr(supabase, "_http", httpx.AsyncClient(transport=httpx.MockTransport(fake), base_url=supabase.base_url))
+    monkeypatch.setattr(supabase, "_semaphore", asyncio.Semaphore(10))
+    return fake
@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services import activity_bulk
+from app.services.activity_bulk import validate_items
+
+USER_ID = "22222222-2222-2222-2222-222222222222"
+
+
+def item(**fields):
+    return {"name": "Ride", "start_date": "2026-10-01T08:00:00Z", **fields}
+
+
+def test_validate_items_drops_invalid_and_repeated_items():
+    items = [
+        item(strava_activity_id=1),
+        item(external_id="garmin:7"),
+        {"name": "No start date"},
+        item(strava_activity_id=1, external_id="garmin:8"),
+        item(strava_activity_id=2, external_id="garmin:7"),
+        item(),
+        item(),
+    ]
+    valid, rejected = validate_items(items)
+
+    assert [index for index, _ in valid] == [0, 1, 5, 6]
+    assert rejected[2]["status"] == "invalid"
+    assert "start_date" in rejected[2]["detail"]
+    assert rejected[3] == {"index": 3, "status": "duplicate", "id": None, "detail": "Same activity as item 0"}
+    assert rejected[4]["detail"] == "Same activity as item 1"
+
+
+@pytest.fixture
+def side_effects(monkeypatch):
+    calls = {"invalidated": [], "scheduled": []}
+
+    async def invalidate(user_id, polylines):
+        calls["invalidated"].append(list(polylines))
+
+    async def schedule(user_id):
+        calls["scheduled"].append(user_id)
+
+    monkeypatch.setattr(activity_bulk, "invalidate_activity_tiles", invalidate)
+    monkeypatch.setattr(activity_bulk, "schedule_route_matching", schedule)
+    return calls
+
+
+def test_create_activities(postgrest, side_effects):
+    created = iter(range(100))
+
+    def handler(request):
+        if request.method == "GET":
+            # Stored already: Strava activity 1 and a file with a comma in its id
+            return httpx.Response(200, json=[
+                {"id": "old-1", "strava_activity_id": 1, "external_id": None},
+                {"id": "old-2", "strava_activity_id": None, "external_id": "fit:1,2"},
+            ])
+        rows = json.loads(request.content)
+        if "resolution=ignore-duplicates" in request.headers["Prefer"]:
+            # Strava activity 3 belongs to another user, so the upsert skips it
+            rows = [row for row in rows if row["strava_activity_id"] != 3]
+        return httpx.Response(201, json=[
+            {"id": f"new-{next(created)}", "strava_activity_id": row["strava_activity_id"],
+             "map_polyline": row["map_polyline"], "route_id": row["route_id"]}
+            for row in rows
+        ])
+    postgrest.handler = handler
+
+    items = [
+        item(strava_activity_id=1),
+        item(strava_activity_id=2),
+        item(strava_activity_id=3),
+        item(external_id="fit:1,2"),
+        item(external_id="fit:9"),
+        {"start_date": "2026-10-01T08:00:00Z"},
+    ]
+    results = asyncio.run(activity_bulk.create_activities(USER_ID, items))
+
+    assert [(result["status"], result["id"]) for result in results] == [
+        ("duplicate", "old-1"), ("created", "new-0"), ("duplicate", None),
+        ("duplicate", "old-2"), ("created", "new-1"), ("invalid", None),
+    ]
+    lookup = dict(postgrest.params(0))
+    assert lookup["or"] == '(strava_activity_id.in.(1,2,3),external_id.in.("fit:1,2","fit:9"))'
+    assert [request.method for request in postgrest.requests] == ["GET", "POST", "POST"]
+    assert len(side_effects["invalidated"]) == 1
+    assert side_effects["scheduled"] == [USER_ID]
+
+
+def test_failed_group_does_not_fail_the_other(postgrest, side_effects):
+    def handler(request):
+        if request.method == "GET":
+            return httpx.Response(200, json=[])
+        if "resolution=ignore-duplicates" in request.headers["Prefer"]:
+            return httpx.Response(500, json={"message": "upsert failed"})
+        return httpx.Response(201, json=[
+            {"id": "new", "strava_activity_id": None, "map_polyline": None, "route_id": None}
+        ])
+    postgrest.handler = handler
+
+    results = asyncio.run(activity_bulk.create_activities(
+        USER_ID, [item(strava_activity_id=5), item(external_id="fit:9")]
+    ))
+    assert [result["status"] for result in results] == ["failed", "created"]
+    assert "upsert failed" in results[0]["detail"]
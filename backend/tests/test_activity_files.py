@@ -0,0 +1,158 @@
+import gzip
+import io
+import struct
+
+import numpy as np
+import pytest
+
+from app.core.activity_files import ActivityFileError, parse_activity_file
+
+FIT_EPOCH = 631_065_600
+SEMICIRCLES = 2 ** 31 / 180
+
+
+def fit_definition(local: int, global_number: int, fields) -> bytes:
+    """
+    A little-endian definition message; ``fields`` are ``(number, size, base_type)``.
+    """
+    header = struct.pack("<BBBHB", 0x40 | local, 0, 0, global_number, len(fields))
+    return header + b"".join(struct.pack("<BBB", *field) for field in fields)
+
+
+def fit_file(*messages: bytes) -> bytes:
+    data = b"".join(messages)
+    header = struct.pack("<BBHI4sH", 14, 0x20, 2132, len(data), b".FIT", 0)
+    return header + data + b"\x00\x00"
+
+
+def semicircles(degrees: float) -> int:
+    return round(degrees * SEMICIRCLES)
+
+
+def test_fit_compressed_timestamps_and_two_record_definitions():
+    start = 1_000_000_000
+    content = fit_file(
+        # file_id: type, manufacturer, serial number, time created
+        fit_definition(3, 0, [(0, 1, 0x00), (1, 2, 0x84), (3, 4, 0x8C), (4, 4, 0x86)]),
+        bytes([3]) + struct.pack("<BHII", 4, 1, 3_912_345_678, start - 60),
+        # Session with sport = cycling
+        fit_definition(2, 18, [(5, 1, 0x00)]),
+        bytes([2]) + bytes([2]),
+        # Record with a full timestamp and heart rate
+        fit_definition(0, 20, [(253, 4, 0x86), (0, 4, 0x85), (1, 4, 0x85), (3, 1, 0x02)]),
+        bytes([0]) + struct.pack("<IiiB", start, semicircles(45.0), semicircles(7.0), 120),
+        # Record without a timestamp field, sent with compressed timestamp headers
+        fit_definition(1, 20, [(0, 4, 0x85), (1, 4, 0x85), (2, 2, 0x84)]),
+        *(
+            bytes([0x80 | 1 << 5 | (start + offset) & 0x1F])
+            + struct.pack("<iiH", semicircles(45.0 + offset / 1000), semicircles(7.0), (100 + 500) * 5)
+            for offset in (1, 20, 35)
+        ),
+        bytes([0]) + struct.pack("<IiiB", start + 36, semicircles(45.036), semicircles(7.0), 0xFF),
+    )
+
+    parsed = parse_activity_file(io.BytesIO(content))
+
+    assert parsed.type == "Ride"
+    assert parsed.file_id == f"fit:3912345678:{start - 60}"
+    points = parsed.points
+    np.testing.assert_array_equal(points["time"], FIT_EPOCH + start + np.array([0, 1, 20, 35, 36]))
+    np.testing.assert_allclose(points["lat"], [45.0, 45.001, 45.020, 45.035, 45.036], atol=1e-6)
+    np.testing.assert_allclose(points["lng"], 7.0, atol=1e-6)
+    np.testing.assert_array_equal(points["heartrate"], [120, np.nan, np.nan, np.nan, np.nan])
+    np.testing.assert_array_equal(points["altitude"], [np.nan, 100, 100, 100, np.nan])
+    assert np.isnan(points["watts"]).all()
+
+
+def test_fit_without_serial_number_has_no_file_id():
+    content = fit_file(
+        fit_definition(0, 0, [(3, 4, 0x8C), (4, 4, 0x86)]),
+        bytes([0]) + struct.pack("<II", 0, 1_000_000_000),
+        fit_definition(1, 20, [(253, 4, 0x86), (3, 1, 0x02)]),
+        bytes([1]) + struct.pack("<IB", 1_000_000_000, 120),
+    )
+
+    assert parse_activity_file(io.BytesIO(content)).file_id is None
+
+
+def test_fit_rejects_messages_without_definition():
+    with pytest.raises(ActivityFileError):
+        parse_activity_file(io.BytesIO(fit_file(bytes([0]) + b"\x00" * 4)))
+
+
+TCX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">
+  <Activities>
+    <Activity Sport="Biking">
+      <Lap StartTime="2026-05-01T08:00:00Z">
+        <Track>
+          <Trackpoint>
+            <Time>2026-05-01T08:00:00Z</Time>
+            <Position><LatitudeDegrees>46.5</LatitudeDegrees><LongitudeDegrees>6.6</LongitudeDegrees></Position>
+            <AltitudeMeters>372.4</AltitudeMeters>
+            <DistanceMeters>0</DistanceMeters>
+            <HeartRateBpm><Value>98</Value></HeartRateBpm>
+            <Cadence>80</Cadence>
+          </Trackpoint>
+          <Trackpoint>
+            <Time>2026-05-01T08:00:05Z</Time>
+            <Position><LatitudeDegrees>46.5004</LatitudeDegrees><LongitudeDegrees>6.6</LongitudeDegrees></Position>
+            <AltitudeMeters>373.0</AltitudeMeters>
+            <DistanceMeters>44.5</DistanceMeters>
+            <HeartRateBpm><Value>104</Value></HeartRateBpm>
+          </Trackpoint>
+        </Track>
+      </Lap>
+    </Activity>
+  </Activities>
+</TrainingCenterDatabase>
+"""
+
+
+def test_tcx_heart_rate_and_channels():
+    parsed = parse_activity_file(io.BytesIO(TCX))
+
+    assert parsed.type == "Ride"
+    assert parsed.file_id is None
+    points = parsed.points
+    start = 1_777_622_400  # 2026-05-01T08:00:00Z
+    np.testing.assert_array_equal(points["time"], [start, start + 5])
+    np.testing.assert_array_equal(points["heartrate"], [98, 104])
+    np.testing.assert_array_equal(points["lat"], [46.5, 46.5004])
+    np.testing.assert_array_equal(points["altitude"], [372.4, 373.0])
+    np.testing.assert_array_equal(points["distance"], [0, 44.5])
+    np.testing.assert_array_equal(points["cadence"], [80, np.nan])
+
+
+def test_gzipped_gpx():
+    gpx = b"""<?xml version="1.0"?>
+<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">
+  <metadata><name>File name</name></metadata>
+  <trk>
+    <name>Morning run</name>
+    <type>running</type>
+    <trkseg>
+      <trkpt lat="46.5" lon="6.6"><ele>372</ele><time>2026-05-01T08:00:00Z</time></trkpt>
+      <trkpt lat="46.501" lon="6.601"><ele>374</ele><time>2026-05-01T08:00:10Z</time></trkpt>
+    </trkseg>
+  </trk>
+</gpx>
+"""
+    parsed = parse_activity_file(io.BytesIO(gzip.compress(gpx)))
+
+    assert parsed.name == "Morning run"
+    assert parsed.type == "Run"
+    np.testing.assert_array_equal(parsed.points["lng"], [6.6, 6.601])
+    np.testing.assert_array_equal(parsed.points["altitude"], [372, 374])
+    assert np.isnan(parsed.points["heartrate"]).all()
+
+
+def test_size_limit_applies_after_decompression():
+    content = gzip.compress(TCX.replace(b"<Track>", b"<Track>" + b" " * 10_000))
+    with pytest.raises(ActivityFileError, match="too large"):
+        parse_activity_file(io.BytesIO(content), max_bytes=5_000)
+
+
+def test_unsupported_format():
+    with pytest.raises(ActivityFileError, match="Unsupported"):
+        parse_activity_file(io.BytesIO(b"lat,lng\n46.5,6.6\n"))
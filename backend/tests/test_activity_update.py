@@ -0,0 +1,80 @@
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import activities
+from app.core.auth import get_current_user
+from main import app
+
+ACTIVITY_ID = "33333333-3333-3333-3333-333333333333"
+USER_ID = "22222222-2222-2222-2222-222222222222"
+OLD_POLYLINE = "_p~iF~ps|U_ulLnnqC"
+NEW_POLYLINE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def activity_row(**fields):
+    return {
+        "id": ACTIVITY_ID, "user_id": USER_ID, "name": "Ride", "created_at": "2026-10-01T08:00:00+00:00",
+        "start_date": "2026-10-01T08:00:00+00:00", "map_polyline": OLD_POLYLINE, **fields,
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    invalidated = []
+    scheduled = []
+
+    async def invalidate(user_id, polylines):
+        invalidated.append(list(polylines))
+
+    async def schedule(user_id):
+        scheduled.append(user_id)
+
+    monkeypatch.setattr(activities, "invalidate_activity_tiles", invalidate)
+    monkeypatch.setattr(activities, "schedule_route_matching", schedule)
+    app.dependency_overrides[get_current_user] = lambda: {"user_id": USER_ID}
+    test_client = TestClient(app)
+    test_client.invalidated = invalidated
+    test_client.scheduled = scheduled
+    yield test_client
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def test_track_change_reads_previous_polyline_in_the_same_call(postgrest, client):
+    postgrest.handler = lambda request: httpx.Response(200, json=[{
+        "activity": activity_row(map_polyline=NEW_POLYLINE),
+        "previous_map_polyline": OLD_POLYLINE,
+    }])
+
+    response = client.put(f"/api/v1/activities/{ACTIVITY_ID}", json={"map_polyline": NEW_POLYLINE})
+
+    assert response.status_code == 200
+    assert response.json()["map_polyline"] == NEW_POLYLINE
+    [request] = postgrest.requests
+    assert (request.method, request.url.path) == ("POST", "/rest/v1/rpc/update_activity_track")
+    body = json.loads(request.content)
+    assert (body["p_activity_id"], body["p_user_id"]) == (ACTIVITY_ID, USER_ID)
+    assert body["p_changes"]["map_polyline"] == NEW_POLYLINE
+    assert body["p_changes"]["route_matched_at"] is None
+    assert client.invalidated == [[OLD_POLYLINE, NEW_POLYLINE]]
+    assert client.scheduled == [USER_ID]
+
+
+def test_track_change_of_missing_activity_is_404(postgrest, client):
+    response = client.put(f"/api/v1/activities/{ACTIVITY_ID}", json={"type": "Run"})
+
+    assert response.status_code == 404
+    assert client.invalidated == []
+
+
+def test_other_changes_update_in_place(postgrest, client):
+    postgrest.handler = lambda request: httpx.Response(200, json=[activity_row(name="Evening ride")])
+
+    response = client.put(f"/api/v1/activities/{ACTIVITY_ID}", json={"name": "Evening ride"})
+
+    assert response.status_code == 200
+    [request] = postgrest.requests
+    assert (request.method, request.url.path) == ("PATCH", "/rest/v1/activities")
+    assert client.invalidated == []
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+import rsa
+from fastapi import HTTPException
+from jose import jwk, jwt
+
+from app.core import auth
+from app.core.auth import JWKSCache, TokenCache
+from app.core.config import settings
+
+USER_ID = "22222222-2222-2222-2222-222222222222"
+
+
+def claims(**fields):
+    return {"sub": USER_ID, "aud": settings.JWT_AUDIENCE, "exp": int(time.time()) + 60, **fields}
+
+
+def hs256(secret=None, **fields):
+    return jwt.encode(claims(**fields), secret or settings.SUPABASE_JWT_SECRET, algorithm="HS256")
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    _, private_key = rsa.newkeys(1024)
+    pem = private_key.save_pkcs1().decode()
+    return pem, {**jwk.construct(pem, "RS256").public_key().to_dict(), "kid": "key-1"}
+
+
+@pytest.fixture
+def jwks(monkeypatch, signing_key):
+    """
+    A fresh JWKS cache served from a fake endpoint; ``fetches`` counts requests.
+    """
+    fetches = []
+
+    def handler(request):
+        fetches.append(request)
+        return httpx.Response(200, json={"keys": [signing_key[1]]})
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        auth.httpx, "AsyncClient",
+        lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs),
+    )
+    cache = JWKSCache("http://auth.test/jwks.json", refresh_interval=600)
+    monkeypatch.setattr(auth, "jwks_cache", cache)
+    cache.fetches = fetches
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache(monkeypatch):
+    monkeypatch.setattr(auth, "token_cache", TokenCache(10))
+
+
+def rejected(token) -> str:
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(auth.verify_token(token))
+    assert e.value.status_code == 401
+    return e.value.detail
+
+
+def test_hs256_token_is_verified_locally():
+    user = asyncio.run(auth.get_user_from_token(hs256(email="rider@example.com")))
+    assert user == {"user_id": USER_ID, "email": "rider@example.com", "role": None}
+
+
+@pytest.mark.parametrize("token", [
+    hs256(secret="another-secret"),
+    hs256(exp=int(time.time()) - 10),
+    hs256(aud="anon"),
+    jwt.encode({"aud": "authenticated", "exp": int(time.time()) + 60}, "x", algorithm="HS256"),
+    "not-a-token",
+])
+def test_invalid_tokens_are_rejected(token):
+    rejected(token)
+
+
+def test_unsupported_algorithm_is_rejected():
+    token = jwt.encode(claims(), settings.SUPABASE_JWT_SECRET, algorithm="HS512")
+    assert rejected(token) == "Unsupported token algorithm"
+
+
+def test_asymmetric_key_is_fetched_once(jwks, signing_key):
+    pem, _ = signing_key
+    for _ in range(3):
+        token = jwt.encode(claims(), pem, algorithm="RS256", headers={"kid": "key-1"})
+        assert asyncio.run(auth.verify_token(token))["sub"] == USER_ID
+    assert len(jwks.fetches) == 1
+
+
+def test_unknown_key_refreshes_are_throttled(jwks, signing_key):
+    pem, _ = signing_key
+    for _ in range(3):
+        token = jwt.encode(claims(), pem, algorithm="RS256", headers={"kid": "rotated-away"})
+        assert rejected(token) == "Unknown token signing key"
+    assert len(jwks.fetches) == 1
+
+
+def test_token_cache_serves_until_expiry(monkeypatch):
+    cache = TokenCache(2)
+    cache.set("a", {"exp": time.time() + 60})
+    cache.set("b", {"exp": time.time() + 60})
+    assert cache.get("a") is not None
+    # "b" is now the least recently used entry
+    cache.set("c", {"exp": time.time() + 60})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    later = time.time() + 120
+    monkeypatch.setattr(auth.time, "time", lambda: later)
+    assert cache.get("a") is None
@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.endpoints import messages
+from app.core import cache
+from app.core.cache import InMemoryCache, MembershipCache
+
+CONVERSATION_ID = "11111111-1111-1111-1111-111111111111"
+USER_ID = "22222222-2222-2222-2222-222222222222"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    backend = InMemoryCache()
+    asyncio.run(backend.set("key", "value", ttl=10))
+    assert asyncio.run(backend.get("key")) == "value"
+    clock[0] += 10
+    assert asyncio.run(backend.get("key")) is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    backend = InMemoryCache(max_size=2)
+
+    async def fill():
+        await backend.set("a", "1", ttl=60)
+        await backend.set("b", "2", ttl=60)
+        await backend.get("a")
+        await backend.set("c", "3", ttl=60)
+        return [await backend.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(fill()) == ["1", None, "3"]
+
+
+def test_counter_keeps_its_first_expiry(clock):
+    backend = InMemoryCache()
+    assert asyncio.run(backend.incr("count", 2, ttl=10)) == 2
+    clock[0] += 5
+    assert asyncio.run(backend.incr("count", 3, ttl=10)) == 5
+    clock[0] += 5
+    assert asyncio.run(backend.incr("count", 1, ttl=10)) == 1
+
+
+@pytest.fixture
+def membership(monkeypatch):
+    membership_cache = MembershipCache(InMemoryCache(), ttl=60)
+    monkeypatch.setattr(messages, "membership_cache", membership_cache)
+    return membership_cache
+
+
+def require_participant():
+    asyncio.run(messages._require_participant(CONVERSATION_ID, USER_ID))
+
+
+def test_membership_is_looked_up_once(postgrest, membership):
+    postgrest.handler = lambda request: httpx.Response(200, json=[{"id": "participant"}])
+
+    require_participant()
+    require_participant()
+    assert len(postgrest.requests) == 1
+
+    asyncio.run(membership.invalidate(USER_ID, CONVERSATION_ID))
+    require_participant()
+    assert len(postgrest.requests) == 2
+
+
+def test_non_membership_is_not_cached(postgrest, membership):
+    for _ in range(2):
+        with pytest.raises(HTTPException) as e:
+            require_participant()
+        assert e.value.status_code == 403
+    assert len(postgrest.requests) == 2
+
+    # A participant added since is let in straight away
+    postgrest.handler = lambda request: httpx.Response(200, json=[{"id": "participant"}])
+    require_participant()
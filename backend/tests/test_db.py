@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+
+from app.db import AsyncPostgrestClient, format_filter_value
+
+
+def mock_client(handler) -> AsyncPostgrestClient:
+    client = AsyncPostgrestClient("http://db.test", "key")
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url=client.base_url)
+    client._semaphore = asyncio.Semaphore(10)
+    return client
+
+
+def sent_params(build) -> list:
+    """
+    The query parameters PostgREST receives for the query ``build(client)``.
+    """
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=[])
+
+    asyncio.run(build(mock_client(handler)).execute())
+    return parse_qsl(urlsplit(str(requests[0].url)).query, keep_blank_values=True)
+
+
+def test_top_level_filters_are_not_quoted():
+    moment = datetime(2026, 10, 18, tzinfo=timezone.utc)
+    params = sent_params(
+        lambda db: db.table("activities")
+                     .select("id")
+                     .eq("name", "a,b")
+                     .lte("created_at", moment)
+                     .is_("route_id", None)
+                     .eq("private", False)
+    )
+    assert params == [
+        ("select", "id"),
+        ("name", "eq.a,b"),
+        ("created_at", "lte.2026-10-18T00:00:00+00:00"),
+        ("route_id", "is.null"),
+        ("private", "eq.false"),
+    ]
+
+
+def test_in_lists_and_or_trees_are_quoted():
+    params = sent_params(
+        lambda db: db.table("activities")
+                     .select("id")
+                     .in_("external_id", ["a.gpx", "b,c.gpx", 'say "hi"'])
+                     .or_(f"created_at.lt.{format_filter_value(datetime(2026, 1, 1))},id.eq.1")
+                     .order("created_at", desc=True)
+                     .limit(5)
+    )
+    assert params == [
+        ("select", "id"),
+        ("external_id", 'in.(a.gpx,"b,c.gpx","say \\"hi\\"")'),
+        ("or", '(created_at.lt."2026-01-01T00:00:00",id.eq.1)'),
+        ("limit", "5"),
+        ("order", "created_at.desc"),
+    ]
+
+
+def test_non_json_error_page_is_an_error_response():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(502, text="<html>Bad Gateway</html>", headers={"content-type": "text/html"})
+
+    response = asyncio.run(mock_client(handler).table("bikes").select("*").execute())
+
+    assert response.status_code == 502
+    assert response.data == []
+    assert response.error == {"message": "<html>Bad Gateway</html>"}
+
+
+def test_transport_error_is_an_error_response():
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectTimeout("timed out", request=request)
+
+    response = asyncio.run(mock_client(handler).table("bikes").select("*").execute())
+
+    assert response.status_code == 503
+    assert "timed out" in response.error["message"]
+
+
+def test_count_from_content_range():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=[{"id": 1}], headers={"content-range": "0-0/42"})
+
+    response = asyncio.run(mock_client(handler).table("bikes").select("id", count="exact").execute())
+
+    assert response.error is None
+    assert response.data == [{"id": 1}]
+    assert response.count == 42
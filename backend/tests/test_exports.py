@@ -0,0 +1,65 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import httpx
+
+from app.core.config import settings
+from app.services.exports import _pages, ndjson_export
+
+USER_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa7"
+AS_OF = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+
+def rows(count: int, offset: int = 0):
+    return [
+        {"id": f"00000000-0000-0000-0000-{offset + i:012d}", "created_at": f"2026-10-0{1 + (offset + i) % 9}T00:00:00+00:00"}
+        for i in range(count)
+    ]
+
+
+def test_pages_query_params(postgrest, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_PAGE_SIZE", 2)
+    pages = iter([rows(2), rows(1, offset=2)])
+    postgrest.handler = lambda request: httpx.Response(200, json=next(pages))
+
+    async def collect():
+        return [page async for page in _pages("bikes", "id,created_at", USER_ID, AS_OF)]
+
+    collected = asyncio.run(collect())
+
+    assert [len(page) for page in collected] == [2, 1]
+    assert postgrest.params(0) == [
+        ("select", "id,created_at"),
+        ("user_id", f"eq.{USER_ID}"),
+        ("created_at", "lte.2026-10-18T12:00:00+00:00"),
+        ("offset", "0"),
+        ("limit", "2"),
+        ("order", "created_at.desc,id.desc"),
+    ]
+    last = rows(2)[-1]
+    assert postgrest.params(1)[:3] == postgrest.params(0)[:3]
+    assert dict(postgrest.params(1))["or"] == (
+        f'(created_at.lt."{last["created_at"]}",'
+        f'and(created_at.eq."{last["created_at"]}",id.lt.{last["id"]}))'
+    )
+    assert len(postgrest.requests) == 2
+
+
+def test_ndjson_export_records(postgrest):
+    def handler(request: httpx.Request) -> httpx.Response:
+        table = request.url.path.rsplit("/", 1)[1]
+        if table == "bikes":
+            return httpx.Response(200, json=[{"id": "b1", "name": "Gravel"}])
+        return httpx.Response(200, json=[])
+    postgrest.handler = handler
+
+    async def collect():
+        return b"".join([chunk async for chunk in ndjson_export(USER_ID, AS_OF)])
+
+    lines = asyncio.run(collect()).splitlines()
+
+    assert [json.loads(line) for line in lines] == [{"type": "bike", "data": {"id": "b1", "name": "Gravel"}}]
+    assert [request.url.path.rsplit("/", 1)[1] for request in postgrest.requests] == [
+        "bikes", "routes_data", "activities",
+    ]
@@ -0,0 +1,123 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from app.services.jobs import JobQueue
+
+USER_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa7"
+
+
+def job(job_id: str, status: str = "queued", heartbeat: timedelta = timedelta(0)):
+    return {
+        "id": job_id, "user_id": USER_ID, "kind": "sync", "status": status, "payload": {},
+        "heartbeat_at": (datetime.now(timezone.utc) - heartbeat).isoformat(),
+    }
+
+
+class JobsTable:
+    """
+    Just enough of the ``jobs`` table for the queue: conditional updates
+    only match rows in the filtered status.
+    """
+
+    def __init__(self, *rows):
+        self.rows = {row["id"]: dict(row) for row in rows}
+        self.inserted = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        params = dict(request.url.params.multi_items())
+        matches = [
+            row for row in self.rows.values()
+            if params.get("id", f"eq.{row['id']}") == f"eq.{row['id']}"
+            and params.get("status", f"eq.{row['status']}") in (f"eq.{row['status']}", "in.(queued,running)")
+        ]
+        if request.method == "GET":
+            return httpx.Response(200, json=matches)
+        if request.method == "PATCH":
+            for row in matches:
+                row.update(json.loads(request.content))
+            return httpx.Response(200, json=[{"id": row["id"]} for row in matches])
+        self.inserted += 1
+        row = {**json.loads(request.content), "id": f"new-{self.inserted}"}
+        self.rows[row["id"]] = row
+        return httpx.Response(201, json=[row])
+
+
+async def run_queue(queue: JobQueue, until) -> None:
+    queue.start()
+    try:
+        for _ in range(200):
+            if until():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("Timed out waiting for the queue")
+    finally:
+        await queue.stop()
+
+
+def test_start_recovers_queued_jobs(postgrest):
+    table = JobsTable(job("left-over"))
+    postgrest.handler = table
+    ran = []
+
+    async def handler(job, report):
+        ran.append(job["id"])
+        return {"ok": True}
+
+    queue = JobQueue(workers=2, stale_after=60)
+    queue.register("sync", handler)
+    asyncio.run(run_queue(queue, lambda: table.rows["left-over"]["status"] == "succeeded"))
+
+    assert ran == ["left-over"]
+    recovery = postgrest.params(0)
+    assert ("status", "eq.queued") in recovery
+    assert ("kind", "in.(sync)") in recovery
+
+
+def test_job_runs_once_when_two_workers_recover_it(postgrest):
+    table = JobsTable(job("left-over"))
+    postgrest.handler = table
+    ran = []
+
+    async def handler(job, report):
+        ran.append(job["id"])
+        return {}
+
+    first, second = JobQueue(workers=1, stale_after=60), JobQueue(workers=1, stale_after=60)
+    for queue in (first, second):
+        queue.register("sync", handler)
+
+    async def both():
+        done = lambda: table.rows["left-over"]["status"] == "succeeded"
+        await asyncio.gather(run_queue(first, done), run_queue(second, done))
+
+    asyncio.run(both())
+
+    assert ran == ["left-over"]
+
+
+def test_enqueue_returns_active_job(postgrest):
+    # Queued jobs wait for a worker (or a restart); they are never expired as stalled
+    table = JobsTable(job("waiting", heartbeat=timedelta(minutes=5)))
+    postgrest.handler = table
+    queue = JobQueue(workers=1, stale_after=60)
+    queue.register("sync", lambda job, report: None)
+
+    existing, created = asyncio.run(queue.enqueue("sync", USER_ID))
+
+    assert (existing["id"], created) == ("waiting", False)
+
+
+def test_stalled_running_job_is_replaced(postgrest):
+    table = JobsTable(job("stalled", status="running", heartbeat=timedelta(minutes=5)))
+    postgrest.handler = table
+    queue = JobQueue(workers=1, stale_after=60)
+    queue.register("sync", lambda job, report: None)
+
+    new, created = asyncio.run(queue.enqueue("sync", USER_ID))
+
+    assert created and new["id"] == "new-1"
+    assert table.rows["stalled"]["status"] == "failed"
+    assert table.rows["stalled"]["error"] == "Job stalled"
@@ -0,0 +1,50 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.v1.endpoints import messages
+from app.core.auth import get_current_user
+from main import app
+
+CONVERSATION_ID = "11111111-1111-1111-1111-111111111111"
+USER_ID = "22222222-2222-2222-2222-222222222222"
+
+
+@pytest.fixture
+def signed_in(monkeypatch):
+    async def user_from_token(token: str):
+        return {"user_id": USER_ID}
+
+    monkeypatch.setattr(messages, "get_user_from_token", user_from_token)
+    app.dependency_overrides[get_current_user] = lambda: {"user_id": USER_ID}
+    yield
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def test_removed_participant_websocket_is_closed(postgrest, signed_in):
+    def handler(request: httpx.Request) -> httpx.Response:
+        table = request.url.path.rsplit("/", 1)[1]
+        if table == "conversations":
+            return httpx.Response(200, json=[{"id": CONVERSATION_ID}])
+        if table == "participants":
+            return httpx.Response(200, json=[{"id": "participant"}])
+        return httpx.Response(200, json=[])
+    postgrest.handler = handler
+
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/api/v1/messages/conversations/{CONVERSATION_ID}/ws?token=t") as websocket:
+            response = client.delete(f"/api/v1/messages/conversations/{CONVERSATION_ID}/participants/{USER_ID}")
+            assert response.status_code == 200
+
+            with pytest.raises(WebSocketDisconnect) as closed:
+                websocket.receive_text()
+            assert closed.value.code == 1008
+
+
+def test_non_participant_websocket_is_refused(postgrest, signed_in):
+    with TestClient(app) as client:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect(f"/api/v1/messages/conversations/{CONVERSATION_ID}/ws?token=t"):
+                pass
+        assert closed.value.code == 1008
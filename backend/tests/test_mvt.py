@@ -0,0 +1,132 @@
+import struct
+
+import numpy as np
+
+from app.core.mvt import EXTENT, encode_layer, encode_tile, tile_bounds, to_tile
+
+
+def read_varint(data: bytes, position: int):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def read_fields(data: bytes):
+    """
+    ``(number, value)`` for each field of a protobuf message; varints are
+    ints, length-delimited fields bytes and 64-bit fields doubles.
+    """
+    position = 0
+    while position < len(data):
+        key, position = read_varint(data, position)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, position = read_varint(data, position)
+        elif wire_type == 1:
+            value, = struct.unpack_from("<d", data, position)
+            position += 8
+        else:
+            assert wire_type == 2
+            size, position = read_varint(data, position)
+            value = data[position:position + size]
+            position += size
+        yield number, value
+
+
+def packed(data: bytes):
+    values, position = [], 0
+    while position < len(data):
+        value, position = read_varint(data, position)
+        values.append(value)
+    return values
+
+
+def unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_lines(commands):
+    """
+    Parts of a linestring geometry, in absolute tile positions.
+    """
+    parts, cursor, position = [], [0, 0], 0
+    while position < len(commands):
+        command, count = commands[position] & 0x7, commands[position] >> 3
+        position += 1
+        if command == 1:
+            parts.append([])
+        for _ in range(count):
+            cursor = [cursor[0] + unzigzag(commands[position]), cursor[1] + unzigzag(commands[position + 1])]
+            position += 2
+            parts[-1].append(cursor)
+    return parts
+
+
+def decode_value(data: bytes):
+    number, value = next(read_fields(data))
+    if number == 1:
+        return value.decode()
+    if number == 7:
+        return bool(value)
+    return value
+
+
+def decode_tile(tile: bytes):
+    layers = {}
+    for number, layer in read_fields(tile):
+        assert number == 3
+        fields = list(read_fields(layer))
+        keys = [value.decode() for number, value in fields if number == 3]
+        values = [decode_value(value) for number, value in fields if number == 4]
+        features = []
+        for number, feature in fields:
+            if number != 2:
+                continue
+            feature_fields = dict(read_fields(feature))
+            tags = packed(feature_fields.get(2, b""))
+            assert feature_fields[3] == 2  # LINESTRING
+            features.append((
+                decode_lines(packed(feature_fields[4])),
+                {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])},
+            ))
+        name = next(value for number, value in fields if number == 1).decode()
+        layers[name] = {
+            "version": next(value for number, value in fields if number == 15),
+            "extent": next(value for number, value in fields if number == 5),
+            "features": features,
+        }
+    return layers
+
+
+def test_layer_round_trip():
+    # Long enough for the vectorized varint path, with negative deltas
+    angles = np.linspace(0, 2 * np.pi, 40)
+    ring = np.column_stack((2048 + 1500 * np.cos(angles), 2048 + 1500 * np.sin(angles))).round().astype(np.int64)
+    short = np.array([[-64, 10], [4160, 5000]])
+    features = [
+        ([ring, short], {"id": "a", "distance_km": 42.5, "count": 300, "commute": True, "gear": None}),
+        ([short], {"id": "b", "count": 300}),
+    ]
+
+    layers = decode_tile(encode_tile([encode_layer("activities", features)]))
+
+    layer = layers["activities"]
+    assert layer["version"] == 2
+    assert layer["extent"] == EXTENT
+    (parts_a, properties_a), (parts_b, properties_b) = layer["features"]
+    assert parts_a == [ring.tolist(), short.tolist()]
+    assert properties_a == {"id": "a", "distance_km": 42.5, "count": 300, "commute": True}
+    assert parts_b == [short.tolist()]
+    assert properties_b == {"id": "b", "count": 300}
+
+
+def test_projection_matches_tile_bounds():
+    z, x, y = 12, 2131, 1449
+    min_lng, min_lat, max_lng, max_lat = tile_bounds(z, x, y)
+    corners = to_tile(np.array([[min_lng, max_lat], [max_lng, min_lat]]), z, x, y)
+    np.testing.assert_allclose(corners, [[0, 0], [EXTENT, EXTENT]], atol=1e-6)
@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.auth import get_current_user
+from app.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, next_cursor, paginate
+from app.db import supabase
+from main import app
+
+USER_ID = "22222222-2222-2222-2222-222222222222"
+
+
+def route_row(index):
+    return {
+        "id": f"00000000-0000-0000-0000-{index:012d}", "user_id": USER_ID, "name": f"Route {index}",
+        "created_at": f"2026-10-{index + 1:02d}T08:00:00+00:00",
+    }
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2026-10-01T08:00:00.123456+00:00", "abc")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("2026-10-01T08:00:00.123456+00:00", "abc")
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor("x", "y")[:-3], "WzFd"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_next_cursor_only_on_full_pages():
+    rows = [route_row(2), route_row(1)]
+    assert next_cursor(rows, "created_at", 3) is None
+    assert next_cursor([], "created_at", 0) is None
+    assert decode_cursor(next_cursor(rows, "created_at", 2)) == (rows[1]["created_at"], rows[1]["id"])
+
+
+def test_paginate_seeks_past_the_cursor(postgrest):
+    cursor = encode_cursor("2026-10-01T08:00:00+00:00", "abc")
+    asyncio.run(paginate(supabase.table("routes").select("*"), "created_at", 20, cursor=cursor).execute())
+
+    params = dict(postgrest.params())
+    assert params["order"] == "created_at.desc,id.desc"
+    assert params["limit"] == "20"
+    assert "offset" not in params
+    assert params["or"] == (
+        '(created_at.lt."2026-10-01T08:00:00+00:00",'
+        'and(created_at.eq."2026-10-01T08:00:00+00:00",id.lt.abc))'
+    )
+
+
+def test_paginate_without_cursor_uses_skip(postgrest):
+    asyncio.run(paginate(supabase.table("routes").select("*"), "created_at", 20, skip=40).execute())
+
+    params = dict(postgrest.params())
+    assert "or" not in params
+    assert (params["offset"], params["limit"]) == ("40", "20")
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: {"user_id": USER_ID}
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def test_envelope_carries_next_cursor(postgrest, client):
+    rows = [route_row(2), route_row(1)]
+    postgrest.handler = lambda request: httpx.Response(200, json=rows)
+
+    response = client.get("/api/v1/routes", params={"limit": 2, "envelope": "true"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == [row["id"] for row in rows]
+    assert body["next_cursor"] == response.headers[NEXT_CURSOR_HEADER]
+    assert decode_cursor(body["next_cursor"]) == (rows[1]["created_at"], rows[1]["id"])
+
+
+def test_plain_list_by_default(postgrest, client):
+    postgrest.handler = lambda request: httpx.Response(200, json=[route_row(1)])
+
+    response = client.get("/api/v1/routes", params={"limit": 2})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [route_row(1)["id"]]
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+    response = client.get("/api/v1/routes", params={"limit": 2, "envelope": "true"})
+    assert response.json()["next_cursor"] is None
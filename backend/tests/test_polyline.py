@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from app.core import polyline
+
+# The worked example of the encoded polyline algorithm format
+EXAMPLE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+EXAMPLE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def reference_decode(value: str, precision: int = 5) -> list:
+    """
+    Character-by-character decoder, as the format describes it.
+    """
+    points, index, lat, lng = [], 0, 0, 0
+    while index < len(value):
+        deltas = []
+        for _ in range(2):
+            result, shift = 0, 0
+            while True:
+                chunk = ord(value[index]) - 63
+                index += 1
+                result |= (chunk & 0x1F) << shift
+                shift += 5
+                if chunk < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / 10 ** precision, lng / 10 ** precision))
+    return points
+
+
+def random_track(seed: int, count: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    start = rng.uniform([-80, -180], [80, 180])
+    return np.round(start + np.cumsum(rng.normal(0, 0.01, (count, 2)), axis=0), 5)
+
+
+def test_example():
+    assert polyline.encode(np.array(EXAMPLE_POINTS)) == EXAMPLE
+    np.testing.assert_allclose(polyline.decode(EXAMPLE), EXAMPLE_POINTS)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_round_trip_matches_reference(seed):
+    track = random_track(seed, 500)
+    encoded = polyline.encode(track)
+    np.testing.assert_allclose(reference_decode(encoded), track, atol=1e-9)
+    np.testing.assert_allclose(polyline.decode(encoded), track, atol=1e-9)
+
+
+def test_large_jumps_and_precision():
+    track = np.array([[0.0, 0.0], [-89.999999, 179.999999], [89.999999, -179.999999]])
+    encoded = polyline.encode(track, precision=6)
+    np.testing.assert_allclose(polyline.decode(encoded, precision=6), track, atol=1e-9)
+    np.testing.assert_allclose(reference_decode(encoded, precision=6), track, atol=1e-9)
+
+
+def test_decode_many_restarts_each_track():
+    tracks = [random_track(1, 20), None, random_track(2, 1), "", random_track(3, 7)]
+    encoded = [polyline.encode(track) if isinstance(track, np.ndarray) else track for track in tracks]
+
+    points, offsets = polyline.decode_many(encoded)
+    assert offsets.tolist() == [0, 20, 20, 21, 21, 28]
+    for track, decoded in zip(tracks, polyline.split(points, offsets)):
+        expected = track if isinstance(track, np.ndarray) else np.zeros((0, 2))
+        np.testing.assert_allclose(decoded, expected, atol=1e-9)
+
+
+def test_empty():
+    assert polyline.encode(np.zeros((0, 2))) == ""
+    assert polyline.decode("").shape == (0, 2)
+
+
+@pytest.mark.parametrize("value", ["_p~iF~ps|U_", "_p~iF", "_p~iF~ps|U\n"])
+def test_malformed_polylines_are_rejected(value):
+    with pytest.raises(ValueError):
+        polyline.decode(value)
+
+
+def test_track_split_mid_value_is_rejected():
+    with pytest.raises(ValueError):
+        polyline.decode_many([EXAMPLE[:3], EXAMPLE[3:]])
@@ -0,0 +1,69 @@
+import asyncio
+
+from app.core.pubsub import LocalBroker, MessageHub
+
+
+class RecordingBroker(LocalBroker):
+    def __init__(self):
+        super().__init__()
+        self.topics = set()
+
+    async def subscribe(self, topic: str) -> None:
+        self.topics.add(topic)
+
+    async def unsubscribe(self, topic: str) -> None:
+        self.topics.discard(topic)
+
+
+def test_publish_reaches_topic_subscribers():
+    async def scenario():
+        hub = MessageHub(LocalBroker(), queue_size=10)
+        async with hub.subscribe("conversation:1") as first, hub.subscribe("conversation:2") as other:
+            await hub.publish("conversation:1", {"type": "message.created"})
+            assert await first.get(timeout=1) == '{"type": "message.created"}'
+            assert await other.get(timeout=0.01) is None
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_overflows():
+    async def scenario():
+        hub = MessageHub(LocalBroker(), queue_size=2)
+        async with hub.subscribe("conversation:1") as subscription:
+            for n in range(3):
+                await hub.publish("conversation:1", {"n": n})
+            assert subscription.overflowed
+            assert await subscription.get(timeout=0.01) is None
+
+    asyncio.run(scenario())
+
+
+def test_revoke_closes_only_the_members_subscriptions():
+    async def scenario():
+        hub = MessageHub(LocalBroker(), queue_size=10)
+        async with hub.subscribe("conversation:1", member="alice") as alice, \
+                hub.subscribe("conversation:1", member="bob") as bob:
+            waiting = asyncio.create_task(alice.get())
+            await asyncio.sleep(0)
+            await hub.revoke("conversation:1", "alice")
+
+            assert await asyncio.wait_for(waiting, 1) is None
+            assert alice.closed and not bob.closed
+
+            await hub.publish("conversation:1", {"type": "message.created"})
+            assert await alice.get(timeout=0.01) is None
+            assert await bob.get(timeout=1) == '{"type": "message.created"}'
+
+    asyncio.run(scenario())
+
+
+def test_broker_topics_follow_subscriptions():
+    async def scenario():
+        broker = RecordingBroker()
+        hub = MessageHub(broker, queue_size=10)
+        async with hub.subscribe("conversation:1", member="alice"):
+            assert broker.topics == {"conversation:1", "conversation:1:revoke:alice"}
+        assert broker.topics == set()
+        assert hub.subscriber_count() == 0
+
+    asyncio.run(scenario())
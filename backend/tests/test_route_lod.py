@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+from app.core.geometry import project
+from app.services.route_geometry import (
+    DETAIL_LEVELS, DETAIL_TOLERANCES, build_lod, detail_for_zoom, fill_missing_coordinates, route_select,
+)
+
+
+def segment_distance(point, a, b) -> float:
+    chord = b - a
+    length_sq = chord @ chord
+    t = 0.0 if length_sq == 0 else min(max((point - a) @ chord / length_sq, 0.0), 1.0)
+    return float(np.hypot(*(point - (a + t * chord))))
+
+
+def reference_simplify(points, tolerance, start=0, end=None) -> set:
+    """
+    Textbook recursive Douglas-Peucker; returns the indices kept.
+    """
+    end = len(points) - 1 if end is None else end
+    kept = {start, end}
+    if end - start < 2:
+        return kept
+    distances = [segment_distance(points[i], points[start], points[end]) for i in range(start + 1, end)]
+    farthest = int(np.argmax(distances))
+    if distances[farthest] > tolerance:
+        index = start + 1 + farthest
+        kept |= reference_simplify(points, tolerance, start, index)
+        kept |= reference_simplify(points, tolerance, index, end)
+    return kept
+
+
+def random_route(seed: int, count: int = 400) -> list:
+    rng = np.random.default_rng(seed)
+    lnglat = np.array([5.0, 45.0]) + np.cumsum(rng.normal(0, 0.0003, (count, 2)), axis=0)
+    elevation = 500 + np.cumsum(rng.normal(0, 1, count))
+    return np.column_stack((lnglat, elevation)).round(6).tolist()
+
+
+def test_zoom_picks_coarser_levels_further_out():
+    levels = [detail_for_zoom(zoom) for zoom in np.arange(0, 24, 0.5)]
+    assert levels[0] == "low"
+    assert levels[-1] == "full"
+    ranks = [DETAIL_LEVELS.index(level) for level in levels]
+    assert ranks == sorted(ranks)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_levels_match_douglas_peucker(seed):
+    route = random_route(seed)
+    lod = build_lod(route)
+    projected = project(np.array(route))
+
+    previous = set()
+    for level in ("low", "medium", "high"):
+        kept = [route.index(position) for position in lod[level]]
+        assert kept == sorted(kept)
+        assert set(kept) == reference_simplify(projected, DETAIL_TOLERANCES[level])
+        # Finer levels only add points, and elevation is kept
+        assert previous <= set(kept)
+        assert all(len(position) == 3 for position in lod[level])
+        previous = set(kept)
+
+
+def test_container_shape_is_kept():
+    route = random_route(0, 50)
+    feature = {"type": "Feature", "properties": {"name": "Loop"}, "geometry": {"type": "LineString", "coordinates": route}}
+
+    lod = build_lod(feature)
+    assert lod["low"]["properties"] == {"name": "Loop"}
+    assert lod["low"]["geometry"]["type"] == "LineString"
+    assert lod["low"]["geometry"]["coordinates"][0] == route[0]
+    assert build_lod({"type": "Point", "coordinates": [5, 45]}) is None
+
+
+def test_select_reads_only_the_chosen_level():
+    assert route_select(["id", "coordinates"], "medium") == "id,coordinates:coordinates_lod->medium"
+    assert route_select(["id", "coordinates"], "full") == "id,coordinates"
+
+
+def test_rows_without_lod_fall_back_to_full_coordinates(postgrest):
+    route = random_route(0, 10)
+    postgrest.handler = lambda request: httpx.Response(200, json=[{"id": "b", "coordinates": route}])
+    rows = [{"id": "a", "coordinates": [[5, 45], [5.1, 45.1]]}, {"id": "b", "coordinates": None}]
+
+    asyncio.run(fill_missing_coordinates(rows))
+    assert rows[1]["coordinates"] == route
+    assert ("id", "in.(b)") in postgrest.params()
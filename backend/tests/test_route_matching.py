@@ -0,0 +1,100 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+from app.core.geometry import project
+from app.services import route_matching
+from app.services.route_matching import box_margin, rank_routes, similar_boxes
+
+USER_ID = "22222222-2222-2222-2222-222222222222"
+THRESHOLD = 100.0
+# Degrees of latitude per meter
+DEG_PER_M = 1 / 111_195
+
+
+def loop(count: int = 300, shift_m: float = 0.0) -> np.ndarray:
+    """
+    A wiggly ~4 km loop as ``[lng, lat]``, moved ``shift_m`` meters north.
+    """
+    angle = np.linspace(0, 2 * np.pi, count)
+    radius = 0.006 * (1 + 0.1 * np.sin(7 * angle))
+    return np.column_stack((5 + radius * np.cos(angle) * 1.4, 45 + radius * np.sin(angle) + shift_m * DEG_PER_M))
+
+
+def segment_distances(points: np.ndarray, line: np.ndarray) -> np.ndarray:
+    a, b = line[:-1], line[1:]
+    chord = b - a
+    length_sq = np.maximum((chord ** 2).sum(axis=1), 1e-12)
+    t = np.clip(((points[:, None] - a) * chord).sum(axis=2) / length_sq, 0, 1)
+    return np.hypot(*(points[:, None] - (a + t[..., None] * chord)).transpose(2, 0, 1)).min(axis=1)
+
+
+def reference_hausdorff(track: np.ndarray, route: np.ndarray) -> float:
+    origin_lat = float(np.mean(track[:, 1]))
+    a, b = project(track, origin_lat), project(route, origin_lat)
+    return float(max(segment_distances(a, b).max(), segment_distances(b, a).max()))
+
+
+def test_routes_are_ranked_by_hausdorff_distance():
+    track = loop()
+    routes = [loop(80, shift_m=60), loop(120, shift_m=15), loop(50, shift_m=400), loop(200)[::-1]]
+
+    ranked = rank_routes(track, routes, THRESHOLD)
+    assert [index for index, _ in ranked] == [3, 1, 0]
+    for index, distance in ranked:
+        # The track is simplified to 10 m before comparing
+        assert distance == pytest.approx(reference_hausdorff(track, routes[index]), abs=10.0)
+
+
+def test_route_covering_part_of_the_track_is_not_a_match():
+    track = loop()
+    assert rank_routes(track, [track[:150]], THRESHOLD) == []
+    assert rank_routes(track[:150], [track], THRESHOLD) == []
+
+
+def test_degenerate_inputs():
+    track = loop()
+    assert rank_routes(track, [], THRESHOLD) == []
+    assert rank_routes(track[:1], [track], THRESHOLD) == []
+    # A single-position route is compared as a point
+    assert rank_routes(track[:2], [track[:1]], 10_000)[0][0] == 0
+
+
+def test_similar_boxes():
+    bbox = (5.0, 45.0, 5.1, 45.1)
+    margin = box_margin(45.0, THRESHOLD)
+    boxes = np.array([
+        bbox,
+        (5.0 + margin[0] / 2, 45.0, 5.1, 45.1 - margin[1] / 2),
+        (5.0, 45.0, 5.1 + 2 * margin[0], 45.1),
+    ])
+    assert similar_boxes(bbox, boxes, margin).tolist() == [True, True, False]
+    assert margin[1] == pytest.approx(THRESHOLD * DEG_PER_M, rel=1e-3)
+    assert margin[0] == pytest.approx(margin[1] / np.cos(np.radians(45.0)))
+
+
+def test_match_route_picks_the_closest_candidate(postgrest, monkeypatch):
+    track = loop()
+    routes = {"near": loop(100, shift_m=20), "nearer": loop(100), "far": loop(100, shift_m=300)}
+
+    async def within(table, user_id, bbox, columns, limit):
+        rows = []
+        for route_id, route in routes.items():
+            lo, hi = route.min(axis=0), route.max(axis=0)
+            rows.append({
+                "id": route_id, "bbox_min_lng": lo[0], "bbox_min_lat": lo[1],
+                "bbox_max_lng": hi[0], "bbox_max_lat": hi[1],
+            })
+        return rows
+
+    monkeypatch.setattr(route_matching.spatial_index, "within", within)
+    postgrest.handler = lambda request: httpx.Response(200, json=[
+        {"id": route_id, "coordinates": None, "lod": routes[route_id].tolist()}
+        for route_id in ("near", "nearer")
+    ])
+
+    assert asyncio.run(route_matching.match_route(USER_ID, track)) == "nearer"
+    # The far route's box rules it out before any geometry is loaded
+    assert ("id", "in.(nearer,near)") in postgrest.params()
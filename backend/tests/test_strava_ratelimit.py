@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from app.core.cache import InMemoryCache
+from app.services import strava_ratelimit
+from app.services.strava_ratelimit import (
+    BACKFILL, INTERACTIVE, SHORT_WINDOW_SECONDS, StravaRateLimiter, parse_rate_limit_header,
+)
+
+# 100 seconds into a quarter hour, at 01:00 UTC
+START = 20833 * 86400 + 3600 + 100
+
+
+class Clock:
+    """
+    Stands in for ``time`` and ``asyncio.sleep``: sleeping advances the clock.
+    """
+
+    def __init__(self):
+        self.now = float(START)
+        self.sleeps = []
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(strava_ratelimit, "time", clock)
+    monkeypatch.setattr(strava_ratelimit.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+def limiter(short=10, daily=1000, read_short=None):
+    return StravaRateLimiter(InMemoryCache(), short, daily, backfill_share=0.5, read_short_limit=read_short)
+
+
+def acquire_all(limiter, count, priority=INTERACTIVE, read=False):
+    async def run():
+        for _ in range(count):
+            await limiter.acquire(priority, read)
+
+    asyncio.run(run())
+
+
+def test_parse_rate_limit_header():
+    assert parse_rate_limit_header("100,1000") == (100, 1000)
+    assert parse_rate_limit_header("100") is None
+    assert parse_rate_limit_header(None) is None
+
+
+def test_calls_wait_for_the_next_window(clock):
+    rate_limiter = limiter()
+    acquire_all(rate_limiter, 10)
+    assert clock.sleeps == []
+
+    acquire_all(rate_limiter, 1)
+    assert clock.sleeps == [SHORT_WINDOW_SECONDS - 100]
+
+
+def test_backfill_leaves_a_share_for_interactive_calls(clock):
+    rate_limiter = limiter()
+    acquire_all(rate_limiter, 5, BACKFILL)
+    acquire_all(rate_limiter, 5, INTERACTIVE)
+    assert clock.sleeps == []
+
+    acquire_all(rate_limiter, 1, BACKFILL)
+    # Backfill waits a little past the reset so interactive calls go first
+    assert clock.sleeps == [SHORT_WINDOW_SECONDS - 100 + 1]
+
+
+def test_reported_usage_is_counted(clock):
+    rate_limiter = limiter()
+    asyncio.run(rate_limiter.observe({"X-RateLimit-Limit": "12,1000", "X-RateLimit-Usage": "12,40"}, 200))
+    assert rate_limiter.limits["overall"] == (12, 1000)
+
+    acquire_all(rate_limiter, 1)
+    assert len(clock.sleeps) == 1
+
+
+def test_exhausted_read_window_does_not_block_writes(clock):
+    rate_limiter = limiter(read_short=5)
+    headers = {
+        "X-RateLimit-Limit": "10,1000", "X-RateLimit-Usage": "3,3",
+        "X-ReadRateLimit-Limit": "5,1000", "X-ReadRateLimit-Usage": "5,5",
+    }
+    asyncio.run(rate_limiter.observe(headers, 429, read=True))
+
+    acquire_all(rate_limiter, 1, read=False)
+    assert clock.sleeps == []
+    acquire_all(rate_limiter, 1, read=True)
+    assert clock.sleeps == [SHORT_WINDOW_SECONDS - 100]
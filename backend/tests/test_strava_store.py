@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services import strava
+
+USER_ID = "22222222-2222-2222-2222-222222222222"
+OLD_POLYLINE = "_p~iF~ps|U_ulLnnqC"
+NEW_POLYLINE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def strava_activity(activity_id, **fields):
+    return {
+        "id": activity_id, "name": "Morning Ride", "sport_type": "Ride",
+        "start_date": "2026-10-01T08:00:00Z", "distance": 25000.0,
+        "map": {"summary_polyline": OLD_POLYLINE}, **fields,
+    }
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    calls = []
+
+    async def invalidate(user_id, polylines):
+        calls.append((user_id, list(polylines)))
+
+    monkeypatch.setattr(strava, "invalidate_activity_tiles", invalidate)
+    return calls
+
+
+def serve(postgrest, stored):
+    """
+    Answer the existence read with ``stored`` and echo the upserted rows.
+    """
+    def handler(request):
+        if request.method == "GET":
+            return httpx.Response(200, json=stored)
+        return httpx.Response(201, json=json.loads(request.content))
+
+    postgrest.handler = handler
+
+
+def test_edits_on_strava_are_merged(postgrest, invalidated):
+    serve(postgrest, [
+        {"strava_activity_id": 1, "map_polyline": OLD_POLYLINE, "type": "Ride"},
+        {"strava_activity_id": 2, "map_polyline": OLD_POLYLINE, "type": "Ride"},
+    ])
+    rows = [
+        strava.to_activity_row(strava_activity(1, name="Renamed on Strava"), USER_ID),
+        strava.to_activity_row(strava_activity(2, map={"summary_polyline": NEW_POLYLINE}), USER_ID),
+        strava.to_activity_row(strava_activity(3), USER_ID),
+    ]
+
+    assert asyncio.run(strava.store_activities(rows)) == 1
+
+    upsert = postgrest.requests[1]
+    assert "resolution=merge-duplicates" in upsert.headers["Prefer"]
+    assert ("on_conflict", "strava_activity_id") in postgrest.params(1)
+    sent = json.loads(upsert.content)
+    assert sent[0]["name"] == "Renamed on Strava"
+    # Local columns aren't sent, so the merge can't overwrite them
+    assert not {"route_id", "route_matched_at"} & set(sent[0])
+    # Only the new activity and the changed track touch tiles; the rename doesn't
+    assert invalidated == [(USER_ID, [OLD_POLYLINE, NEW_POLYLINE, OLD_POLYLINE])]
+
+
+def test_failed_read_stores_nothing(postgrest, invalidated):
+    postgrest.handler = lambda request: httpx.Response(500, json={"message": "down"})
+
+    with pytest.raises(strava.StravaError):
+        asyncio.run(strava.store_activities([strava.to_activity_row(strava_activity(1), USER_ID)]))
+    assert [request.method for request in postgrest.requests] == ["GET"]
+    assert invalidated == []
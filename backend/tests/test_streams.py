@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from app.core.streams import (
+    STREAM_SPECS, FORMAT_VERSION, decode_stream, downsample_indices, encode_stream, stream_length,
+)
+
+
+@pytest.mark.parametrize("name", sorted(STREAM_SPECS))
+def test_round_trip_at_stream_precision(name):
+    spec = STREAM_SPECS[name]
+    rng = np.random.default_rng(7)
+    values = np.cumsum(rng.normal(0, 3, (1000, spec.channels)), axis=0) + 50
+    if spec.channels == 1:
+        values = values[:, 0]
+
+    blob = encode_stream(values, spec)
+    decoded = decode_stream(blob)
+
+    assert stream_length(blob) == 1000
+    assert decoded.shape == values.shape
+    np.testing.assert_allclose(decoded, values, atol=0.5 * 10.0 ** -spec.scale + 1e-9)
+    if spec.scale == 0:
+        assert decoded.dtype == np.int64
+
+
+def test_latlng_keeps_pairs_and_wide_deltas():
+    # A jump across the globe needs 32-bit deltas at micro-degree precision
+    latlng = [[46.519653, 6.632273], [-33.868820, 151.209296], [46.519654, 6.632274]]
+
+    decoded = decode_stream(encode_stream(latlng, STREAM_SPECS["latlng"]))
+
+    np.testing.assert_allclose(decoded, latlng, atol=1e-9)
+
+
+def test_missing_samples_become_zero():
+    decoded = decode_stream(encode_stream([120, np.nan, 122], STREAM_SPECS["heartrate"]))
+    np.testing.assert_array_equal(decoded, [120, 0, 122])
+
+
+def test_empty_stream():
+    blob = encode_stream([], STREAM_SPECS["time"])
+    assert stream_length(blob) == 0
+    assert decode_stream(blob).shape == (0,)
+
+
+def test_unknown_version_is_rejected():
+    blob = bytearray(encode_stream([1, 2, 3], STREAM_SPECS["time"]))
+    blob[0] = FORMAT_VERSION + 1
+    with pytest.raises(ValueError):
+        decode_stream(bytes(blob))
+
+
+def test_downsample_indices_keep_ends():
+    np.testing.assert_array_equal(downsample_indices(5, 10), np.arange(5))
+    indices = downsample_indices(10_001, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 10_000
+    assert (np.diff(indices) > 0).all()
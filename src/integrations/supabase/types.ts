@@ -33,7 +33,7 @@ export type Database = {
           private: boolean | null
           route_id: string | null
           start_date: string
-          strava_activity_id: number
+          strava_activity_id: number | null
           trainer: boolean | null
           type: string | null
           upload_id: number | null
@@ -62,7 +62,7 @@ export type Database = {
           private?: boolean | null
           route_id?: string | null
           start_date: string
-          strava_activity_id: number
+          strava_activity_id?: number | null
           trainer?: boolean | null
           type?: string | null
           upload_id?: number | null
@@ -91,7 +91,7 @@ export type Database = {
           private?: boolean | null
           route_id?: string | null
           start_date?: string
-          strava_activity_id?: number
+          strava_activity_id?: number | null
           trainer?: boolean | null
           type?: string | null
           upload_id?: number | null
@@ -0,0 +1,16 @@
+-- Composite indexes backing (timestamp, id) keyset pagination on list endpoints.
+
+create index if not exists activities_user_created_at_id_idx
+    on public.activities (user_id, created_at desc, id desc);
+
+create index if not exists routes_data_user_created_at_id_idx
+    on public.routes_data (user_id, created_at desc, id desc);
+
+create index if not exists messages_conversation_sent_at_id_idx
+    on public.messages (conversation_id, sent_at desc, id desc);
+
+create index if not exists conversations_created_at_id_idx
+    on public.conversations (created_at desc, id desc);
+
+create index if not exists groups_created_at_id_idx
+    on public.groups (created_at desc, id desc);
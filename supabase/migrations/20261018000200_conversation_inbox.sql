@@ -0,0 +1,125 @@
+-- Conversation inbox: per-participant read markers, denormalized last activity
+-- and a single RPC returning a page of conversations with their last message,
+-- unread count and participant summary.
+
+alter table public.participants
+    add column if not exists last_read_at timestamptz;
+
+alter table public.conversations
+    add column if not exists last_message_at timestamptz;
+
+update public.conversations c
+   set last_message_at = m.max_sent_at
+  from (
+      select conversation_id, max(sent_at) as max_sent_at
+        from public.messages
+       group by conversation_id
+  ) m
+ where m.conversation_id = c.id;
+
+create or replace function public.touch_conversation_last_message_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    update public.conversations
+       set last_message_at = greatest(coalesce(last_message_at, new.sent_at), new.sent_at)
+     where id = new.conversation_id;
+    return new;
+end;
+$$;
+
+drop trigger if exists messages_touch_conversation on public.messages;
+create trigger messages_touch_conversation
+    after insert on public.messages
+    for each row execute function public.touch_conversation_last_message_at();
+
+create index if not exists participants_user_conversation_idx
+    on public.participants (user_id, conversation_id);
+
+create or replace function public.get_conversation_inbox(
+    p_user_id uuid,
+    p_limit integer default 50,
+    p_cursor_at timestamptz default null,
+    p_cursor_id uuid default null
+)
+returns table (
+    id uuid,
+    type text,
+    group_id uuid,
+    created_at timestamptz,
+    last_activity_at timestamptz,
+    last_message jsonb,
+    unread_count integer,
+    participant_count integer,
+    participants jsonb
+)
+language sql
+stable
+as $$
+    with page as (
+        select c.id,
+               c.type,
+               c.group_id,
+               c.created_at,
+               coalesce(c.last_message_at, c.created_at) as last_activity_at,
+               me.last_read_at
+          from public.participants me
+          join public.conversations c on c.id = me.conversation_id
+         where me.user_id = p_user_id
+           and (
+               p_cursor_at is null
+               or (coalesce(c.last_message_at, c.created_at), c.id) < (p_cursor_at, p_cursor_id)
+           )
+         order by last_activity_at desc, c.id desc
+         limit p_limit
+    )
+    select page.id,
+           page.type,
+           page.group_id,
+           page.created_at,
+           page.last_activity_at,
+           lm.message,
+           coalesce(uc.unread, 0)::integer,
+           coalesce(pp.participant_count, 0)::integer,
+           coalesce(pp.participants, '[]'::jsonb)
+      from page
+      left join lateral (
+          select jsonb_build_object(
+                     'id', m.id,
+                     'conversation_id', m.conversation_id,
+                     'sender_id', m.sender_id,
+                     'content', m.content,
+                     'sent_at', m.sent_at
+                 ) as message
+            from public.messages m
+           where m.conversation_id = page.id
+           order by m.sent_at desc, m.id desc
+           limit 1
+      ) lm on true
+      left join lateral (
+          select count(*) as unread
+            from public.messages m
+           where m.conversation_id = page.id
+             and m.sender_id is distinct from p_user_id
+             and (page.last_read_at is null or m.sent_at > page.last_read_at)
+      ) uc on true
+      left join lateral (
+          select count(*) as participant_count,
+                 jsonb_agg(
+                     jsonb_build_object(
+                         'user_id', p.user_id,
+                         'username', pr.username,
+                         'full_name', pr.full_name,
+                         'avatar_url', pr.avatar_url
+                     )
+                 ) filter (where p.rn <= 5) as participants
+            from (
+                select user_id, row_number() over (order by joined_at) as rn
+                  from public.participants
+                 where conversation_id = page.id
+            ) p
+            left join public.profiles pr on pr.id = p.user_id
+      ) pp on true
+     order by page.last_activity_at desc, page.id desc;
+$$;
@@ -0,0 +1,8 @@
+-- Unique key for bulk upserts of Strava activities (on_conflict=strava_activity_id)
+-- and an index for finding a user's newest synced activity.
+
+create unique index if not exists activities_strava_activity_id_key
+    on public.activities (strava_activity_id);
+
+create index if not exists activities_user_start_date_idx
+    on public.activities (user_id, start_date desc);
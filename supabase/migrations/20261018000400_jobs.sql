@@ -0,0 +1,28 @@
+-- Background jobs (e.g. Strava imports) with progress, polled by the API.
+
+create table if not exists public.jobs (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null,
+    kind text not null,
+    status text not null default 'queued'
+        check (status in ('queued', 'running', 'succeeded', 'failed')),
+    payload jsonb not null default '{}'::jsonb,
+    progress jsonb not null default '{}'::jsonb,
+    result jsonb,
+    error text,
+    created_at timestamptz not null default now(),
+    started_at timestamptz,
+    finished_at timestamptz,
+    heartbeat_at timestamptz not null default now()
+);
+
+-- Job status is read through the API, never directly by clients
+alter table public.jobs enable row level security;
+
+-- At most one active job per user and kind; enqueueing again returns it
+create unique index if not exists jobs_one_active_per_user_kind
+    on public.jobs (user_id, kind)
+    where status in ('queued', 'running');
+
+create index if not exists jobs_user_created_at_idx
+    on public.jobs (user_id, created_at desc);
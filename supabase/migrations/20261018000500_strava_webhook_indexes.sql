@@ -0,0 +1,5 @@
+-- Strava webhook events identify the athlete, not our user; look the
+-- connection up by provider id.
+
+create index if not exists user_connections_provider_user_idx
+    on public.user_connections (provider, provider_user_id);
@@ -0,0 +1,16 @@
+-- Per-user checkpoint for the full-history Strava backfill. "before" is the
+-- start date of the oldest activity already written; the next run resumes
+-- from there.
+
+create table if not exists public.strava_backfills (
+    user_id uuid primary key,
+    before timestamptz,
+    pages_fetched integer not null default 0,
+    activities_fetched integer not null default 0,
+    activities_stored integer not null default 0,
+    completed_at timestamptz,
+    updated_at timestamptz not null default now()
+);
+
+-- Backend-only bookkeeping
+alter table public.strava_backfills enable row level security;
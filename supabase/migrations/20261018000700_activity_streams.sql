@@ -0,0 +1,58 @@
+-- Per-second activity streams stored as compact typed arrays: each column is
+-- a fixed-point, delta-encoded, zlib-compressed blob (see app/core/streams.py).
+-- A row with point_count 0 marks an activity that has no streams.
+
+create table if not exists public.activity_streams (
+    activity_id uuid primary key references public.activities (id) on delete cascade,
+    user_id uuid not null,
+    point_count integer not null default 0,
+    time bytea,
+    distance bytea,
+    latlng bytea,
+    altitude bytea,
+    velocity_smooth bytea,
+    heartrate bytea,
+    cadence bytea,
+    watts bytea,
+    temp bytea,
+    moving bytea,
+    grade_smooth bytea,
+    created_at timestamptz not null default now()
+);
+
+-- Streams are served by the backend only (the service key bypasses RLS);
+-- without policies the anon and authenticated roles can't read anyone's
+alter table public.activity_streams enable row level security;
+
+-- Blobs are already compressed; keep TOAST from trying again
+alter table public.activity_streams
+    alter column time set storage external,
+    alter column distance set storage external,
+    alter column latlng set storage external,
+    alter column altitude set storage external,
+    alter column velocity_smooth set storage external,
+    alter column heartrate set storage external,
+    alter column cadence set storage external,
+    alter column watts set storage external,
+    alter column temp set storage external,
+    alter column moving set storage external,
+    alter column grade_smooth set storage external;
+
+create or replace function public.activities_missing_streams(
+    p_user_id uuid,
+    p_limit integer default 100
+)
+returns table (id uuid, user_id uuid, strava_activity_id bigint)
+language sql
+stable
+as $$
+    select a.id, a.user_id, a.strava_activity_id
+      from public.activities a
+     where a.user_id = p_user_id
+       and a.strava_activity_id is not null
+       and not exists (
+           select 1 from public.activity_streams s where s.activity_id = a.id
+       )
+     order by a.start_date desc
+     limit p_limit;
+$$;
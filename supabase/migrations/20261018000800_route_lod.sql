@@ -0,0 +1,6 @@
+-- Simplified copies of each route line, keyed by level of detail
+-- ({"low": ..., "medium": ..., "high": ...}), written with the coordinates.
+-- Endpoints read a single level with coordinates_lod->'<level>'.
+
+alter table public.routes_data
+    add column if not exists coordinates_lod jsonb;
@@ -0,0 +1,40 @@
+-- Bounding box and start point of every route and activity line, written
+-- alongside the geometry (see app/services/spatial.py).
+--
+-- bbox_geohash is the smallest geohash cell containing the bounding box and
+-- start_geohash the geohash of the start point. Viewport and near-point
+-- queries become prefix matches on these keys, which plain B-tree indexes
+-- answer with a few range scans.
+
+alter table public.routes_data
+    add column if not exists bbox_min_lng double precision,
+    add column if not exists bbox_min_lat double precision,
+    add column if not exists bbox_max_lng double precision,
+    add column if not exists bbox_max_lat double precision,
+    add column if not exists start_lng double precision,
+    add column if not exists start_lat double precision,
+    add column if not exists bbox_geohash text,
+    add column if not exists start_geohash text;
+
+alter table public.activities
+    add column if not exists bbox_min_lng double precision,
+    add column if not exists bbox_min_lat double precision,
+    add column if not exists bbox_max_lng double precision,
+    add column if not exists bbox_max_lat double precision,
+    add column if not exists start_lng double precision,
+    add column if not exists start_lat double precision,
+    add column if not exists bbox_geohash text,
+    add column if not exists start_geohash text;
+
+-- text_pattern_ops lets LIKE 'prefix%' use the index under any collation
+create index if not exists routes_data_user_bbox_geohash_idx
+    on public.routes_data (user_id, bbox_geohash text_pattern_ops);
+
+create index if not exists routes_data_user_start_geohash_idx
+    on public.routes_data (user_id, start_geohash text_pattern_ops);
+
+create index if not exists activities_user_bbox_geohash_idx
+    on public.activities (user_id, bbox_geohash text_pattern_ops);
+
+create index if not exists activities_user_start_geohash_idx
+    on public.activities (user_id, start_geohash text_pattern_ops);
@@ -0,0 +1,7 @@
+-- Distance in meters per grade bin of a route, computed from its
+-- coordinates when they are written: {"edges": [...], "distance_m": [...]},
+-- where edges are the upper grade (percent) of each bin but the last.
+-- distance_km and elevation_gain_m are derived at the same time.
+
+alter table public.routes_data
+    add column if not exists grade_histogram jsonb;
@@ -0,0 +1,10 @@
+-- When the route matcher last considered an activity (see
+-- app/services/route_matching.py). Null means the activity is waiting for
+-- a matching pass; existing activities are picked up on the next one.
+
+alter table public.activities
+    add column if not exists route_matched_at timestamptz;
+
+create index if not exists activities_user_unmatched_idx
+    on public.activities (user_id)
+ where route_matched_at is null;
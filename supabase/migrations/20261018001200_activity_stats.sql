@@ -0,0 +1,223 @@
+-- Per-user training totals by sport type and week/month/year (see
+-- app/services/activity_stats.py). Periods start on Mondays, the 1st of
+-- the month and January 1st, in UTC. Activities without a type are
+-- counted under ''.
+--
+-- Buckets are kept up to date by statement-level triggers on activities,
+-- so every write path (the API, uploads, bulk creates, Strava sync,
+-- backfills and webhooks) updates them in the same transaction, and a
+-- multi-row write touches each bucket once. rebuild_activity_stats
+-- recomputes a user's buckets from scratch.
+
+create table if not exists public.activity_stats (
+    user_id uuid not null,
+    period text not null check (period in ('week', 'month', 'year')),
+    period_start date not null,
+    type text not null default '',
+    activity_count integer not null default 0,
+    distance_km double precision not null default 0,
+    elevation_gain_m double precision not null default 0,
+    moving_time_seconds bigint not null default 0,
+    elapsed_time_seconds bigint not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (user_id, period, period_start, type)
+);
+
+-- Buckets are read through the API; clients get no direct access
+alter table public.activity_stats enable row level security;
+
+-- Advisory lock namespace: writers hold it shared per user, rebuilds exclusively
+create or replace function public.activity_stats_lock_key()
+returns integer
+language sql
+immutable
+as $$
+    select 7301;
+$$;
+
+-- Add (p_sign = 1) or remove (p_sign = -1) activities from their buckets
+create or replace function public.add_activity_stats(
+    p_sign integer,
+    p_user_ids uuid[],
+    p_types text[],
+    p_start_dates timestamptz[],
+    p_distances double precision[],
+    p_elevations double precision[],
+    p_moving_times bigint[],
+    p_elapsed_times bigint[]
+)
+returns void
+language plpgsql
+as $$
+begin
+    perform pg_advisory_xact_lock_shared(public.activity_stats_lock_key(), hashtext(u::text))
+       from (select distinct u from unnest(p_user_ids) u order by u) users;
+
+    insert into public.activity_stats as s (
+        user_id, period, period_start, type, activity_count,
+        distance_km, elevation_gain_m, moving_time_seconds, elapsed_time_seconds
+    )
+    select d.user_id,
+           p.period,
+           date_trunc(p.period, d.start_date at time zone 'UTC')::date,
+           coalesce(d.type, ''),
+           p_sign * count(*),
+           p_sign * coalesce(sum(d.distance_km), 0),
+           p_sign * coalesce(sum(d.elevation_gain_m), 0),
+           p_sign * coalesce(sum(d.moving_time_seconds), 0),
+           p_sign * coalesce(sum(d.elapsed_time_seconds), 0)
+      from unnest(p_user_ids, p_types, p_start_dates, p_distances, p_elevations, p_moving_times, p_elapsed_times)
+           as d(user_id, type, start_date, distance_km, elevation_gain_m, moving_time_seconds, elapsed_time_seconds)
+     cross join (values ('week'), ('month'), ('year')) as p(period)
+     where d.start_date is not null
+     group by 1, 2, 3, 4
+        on conflict (user_id, period, period_start, type) do update
+       set activity_count = s.activity_count + excluded.activity_count,
+           distance_km = s.distance_km + excluded.distance_km,
+           elevation_gain_m = s.elevation_gain_m + excluded.elevation_gain_m,
+           moving_time_seconds = s.moving_time_seconds + excluded.moving_time_seconds,
+           elapsed_time_seconds = s.elapsed_time_seconds + excluded.elapsed_time_seconds,
+           updated_at = now();
+
+    if p_sign < 0 then
+        delete from public.activity_stats
+         where user_id = any(p_user_ids)
+           and activity_count <= 0;
+    end if;
+end;
+$$;
+
+-- Runs as the owner, so the bucket writes don't depend on the privileges
+-- of whoever writes the activities
+create or replace function public.activities_maintain_stats()
+returns trigger
+language plpgsql
+security definer
+set search_path = ''
+as $$
+begin
+    if tg_op = 'DELETE' then
+        perform public.add_activity_stats(
+            -1, array_agg(user_id), array_agg(type), array_agg(start_date), array_agg(distance_km),
+            array_agg(elevation_gain_m), array_agg(moving_time_seconds::bigint), array_agg(elapsed_time_seconds::bigint)
+        ) from old_rows
+        having count(*) > 0;
+    elsif tg_op = 'INSERT' then
+        perform public.add_activity_stats(
+            1, array_agg(user_id), array_agg(type), array_agg(start_date), array_agg(distance_km),
+            array_agg(elevation_gain_m), array_agg(moving_time_seconds::bigint), array_agg(elapsed_time_seconds::bigint)
+        ) from new_rows
+        having count(*) > 0;
+    else
+        -- Only rows whose counted columns changed move between or within buckets
+        perform public.add_activity_stats(
+            -1, array_agg(o.user_id), array_agg(o.type), array_agg(o.start_date), array_agg(o.distance_km),
+            array_agg(o.elevation_gain_m), array_agg(o.moving_time_seconds::bigint),
+            array_agg(o.elapsed_time_seconds::bigint)
+        ) from old_rows o
+          join new_rows n on n.id = o.id
+         where (o.user_id, o.type, o.start_date, o.distance_km, o.elevation_gain_m,
+                o.moving_time_seconds, o.elapsed_time_seconds)
+               is distinct from
+               (n.user_id, n.type, n.start_date, n.distance_km, n.elevation_gain_m,
+                n.moving_time_seconds, n.elapsed_time_seconds)
+        having count(*) > 0;
+        perform public.add_activity_stats(
+            1, array_agg(n.user_id), array_agg(n.type), array_agg(n.start_date), array_agg(n.distance_km),
+            array_agg(n.elevation_gain_m), array_agg(n.moving_time_seconds::bigint),
+            array_agg(n.elapsed_time_seconds::bigint)
+        ) from new_rows n
+          join old_rows o on o.id = n.id
+         where (o.user_id, o.type, o.start_date, o.distance_km, o.elevation_gain_m,
+                o.moving_time_seconds, o.elapsed_time_seconds)
+               is distinct from
+               (n.user_id, n.type, n.start_date, n.distance_km, n.elevation_gain_m,
+                n.moving_time_seconds, n.elapsed_time_seconds)
+        having count(*) > 0;
+    end if;
+    return null;
+end;
+$$;
+
+-- Transition tables need one trigger per event
+drop trigger if exists activities_stats_insert on public.activities;
+create trigger activities_stats_insert
+    after insert on public.activities
+    referencing new table as new_rows
+    for each statement execute function public.activities_maintain_stats();
+
+drop trigger if exists activities_stats_update on public.activities;
+create trigger activities_stats_update
+    after update on public.activities
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function public.activities_maintain_stats();
+
+drop trigger if exists activities_stats_delete on public.activities;
+create trigger activities_stats_delete
+    after delete on public.activities
+    referencing old table as old_rows
+    for each statement execute function public.activities_maintain_stats();
+
+-- Recompute a user's buckets from their activities; returns how many there are
+create or replace function public.rebuild_activity_stats(p_user_id uuid)
+returns integer
+language plpgsql
+as $$
+declare
+    bucket_count integer;
+begin
+    -- Waits for in-flight writes of the user's activities, and holds new ones off
+    perform pg_advisory_xact_lock(public.activity_stats_lock_key(), hashtext(p_user_id::text));
+
+    delete from public.activity_stats where user_id = p_user_id;
+
+    insert into public.activity_stats (
+        user_id, period, period_start, type, activity_count,
+        distance_km, elevation_gain_m, moving_time_seconds, elapsed_time_seconds
+    )
+    select a.user_id,
+           p.period,
+           date_trunc(p.period, a.start_date at time zone 'UTC')::date,
+           coalesce(a.type, ''),
+           count(*),
+           coalesce(sum(a.distance_km), 0),
+           coalesce(sum(a.elevation_gain_m), 0),
+           coalesce(sum(a.moving_time_seconds), 0),
+           coalesce(sum(a.elapsed_time_seconds), 0)
+      from public.activities a
+     cross join (values ('week'), ('month'), ('year')) as p(period)
+     where a.user_id = p_user_id
+       and a.start_date is not null
+     group by 1, 2, 3, 4;
+
+    get diagnostics bucket_count = row_count;
+    return bucket_count;
+end;
+$$;
+
+-- Only the backend (service role) and the trigger may change buckets
+revoke execute on function public.add_activity_stats(
+    integer, uuid[], text[], timestamptz[], double precision[], double precision[], bigint[], bigint[]
+) from public, anon, authenticated;
+revoke execute on function public.rebuild_activity_stats(uuid) from public, anon, authenticated;
+grant execute on function public.rebuild_activity_stats(uuid) to service_role;
+
+-- Existing activities
+insert into public.activity_stats (
+    user_id, period, period_start, type, activity_count,
+    distance_km, elevation_gain_m, moving_time_seconds, elapsed_time_seconds
+)
+select a.user_id,
+       p.period,
+       date_trunc(p.period, a.start_date at time zone 'UTC')::date,
+       coalesce(a.type, ''),
+       count(*),
+       coalesce(sum(a.distance_km), 0),
+       coalesce(sum(a.elevation_gain_m), 0),
+       coalesce(sum(a.moving_time_seconds), 0),
+       coalesce(sum(a.elapsed_time_seconds), 0)
+  from public.activities a
+ cross join (values ('week'), ('month'), ('year')) as p(period)
+ where a.start_date is not null
+ group by 1, 2, 3, 4
+    on conflict (user_id, period, period_start, type) do nothing;
@@ -0,0 +1,6 @@
+-- Activities uploaded from device files or bulk-imported from elsewhere
+-- don't come from Strava. NULLs never conflict in the unique index on
+-- strava_activity_id, so Strava upserts are unaffected.
+
+alter table public.activities
+    alter column strava_activity_id drop not null;
@@ -0,0 +1,53 @@
+-- Update one of a user's activities and return it with the map polyline it
+-- had before, in one statement (see update_activity in
+-- app/api/v1/endpoints/activities.py). The row is locked while the old
+-- polyline is read, so a concurrent update can't change it in between and
+-- leave the tiles of the wrong track cached.
+--
+-- p_changes maps column names to new values; unknown columns are an error.
+-- Returns no row when the activity doesn't exist or isn't the user's.
+
+create or replace function public.update_activity_track(
+    p_activity_id uuid,
+    p_user_id uuid,
+    p_changes jsonb
+)
+returns table (activity jsonb, previous_map_polyline text)
+language plpgsql
+as $$
+declare
+    assignments text;
+begin
+    select a.map_polyline
+      into previous_map_polyline
+      from public.activities a
+     where a.id = p_activity_id
+       and a.user_id = p_user_id
+       for update;
+    if not found then
+        return;
+    end if;
+
+    select string_agg(format('%I = r.%I', key, key), ', ')
+      into assignments
+      from jsonb_object_keys(p_changes) as key;
+    if assignments is null then
+        select to_jsonb(a) into activity from public.activities a where a.id = p_activity_id;
+        return next;
+        return;
+    end if;
+
+    execute format(
+        'update public.activities a set %s '
+        'from jsonb_populate_record(null::public.activities, $3) r '
+        'where a.id = $1 and a.user_id = $2 '
+        'returning to_jsonb(a)',
+        assignments
+    ) into activity using p_activity_id, p_user_id, p_changes;
+    return next;
+end;
+$$;
+
+-- Called by the backend (service role) only
+revoke execute on function public.update_activity_track(uuid, uuid, jsonb) from public, anon, authenticated;
+grant execute on function public.update_activity_track(uuid, uuid, jsonb) to service_role;
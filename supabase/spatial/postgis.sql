@@ -0,0 +1,112 @@
+-- Optional PostGIS backend for spatial queries (SPATIAL_BACKEND=postgis).
+--
+-- Not a migration: apply it by hand on databases with the postgis extension,
+-- after 20261018000900_spatial_columns.sql. It indexes the columns that
+-- migration adds with GiST and exposes the <table>_within / <table>_near
+-- functions app/services/spatial.py calls.
+
+create extension if not exists postgis;
+
+create index if not exists routes_data_bbox_gist_idx
+    on public.routes_data
+ using gist (st_makeenvelope(bbox_min_lng, bbox_min_lat, bbox_max_lng, bbox_max_lat, 4326));
+
+create index if not exists routes_data_start_gist_idx
+    on public.routes_data
+ using gist ((st_setsrid(st_makepoint(start_lng, start_lat), 4326)::geography));
+
+create index if not exists activities_bbox_gist_idx
+    on public.activities
+ using gist (st_makeenvelope(bbox_min_lng, bbox_min_lat, bbox_max_lng, bbox_max_lat, 4326));
+
+create index if not exists activities_start_gist_idx
+    on public.activities
+ using gist ((st_setsrid(st_makepoint(start_lng, start_lat), 4326)::geography));
+
+create or replace function public.routes_data_within(
+    p_user_id uuid,
+    p_min_lng double precision,
+    p_min_lat double precision,
+    p_max_lng double precision,
+    p_max_lat double precision,
+    p_limit integer default 500
+)
+returns setof public.routes_data
+language sql
+stable
+as $$
+    select *
+      from public.routes_data
+     where user_id = p_user_id
+       and st_makeenvelope(bbox_min_lng, bbox_min_lat, bbox_max_lng, bbox_max_lat, 4326)
+           && st_makeenvelope(p_min_lng, p_min_lat, p_max_lng, p_max_lat, 4326)
+     limit p_limit;
+$$;
+
+create or replace function public.routes_data_near(
+    p_user_id uuid,
+    p_lng double precision,
+    p_lat double precision,
+    p_radius_m double precision,
+    p_limit integer default 50
+)
+returns setof public.routes_data
+language sql
+stable
+as $$
+    select *
+      from public.routes_data
+     where user_id = p_user_id
+       and st_dwithin(
+           st_setsrid(st_makepoint(start_lng, start_lat), 4326)::geography,
+           st_setsrid(st_makepoint(p_lng, p_lat), 4326)::geography,
+           p_radius_m
+       )
+     order by st_setsrid(st_makepoint(start_lng, start_lat), 4326)::geography
+              <-> st_setsrid(st_makepoint(p_lng, p_lat), 4326)::geography
+     limit p_limit;
+$$;
+
+create or replace function public.activities_within(
+    p_user_id uuid,
+    p_min_lng double precision,
+    p_min_lat double precision,
+    p_max_lng double precision,
+    p_max_lat double precision,
+    p_limit integer default 500
+)
+returns setof public.activities
+language sql
+stable
+as $$
+    select *
+      from public.activities
+     where user_id = p_user_id
+       and st_makeenvelope(bbox_min_lng, bbox_min_lat, bbox_max_lng, bbox_max_lat, 4326)
+           && st_makeenvelope(p_min_lng, p_min_lat, p_max_lng, p_max_lat, 4326)
+     limit p_limit;
+$$;
+
+create or replace function public.activities_near(
+    p_user_id uuid,
+    p_lng double precision,
+    p_lat double precision,
+    p_radius_m double precision,
+    p_limit integer default 50
+)
+returns setof public.activities
+language sql
+stable
+as $$
+    select *
+      from public.activities
+     where user_id = p_user_id
+       and st_dwithin(
+           st_setsrid(st_makepoint(start_lng, start_lat), 4326)::geography,
+           st_setsrid(st_makepoint(p_lng, p_lat), 4326)::geography,
+           p_radius_m
+       )
+     order by st_setsrid(st_makepoint(start_lng, start_lat), 4326)::geography
+              <-> st_setsrid(st_makepoint(p_lng, p_lat), 4326)::geography
+     limit p_limit;
+$$;